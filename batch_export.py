@@ -0,0 +1,327 @@
+"""批量导出
+
+为多名学生各生成一份练习卷（每份使用不同的随机种子），
+字体、样式、页面模板和生成计划在每个工作进程中只准备一次
+
+使用方法：
+python batch_export.py --count 40 --seed 1000 --output-dir 练习卷
+python batch_export.py --count 40 --combined 全年级.pdf --settings settings.json
+python batch_export.py --count 40 --bundle 练习卷.zip
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import random
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from constants import Constants
+from profiling import PROFILE_WRITE, profile_stage
+from progress import STAGE_WORKSHEETS, STAGE_WRITE, ProgressWriter
+from worksheet_builder import WorksheetBuilder, get_default_settings
+from worksheet_id import encode_worksheet_id
+
+# 工作进程内预热好的流水线
+_worker_pipeline = None
+
+
+class BatchPipeline:
+    """预热的练习卷生成流水线
+
+    创建时注册字体、验证设置、计算生成计划并准备好文档模板，
+    之后每份练习卷只需生成题目并渲染。
+    """
+
+    def __init__(self, settings, builder=None):
+        """初始化流水线
+
+        参数:
+            settings: 用户设置字典
+            builder: 共用的WorksheetBuilder（字体只注册一次），默认新建
+
+        异常:
+            ValueError: 设置无效时抛出
+        """
+        self.builder = builder or WorksheetBuilder()
+        is_valid, error_msg = self.builder.validate_settings(settings)
+        if not is_valid:
+            raise ValueError(error_msg)
+
+        self.plan = self.builder.make_plan(settings)
+        self.settings = settings
+        self.show_worksheet_id = settings.get('show_worksheet_id', False)
+        # 显示编号时布局中先放一个占位编号，使每份都带页脚，编号在渲染时逐份替换
+        worksheet_id = encode_worksheet_id(settings, 0) if self.show_worksheet_id else None
+        self.document = self.builder.pdf_generator.prepare_document(worksheet_id=worksheet_id,
+                                                                    **self.plan['pdf_options'])
+
+    def render(self, seed, progress=None):
+        """生成并渲染一份练习卷
+
+        参数:
+            seed: 随机种子
+            progress: ProgressMonitor，汇报进度并响应取消
+
+        返回:
+            PDF内容的bytes
+        """
+        problems = self.builder.generate_from_plan(self.plan, seed, progress)
+        worksheet_id = encode_worksheet_id(self.settings, seed) if self.show_worksheet_id else None
+        buffer = io.BytesIO()
+        self.document.render(buffer, problems, progress, worksheet_id)
+        return buffer.getvalue()
+
+
+def _init_worker(settings):
+    """工作进程初始化：每个进程只预热一次流水线"""
+    global _worker_pipeline
+    _worker_pipeline = BatchPipeline(settings)
+
+
+def _render_worksheet(seed):
+    """在工作进程中渲染一份练习卷"""
+    return _worker_pipeline.render(seed)
+
+
+def make_seeds(count, base_seed=None):
+    """为每份练习卷分配随机种子
+
+    参数:
+        count: 练习卷数量
+        base_seed: 起始种子，None时随机选取
+
+    返回:
+        种子列表
+    """
+    if base_seed is None:
+        base_seed = random.SystemRandom().randrange(2 ** 32)
+    return [base_seed + i for i in range(count)]
+
+
+def make_student_filename(base_filename, index):
+    """生成第index份练习卷的文件名，如 数学题_加法_001.pdf"""
+    stem, ext = os.path.splitext(os.path.basename(base_filename))
+    return f'{stem}_{index + 1:03d}{ext or ".pdf"}'
+
+
+def iter_worksheets(settings, seeds, workers=None, progress=None):
+    """按种子顺序逐份生成练习卷
+
+    参数:
+        settings: 用户设置字典
+        seeds: 种子列表
+        workers: 工作进程数，1表示在当前进程中生成，默认为CPU核数
+        progress: ProgressMonitor，按份汇报进度并响应取消。在当前进程中生成时
+                  每份内部也会检查取消；使用进程池时取消在下一份完成时生效，
+                  尚未开始的份不再生成
+
+    返回:
+        按seeds顺序产出PDF字节的迭代器
+    """
+    if progress is not None:
+        progress.report(STAGE_WORKSHEETS, 0, len(seeds))
+
+    workers = min(workers or os.cpu_count() or 1, len(seeds))
+    if workers <= 1:
+        pipeline = BatchPipeline(settings)
+        for index, seed in enumerate(seeds):
+            pdf_data = pipeline.render(seed, progress)
+            if progress is not None:
+                progress.report(STAGE_WORKSHEETS, index + 1, len(seeds))
+            yield pdf_data
+        return
+
+    # 先在主进程验证设置，避免每个工作进程各自报错
+    is_valid, error_msg = WorksheetBuilder().validate_settings(settings)
+    if not is_valid:
+        raise ValueError(error_msg)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as executor:
+        for index, pdf_data in enumerate(executor.map(_render_worksheet, seeds)):
+            if progress is not None:
+                progress.report(STAGE_WORKSHEETS, index + 1, len(seeds))
+            yield pdf_data
+
+
+def export_batch(settings, seeds, output_dir=None, combined_path=None, workers=None, progress=None):
+    """批量导出练习卷
+
+    参数:
+        settings: 用户设置字典
+        seeds: 每份练习卷的种子列表
+        output_dir: 每份练习卷单独保存的目录
+        combined_path: 合并为一个PDF时的输出文件
+        workers: 工作进程数
+        progress: ProgressMonitor，汇报完成份数和写出的字节数并响应取消
+
+    返回:
+        写入的文件路径列表
+    """
+    if not output_dir and not combined_path:
+        raise ValueError("请指定输出目录或合并输出文件")
+
+    worksheets = iter_worksheets(settings, seeds, workers, progress)
+
+    if combined_path:
+        from pdf_generator import merge_pdf_parts
+        merge_pdf_parts(list(worksheets), combined_path, progress)
+        return [combined_path]
+
+    os.makedirs(output_dir, exist_ok=True)
+    base_filename = WorksheetBuilder().get_save_filename(settings)
+    paths = []
+    written = 0
+    for index, pdf_data in enumerate(worksheets):
+        path = os.path.join(output_dir, make_student_filename(base_filename, index))
+        with profile_stage(PROFILE_WRITE), open(path, 'wb') as f:
+            f.write(pdf_data)
+        paths.append(path)
+        written += len(pdf_data)
+        if progress is not None:
+            progress.report(STAGE_WRITE, written, None)
+    return paths
+
+
+def get_bundle_format(path):
+    """根据文件扩展名判断打包格式(zip/tar/tar.gz)"""
+    lower = path.lower()
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if lower.endswith('.tar'):
+        return 'tar'
+    return 'zip'
+
+
+def _produce_worksheets(settings, seeds, workers, names, output_queue, stop_event, progress=None):
+    """生产者线程：渲染练习卷并放入有界队列，结束或出错时放入标记"""
+    worksheets = iter_worksheets(settings, seeds, workers, progress)
+    try:
+        for name, pdf_data in zip(names, worksheets):
+            if stop_event.is_set():
+                return
+            output_queue.put((name, pdf_data))
+    except BaseException as e:
+        output_queue.put(e)
+        return
+    finally:
+        worksheets.close()
+    output_queue.put(None)
+
+
+def export_bundle(settings, seeds, output, bundle_format='zip', workers=None,
+                  queue_size=Constants.BUNDLE_QUEUE_SIZE, progress=None):
+    """把多份练习卷直接写入ZIP或TAR归档，不产生中间文件
+
+    渲染在后台线程（及其进程池）中进行，通过有界队列交给当前线程压缩写入，
+    渲染和压缩同时进行，队列满时渲染暂停，内存中最多缓存queue_size份PDF。
+
+    参数:
+        settings: 用户设置字典
+        seeds: 每份练习卷的种子列表
+        output: 归档文件名，或可写的二进制流（可以不支持seek）
+        bundle_format: 'zip'、'tar'或'tar.gz'
+        workers: 工作进程数
+        queue_size: 渲染与压缩之间的队列长度
+        progress: ProgressMonitor，汇报完成份数和写出的字节数并响应取消
+
+    返回:
+        归档中的文件名列表
+    """
+    if bundle_format not in ('zip', 'tar', 'tar.gz'):
+        raise ValueError(f"不支持的打包格式: {bundle_format}")
+
+    base_filename = WorksheetBuilder().get_save_filename(settings)
+    names = [make_student_filename(base_filename, index) for index in range(len(seeds))]
+
+    output_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    producer = threading.Thread(
+        target=_produce_worksheets,
+        args=(settings, seeds, workers, names, output_queue, stop_event, progress),
+        daemon=True
+    )
+    producer.start()
+
+    stream = open(output, 'wb') if isinstance(output, (str, os.PathLike)) else output
+    sink = stream if progress is None else ProgressWriter(stream, progress)
+    try:
+        if bundle_format == 'zip':
+            archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            archive = tarfile.open(fileobj=sink, mode='w|gz' if bundle_format == 'tar.gz' else 'w|')
+
+        with archive:
+            while True:
+                item = output_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                name, pdf_data = item
+                with profile_stage(PROFILE_WRITE):
+                    if bundle_format == 'zip':
+                        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        archive.writestr(info, pdf_data)
+                    else:
+                        info = tarfile.TarInfo(name)
+                        info.size = len(pdf_data)
+                        info.mtime = int(time.time())
+                        archive.addfile(info, io.BytesIO(pdf_data))
+    finally:
+        if stream is not output:
+            stream.close()
+        # 写入出错时通知生产者停止，并清空队列使其不会阻塞在put上
+        stop_event.set()
+        while producer.is_alive():
+            try:
+                output_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    return names
+
+
+def load_settings(path=None):
+    """读取设置文件（JSON），未指定的项使用界面默认值"""
+    settings = get_default_settings()
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    return settings
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="批量生成多份数学练习卷")
+    parser.add_argument('--count', type=int, required=True, help="练习卷份数")
+    parser.add_argument('--seed', type=int, help="起始随机种子，第i份使用seed+i")
+    parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同")
+    parser.add_argument('--output-dir', help="每份单独保存的目录")
+    parser.add_argument('--combined', help="合并为一个PDF文件")
+    parser.add_argument('--bundle', help="打包为ZIP/TAR归档（按扩展名.zip/.tar/.tar.gz判断格式）")
+    parser.add_argument('--workers', type=int, help="工作进程数，默认为CPU核数")
+    args = parser.parse_args(argv)
+
+    if not args.output_dir and not args.combined and not args.bundle:
+        parser.error("请指定 --output-dir、--combined 或 --bundle")
+
+    settings = load_settings(args.settings)
+    seeds = make_seeds(args.count, args.seed)
+    if args.bundle:
+        export_bundle(settings, seeds, args.bundle, get_bundle_format(args.bundle), args.workers)
+        print(f'已生成{args.count}份练习卷（起始种子{seeds[0]}），已打包到 {args.bundle}')
+        return
+
+    paths = export_batch(settings, seeds, args.output_dir, args.combined, args.workers)
+    print(f'已生成{args.count}份练习卷（起始种子{seeds[0]}），共写入{len(paths)}个文件')
+
+
+if __name__ == '__main__':
+    main()
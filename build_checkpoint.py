@@ -0,0 +1,112 @@
+"""生成题库的断点续做
+
+生成上百万道题写入题库文件或SQLite题库时，定期保存断点：随机数生成器的状态、
+已完成的批数、已生成的题目数和输出位置。任务崩溃或被中止后，以相同的参数重新运行
+会从最后一个断点继续，而不是从头开始。
+
+出题完全由随机数生成器的状态决定，断点之后的批次重新生成时与中断前完全相同；
+输出中断点之后的部分（可能只写了一半）在继续前丢弃，因此续做后既不会重复也不会缺少批次。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from constants import Constants
+from worksheet_cache import normalize_settings
+
+
+def make_job_key(settings, count, seed, batch_size):
+    """生成任务的标识：断点只在设置、题目数、种子和批大小都相同时使用
+
+    返回:
+        十六进制SHA-256字符串
+    """
+    # 设置的规范化规则与WorksheetCache.make_key一致
+    payload = json.dumps({'settings': normalize_settings(settings), 'count': count, 'seed': str(seed), 'batch_size': batch_size},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_rng_state(rng):
+    """把random.Random的状态转换为可写入JSON的列表"""
+    version, internal_state, gauss_next = rng.getstate()
+    return [version, list(internal_state), gauss_next]
+
+
+def set_rng_state(rng, state):
+    """恢复get_rng_state保存的状态"""
+    version, internal_state, gauss_next = state
+    rng.setstate((version, tuple(internal_state), gauss_next))
+
+
+def make_checkpoint(job, rng, batches, generated, written, offset=None):
+    """组成断点字典
+
+    参数:
+        job: make_job_key返回的任务标识
+        rng: 生成题目的random.Random（MathEngine.random）
+        batches: 已完成的批数
+        generated: 已生成的题目数
+        written: 已写入的题目数（SQLite题库中重复的题目不计）
+        offset: 输出文件中已完成部分的字节数，SQLite题库为None
+    """
+    return {
+        'version': Constants.CHECKPOINT_VERSION,
+        'job': job,
+        'batches': batches,
+        'generated': generated,
+        'written': written,
+        'offset': offset,
+        'rng_state': get_rng_state(rng),
+    }
+
+
+def parse_checkpoint(text, job):
+    """解析断点，不属于该任务或版本不同时返回None"""
+    try:
+        checkpoint = json.loads(text)
+    except ValueError:
+        return None
+    if checkpoint.get('version') != Constants.CHECKPOINT_VERSION or checkpoint.get('job') != job:
+        return None
+    return checkpoint
+
+
+class CheckpointFile:
+    """保存在输出文件旁边的断点文件（题库文件.checkpoint）"""
+
+    def __init__(self, output_path):
+        self.path = output_path + Constants.CHECKPOINT_SUFFIX
+
+    def load(self, job):
+        """读取该任务的断点，没有断点或断点属于其他任务时返回None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return parse_checkpoint(f.read(), job)
+        except FileNotFoundError:
+            return None
+
+    def save(self, checkpoint):
+        """保存断点（写临时文件后原子替换，中断时旧断点保持完整）"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def remove(self):
+        """任务完成后删除断点"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,260 @@
+"""数学题生成器命令行入口
+
+不依赖图形界面（不导入tkinter/PyQt），可在无显示环境的服务器上运行，
+支持界面上的全部设置项
+
+使用方法：
+python cli.py --multiplication --division --total-pages 5 --seed 42 --output 练习.pdf
+python cli.py --count 40 --seed 1000 --jobs 8 --output 练习卷.zip
+python cli.py --seed 7 --output - > 练习.pdf
+python cli.py --count 200 --progress --timeout 600 --output 练习卷.zip
+python cli.py --total-pages 50 --profile 报告.json --cprofile --output 练习.pdf
+python cli.py --history 出题记录 --student 张三 --output 练习.pdf
+python cli.py --difficulty-mix easy=30,medium=50,hard=20 --sort-by-difficulty --output 练习.pdf
+python cli.py --worksheet-id --count 40 --output 练习卷.zip
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+from constants import Constants
+from problem_history import ProblemHistory
+from profiling import PROFILE_VALIDATE, PROFILE_WRITE, StageProfiler, profile_stage
+from progress import (GenerationCancelled, ProgressMonitor, STAGE_GENERATE, STAGE_LAYOUT,
+                      STAGE_PAGES, STAGE_WORKSHEETS, STAGE_WRITE)
+from worksheet_builder import WorksheetBuilder
+from worksheet_cache import WorksheetCache
+from batch_export import export_batch, export_bundle, get_bundle_format, load_settings, make_seeds
+
+# 进度输出中各阶段的名称
+STAGE_NAMES = {
+    STAGE_GENERATE: "生成题目",
+    STAGE_LAYOUT: "排版",
+    STAGE_PAGES: "排版页数",
+    STAGE_WRITE: "写出字节",
+    STAGE_WORKSHEETS: "完成份数",
+}
+
+# 命令行参数名与设置字典键的对应关系
+BOOLEAN_OPTIONS = {
+    'addition': ('has_addition', "加法"),
+    'subtraction': ('has_subtraction', "减法"),
+    'multiplication': ('has_multiplication', "乘法"),
+    'division': ('has_division', "除法(带余数)"),
+    'mixed': ('has_mixed', "混合运算"),
+    'align-equals': ('align_equals', "每列对齐等号"),
+    'allow-right-bracket': ('allow_right_bracket', "允许括号出现在等号右边"),
+    'sort-by-difficulty': ('sort_by_difficulty', "按难度从易到难排列题目"),
+    'worksheet-id': ('show_worksheet_id', "在页脚显示练习卷编号，凭编号可重新生成题目和答案"),
+}
+
+VALUE_OPTIONS = {
+    'min-number': ('min_number', "最小数字"),
+    'max-number': ('max_number', "最大数字"),
+    'min-result': ('min_result', "最小结果"),
+    'max-result': ('max_result', "最大结果"),
+    'rows-per-page': ('rows_per_page', "每页行数"),
+    'cols-per-page': ('cols_per_page', "每页列数"),
+    'total-pages': ('total_pages', "总页数"),
+    'font-size': ('font_size', "字体大小"),
+}
+
+
+def parse_difficulty_mix(text):
+    """解析 "easy=30,medium=50,hard=20" 形式的难度比例"""
+    mix = {}
+    for item in text.split(','):
+        name, separator, weight = item.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError(f"难度比例格式应为 名称=比例: {item}")
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"难度比例必须是数字: {item}")
+    return mix
+
+
+def create_parser():
+    """创建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="生成数学练习题PDF（命令行版本）")
+
+    parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同，命令行参数优先")
+    for option, (_, help_text) in BOOLEAN_OPTIONS.items():
+        parser.add_argument(f'--{option}', action=argparse.BooleanOptionalAction, default=None, help=help_text)
+    parser.add_argument('--num-count', type=int, choices=[2, 3], help="等号左边的数字个数")
+    for option, (_, help_text) in VALUE_OPTIONS.items():
+        parser.add_argument(f'--{option}', type=int, help=help_text)
+    parser.add_argument('--title', help="页眉标题，传空字符串则不绘制页眉页脚")
+    parser.add_argument('--difficulty-mix', type=parse_difficulty_mix, metavar='easy=30,medium=50,hard=20',
+                        help=f"各难度档的比例（难度档: {'、'.join(Constants.DIFFICULTY_BANDS)}）")
+
+    parser.add_argument('--output', '-o',
+                        help="输出文件，'-'表示标准输出；多份时可为目录、.zip/.tar/.tar.gz归档或合并的PDF")
+    parser.add_argument('--seed', type=int, help="随机种子，多份时第i份使用seed+i")
+    parser.add_argument('--count', type=int, default=1, help="生成份数")
+    parser.add_argument('--jobs', '-j', type=int, help="工作进程数，默认为CPU核数")
+    parser.add_argument('--cache-dir', help="启用渲染缓存的目录（仅在指定--seed时生效）")
+    parser.add_argument('--history', metavar='DIR', help="出题历史目录，与--student同用时跳过该学生已做过的题目")
+    parser.add_argument('--student', help="学生（或班级）名称，生成后把本次的题目记入其历史")
+    parser.add_argument('--progress', action='store_true', help="在标准错误输出显示进度和预计剩余时间")
+    parser.add_argument('--timeout', type=float, help="超过该秒数仍未完成时中止生成")
+    parser.add_argument('--profile', metavar='REPORT', help="记录各阶段耗时并写出JSON报告（未指定--jobs时单进程渲染）")
+    parser.add_argument('--cprofile', action='store_true', help="与--profile同用，报告中包含cProfile热点函数")
+    parser.add_argument('--profile-top', type=int, default=Constants.PROFILE_TOP_N, help="报告中列出的热点函数数量")
+    return parser
+
+
+def settings_from_args(args):
+    """合并设置文件、默认值和命令行参数，得到与get_user_settings相同格式的设置字典"""
+    settings = load_settings(args.settings)
+
+    for option, (key, _) in BOOLEAN_OPTIONS.items():
+        value = getattr(args, option.replace('-', '_'))
+        if value is not None:
+            settings[key] = value
+
+    for option, (key, _) in VALUE_OPTIONS.items():
+        value = getattr(args, option.replace('-', '_'))
+        if value is not None:
+            settings[key] = str(value)
+
+    if args.num_count is not None:
+        settings['num_count'] = Constants.NUM_COUNT_OPTIONS[args.num_count - 2]
+    if args.title is not None:
+        settings['title'] = args.title
+    if args.difficulty_mix is not None:
+        settings['difficulty_mix'] = args.difficulty_mix
+    if args.output is not None:
+        settings['save_path'] = args.output
+
+    return settings
+
+
+def make_progress_printer(monitor, stream=None):
+    """创建把进度和预计剩余时间写到终端（同一行刷新）的进度回调
+
+    参数:
+        monitor: 用于估算剩余时间的ProgressMonitor
+        stream: 输出流，默认为标准错误输出
+    """
+    stream = stream or sys.stderr
+
+    def print_progress(stage, done, total):
+        text = f'\r{STAGE_NAMES.get(stage, stage)}: {done}'
+        if total and stage != STAGE_WRITE:
+            text += f'/{total}'
+            eta = monitor.eta(stage, done, total)
+            if eta is not None:
+                text += f'  剩余约{eta:.0f}秒'
+        stream.write(text.ljust(40))
+        stream.flush()
+
+    return print_progress
+
+
+def write_output(args, settings, builder, progress=None):
+    """按参数生成一份或多份练习卷并写出
+
+    返回:
+        完成后的提示信息，输出到标准输出时为None
+    """
+    to_stdout = args.output == '-'
+    output = sys.stdout.buffer if to_stdout else builder.get_save_filename(settings)
+
+    if args.count == 1:
+        history = bloom = None
+        if args.history:
+            history = ProblemHistory(args.history)
+            bloom = history.load(args.student)
+        pdf_data = builder.build_pdf(settings, args.seed, workers=args.jobs, progress=progress, history=bloom)
+        # 练习卷生成成功后才记入历史，中止时不影响历史
+        if history is not None:
+            history.save(args.student, bloom)
+        if to_stdout:
+            output.write(pdf_data)
+            output.flush()
+        else:
+            with profile_stage(PROFILE_WRITE):
+                with open(output, 'wb') as f:
+                    f.write(pdf_data)
+        # PDF在内存中渲染，写出进度在写出后一次汇报
+        if progress is not None:
+            progress.report(STAGE_WRITE, len(pdf_data), len(pdf_data))
+        return None if to_stdout else f'数学题已生成并保存到: {output}'
+
+    seeds = make_seeds(args.count, args.seed)
+    # 输出到目录或归档时，每份的文件名按运算类型自动生成
+    named_settings = dict(settings, save_path='')
+    if to_stdout:
+        export_batch(settings, seeds, combined_path=output, workers=args.jobs, progress=progress)
+        return None
+    if output.lower().endswith(('.zip', '.tar', '.tar.gz', '.tgz')):
+        export_bundle(named_settings, seeds, output, get_bundle_format(output), workers=args.jobs,
+                      progress=progress)
+    elif os.path.isdir(output) or output.endswith(('/', os.sep)):
+        export_batch(named_settings, seeds, output_dir=output, workers=args.jobs, progress=progress)
+    else:
+        export_batch(settings, seeds, combined_path=output, workers=args.jobs, progress=progress)
+    return f'已生成{args.count}份练习卷（起始种子{seeds[0]}），保存到: {output}'
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if args.count < 1:
+        parser.error("--count 必须大于0")
+    if bool(args.history) != bool(args.student):
+        parser.error("--history 和 --student 需要同时指定")
+    if args.history and args.count > 1:
+        parser.error("--history 只能用于生成一份练习卷")
+
+    settings = settings_from_args(args)
+    if settings.get('show_worksheet_id'):
+        if args.history:
+            parser.error("--worksheet-id 不能与 --history 同用（跳过已出过的题目后无法凭编号复现）")
+        if args.seed is not None and args.seed < 0:
+            parser.error("--worksheet-id 要求 --seed 为非负整数")
+    cache = WorksheetCache(args.cache_dir) if args.cache_dir else None
+    builder = WorksheetBuilder(cache=cache)
+
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.cprofile)
+        profiler.metadata.update(settings=settings, seed=args.seed, count=args.count, jobs=args.jobs)
+        # 工作进程中的排版不在分析范围内，默认在当前进程中渲染
+        if args.jobs is None:
+            args.jobs = 1
+
+    with profiler or contextlib.nullcontext():
+        with profile_stage(PROFILE_VALIDATE):
+            is_valid, error_msg = builder.validate_settings(settings)
+        if not is_valid:
+            sys.exit(f"设置错误: {error_msg}")
+
+        progress = None
+        if args.progress or args.timeout is not None:
+            progress = ProgressMonitor(timeout=args.timeout)
+            if args.progress:
+                progress.callback = make_progress_printer(progress)
+
+        try:
+            message = write_output(args, settings, builder, progress)
+        except GenerationCancelled as e:
+            if args.progress:
+                print(file=sys.stderr)
+            sys.exit(f"{e}，已中止")
+
+    if args.progress:
+        print(file=sys.stderr)
+    if message:
+        print(message, file=sys.stderr)
+    if profiler is not None:
+        profiler.write_report(args.profile, args.profile_top)
+        print(profiler.format_summary(), file=sys.stderr)
+        print(f'性能报告已保存到: {args.profile}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@ class Constants:
     
     # ==================== UI界面配置 ====================
     WINDOW_TITLE = "数学题生成器"
-    WINDOW_SIZE = "600x580"
+    WINDOW_SIZE = "860x660"
     
     # ==================== 数学运算配置 ====================
     # 乘除法因子范围
@@ -45,7 +45,7 @@ class Constants:
     
     # 页面设置范围
     MIN_ROWS_PER_PAGE = 1
-    MAX_ROWS_PER_PAGE = 20
+    MAX_ROWS_PER_PAGE = 50
     MIN_COLS_PER_PAGE = 1
     MAX_COLS_PER_PAGE = 5
     MIN_TOTAL_PAGES = 1
@@ -72,6 +72,144 @@ class Constants:
     PDF_FRAME_PADDING = 6
     PDF_FRAME_SPACING = 12
     
+    # 页眉页脚
+    DEFAULT_TITLE = "数学练习"
+    PDF_TITLE_FONT_SIZE = 14
+    PDF_TITLE_OFFSET = 22
+    PDF_INFO_LINE_OFFSET = 42
+    PDF_FOOTER_HEIGHT = 18
+    PDF_FOOTER_FONT_SIZE = 9
+    PDF_FOOTER_BASELINE = 6
+    # 没有找到含中文字形的TrueType字体时，页眉页脚使用reportlab自带的中文CID字体（不嵌入）
+    PDF_CHROME_CID_FONT = 'STSong-Light'
+    
+    # 多进程渲染：页数达到该值时才按页范围并行渲染，且每个进程至少分到
+    # PDF_PARALLEL_MIN_PAGES_PER_WORKER页。单进程每页只需几毫秒，启动进程池和合并各段的
+    # 固定开销约0.1-0.2秒，页数少时多进程反而更慢
+    PDF_PARALLEL_MIN_PAGES = 32
+    PDF_PARALLEL_MIN_PAGES_PER_WORKER = 16
+    # 合并各段时相同对象的合并轮数：字体文件 -> 字体描述 -> 字体字典 -> 页眉表单，
+    # 每轮只能让引用链上的一层变得相同
+    PDF_MERGE_PASSES = 4
+    # 边生成边渲染：生成线程与渲染之间的队列长度（页）
+    PIPELINE_QUEUE_PAGES = 8
+    
+    # ==================== 批量导出配置 ====================
+    # 渲染与打包压缩之间的队列长度（份）
+    BUNDLE_QUEUE_SIZE = 4
+    # 运行任务清单时每个工作进程保留的预热流水线数（按设置区分）
+    MANIFEST_PIPELINE_CACHE_SIZE = 8
+    
+    # ==================== HTTP服务配置 ====================
+    SERVICE_DEFAULT_PORT = 8765
+    SERVICE_QUEUE_SIZE = 16
+    SERVICE_TIMEOUT = 60
+    SERVICE_MAX_BODY_BYTES = 64 * 1024
+    
+    # ==================== 缓存配置 ====================
+    CACHE_DIR_NAME = ".mathgen_cache"
+    CACHE_MAX_BYTES = 512 * 1024 * 1024
+    # 缓存格式版本：出题算法或排版改变、相同设置和种子生成的PDF不同时加1，旧缓存随之失效
+    CACHE_VERSION = 1
+    
+    # ==================== 进度与取消 ====================
+    # 每生成/排版多少道题汇报一次进度
+    PROGRESS_INTERVAL = 200
+    # 多进程渲染时检查进度的间隔（秒）
+    PROGRESS_POLL_SECONDS = 0.1
+    # 界面轮询后台任务的间隔（毫秒）
+    UI_POLL_INTERVAL_MS = 100
+    
+    # ==================== 预览配置 ====================
+    # 预览画布宽度（像素），高度按纸张比例计算
+    PREVIEW_WIDTH = 220
+    # 设置停止变化多久后刷新预览（毫秒）
+    PREVIEW_DEBOUNCE_MS = 300
+    # 预览使用的固定随机种子
+    PREVIEW_SEED = 0
+    # 预览文字字体
+    PREVIEW_FONT_FAMILY = 'Helvetica'
+    
+    # ==================== 性能分析配置 ====================
+    # 报告中列出的热点函数数量
+    PROFILE_TOP_N = 20
+    # 图形界面启用分析时的环境变量：报告路径，以及是否同时运行cProfile
+    PROFILE_ENV_VAR = 'MATHGEN_PROFILE'
+    PROFILE_CPROFILE_ENV_VAR = 'MATHGEN_PROFILE_CPROFILE'
+    
+    # ==================== 内存预算 ====================
+    # 最大规模练习卷单进程渲染时的内存预算（MB），由memory_check.py检查：
+    # tracemalloc记录的Python分配峰值，以及含解释器、reportlab和字体在内的进程峰值RSS
+    MEMORY_TRACED_BUDGET_MB = 16
+    MEMORY_RSS_BUDGET_MB = 128
+    
+    # ==================== 启动配置 ====================
+    # 入口模块导入耗时预算（毫秒），由startup_check.py检查
+    STARTUP_IMPORT_BUDGET_MS = 150
+    # 启动时不应导入的模块，第一次生成PDF时才导入
+    STARTUP_DEFERRED_MODULES = ('reportlab', 'pypdf')
+    
+    # ==================== 难度评分 ====================
+    # 难度 = 位数权重×(最大数值的位数-1) + 进位/退位权重×进位退位次数 + 各运算符权重
+    #      + 有余数权重 + 括号位置权重 + 先乘除后加减（第二个运算符优先）权重
+    DIFFICULTY_DIGIT_WEIGHT = 1
+    DIFFICULTY_CARRY_WEIGHT = 2
+    DIFFICULTY_OPERATION_WEIGHTS = {'+': 0, '-': 1, 'x': 1, '÷': 2}
+    DIFFICULTY_REMAINDER_WEIGHT = 2
+    # 括号在第一个数、第二个数、不加括号、等号右边
+    DIFFICULTY_BRACKET_WEIGHTS = (2, 1, 0, 0)
+    DIFFICULTY_PRECEDENCE_WEIGHT = 2
+    # 按难度比例出题时的难度档（难度分的闭区间，按从易到难排列）
+    DIFFICULTY_BANDS = {'easy': (0, 3), 'medium': (4, 6), 'hard': (7, 255)}
+    # 三个数的题目无法穷举，每种运算符组合按批预先生成题目建立难度索引（每批的题数）
+    DIFFICULTY_POOL_SIZE = 20000
+    DIFFICULTY_POOL_SEED = 0
+    # 候选池不断扩充，直到每个难度档至少有这么多道不重复的候选（或不再增加、达到上限）
+    DIFFICULTY_POOL_MIN_BAND_SIZE = 2000
+    # 每种运算符组合最多生成的题数（生成10万道约需1秒，只在第一次用到该索引时生成）
+    DIFFICULTY_POOL_MAX_SIZE = 100000
+    # 缓存的难度索引数（按运算类型和范围区分）
+    DIFFICULTY_INDEX_CACHE_SIZE = 32
+    
+    # ==================== 题库配置 ====================
+    # 建题库时每个事务插入的题目数
+    PROBLEM_BANK_BATCH_SIZE = 10000
+    # 抽题时缓存符合条件题目数的抽题条件数（不同设置、运算类型各占一项）
+    PROBLEM_BANK_CANDIDATE_CACHE_SIZE = 32
+    # 定长二进制题库文件的标识和格式版本
+    PROBLEM_FILE_MAGIC = b'MGPB'
+    PROBLEM_FILE_VERSION = 1
+    # 断点续做：题库文件每完成多少批保存一次断点（SQLite题库每批与数据在同一事务中保存）
+    CHECKPOINT_INTERVAL_BATCHES = 10
+    CHECKPOINT_SUFFIX = '.checkpoint'
+    CHECKPOINT_VERSION = 1
+    
+    # ==================== 分片生成 ====================
+    # 每块的题目数：块是分片和派生种子的单位，同一题库的所有分片必须相同
+    SHARD_BLOCK_SIZE = 10000
+    # 计算校验和与合并时每次读取的字节数
+    SHARD_READ_CHUNK_SIZE = 1 << 20
+    SHARD_MANIFEST_SUFFIX = '.shard.json'
+    SHARD_MANIFEST_VERSION = 1
+    
+    # ==================== 出题历史 ====================
+    # 每个学生的Bloom过滤器容量（预计收到的题目数）和达到容量时的误判率
+    HISTORY_CAPACITY = 100000
+    HISTORY_FALSE_POSITIVE_RATE = 0.01
+    # 生成的题目已经出过时最多重新生成的次数，仍重复时接受最后一道
+    HISTORY_MAX_ATTEMPTS = 20
+    # 历史记录文件的标识和格式版本
+    HISTORY_FILE_MAGIC = b'MGBF'
+    HISTORY_FILE_VERSION = 1
+    
+    # ==================== 练习卷编号 ====================
+    # 编号格式版本：编号的字段或出题算法变化（相同设置和种子出的题不同）时递增，旧编号解码时报错
+    WORKSHEET_ID_VERSION = 1
+    # 编号中校验和的字节数，用于发现抄错的编号
+    WORKSHEET_ID_CHECKSUM_BYTES = 2
+    # 编号每隔几个字符插入一个连字符
+    WORKSHEET_ID_GROUP_SIZE = 4
+    
     # ==================== 错误处理和限制 ====================
     MAX_TOTAL_PROBLEMS = 10000
     MAX_GENERATION_ATTEMPTS = 10
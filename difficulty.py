@@ -0,0 +1,221 @@
+"""题目难度评分
+
+按题目记录（math_engine.Problem）的数值计算难度分，考虑：
+数值的位数、加法进位和减法退位的次数、运算符、除法是否有余数、
+括号（待填空）的位置，以及混合运算中是否需要先算第二个运算符。
+各项权重见Constants中的难度评分配置。
+
+score_problem逐题计算；score_problems/score_columns用NumPy按位分解整批数值，
+一次计算成千上万道题，供排序、筛选和分层抽样使用。
+"""
+
+import numpy as np
+from constants import Constants
+from math_engine import OPERATOR_CODES
+
+# 乘除法的运算符
+HIGH_PRECEDENCE_OPERATORS = ('x', '÷')
+
+
+def _apply(x, op, y):
+    """计算 x op y（除法取整数商）"""
+    if op == '+':
+        return x + y
+    elif op == '-':
+        return x - y
+    elif op == 'x':
+        return x * y
+    else:
+        return x // y if y else 0
+
+
+def count_carries(x, y):
+    """x + y 按位相加时的进位次数"""
+    x, y = abs(x), abs(y)
+    carries = carry = 0
+    while x or y:
+        carry = 1 if x % 10 + y % 10 + carry >= 10 else 0
+        carries += carry
+        x //= 10
+        y //= 10
+    return carries
+
+
+def count_borrows(x, y):
+    """x - y 按位相减时的退位次数（按大数减小数计算）"""
+    x, y = abs(x), abs(y)
+    if x < y:
+        x, y = y, x
+    borrows = borrow = 0
+    while x or y:
+        borrow = 1 if x % 10 - y % 10 - borrow < 0 else 0
+        borrows += borrow
+        x //= 10
+        y //= 10
+    return borrows
+
+
+def get_steps(problem):
+    """按运算顺序列出题目的各步 (x, op, y)
+
+    三个数的题目中第二个运算符是乘除法而第一个是加减法时先算后两个数。
+
+    返回:
+        (步骤列表, 是否需要先算第二个运算符)
+    """
+    a, op1, b, op2, c = problem[:5]
+    if op2 is None:
+        return [(a, op1, b)], False
+
+    if op2 in HIGH_PRECEDENCE_OPERATORS and op1 not in HIGH_PRECEDENCE_OPERATORS:
+        return [(b, op2, c), (a, op1, _apply(b, op2, c))], True
+    return [(a, op1, b), (_apply(a, op1, b), op2, c)], False
+
+
+def score_problem(problem):
+    """计算一道题的难度分
+
+    参数:
+        problem: Problem
+
+    返回:
+        非负整数，越大越难
+    """
+    steps, precedence = get_steps(problem)
+
+    values = [problem.a, problem.b, problem.answer]
+    if problem.c is not None:
+        values.append(problem.c)
+    digits = len(str(max(abs(value) for value in values)))
+    score = Constants.DIFFICULTY_DIGIT_WEIGHT * (digits - 1)
+
+    for x, op, y in steps:
+        score += Constants.DIFFICULTY_OPERATION_WEIGHTS[op]
+        if op == '+':
+            score += Constants.DIFFICULTY_CARRY_WEIGHT * count_carries(x, y)
+        elif op == '-':
+            score += Constants.DIFFICULTY_CARRY_WEIGHT * count_borrows(x, y)
+
+    if problem.remainder:
+        score += Constants.DIFFICULTY_REMAINDER_WEIGHT
+    score += Constants.DIFFICULTY_BRACKET_WEIGHTS[problem.bracket]
+    if precedence:
+        score += Constants.DIFFICULTY_PRECEDENCE_WEIGHT
+    return score
+
+
+def _apply_columns(x, op, y):
+    """按运算符编码逐元素计算 x op y（除法取整数商，除数为0时为0）"""
+    safe_y = np.where(y == 0, 1, y)
+    return np.select(
+        [op == OPERATOR_CODES['+'], op == OPERATOR_CODES['-'], op == OPERATOR_CODES['x']],
+        [x + y, x - y, x * y],
+        np.where(y == 0, 0, x // safe_y)
+    )
+
+
+def _count_carries_columns(x, y, digits):
+    """逐元素计算 x + y 的进位次数（按位分解，共digits位）"""
+    x, y = np.abs(x), np.abs(y)
+    carry = np.zeros_like(x)
+    carries = np.zeros_like(x)
+    for _ in range(digits):
+        carry = (x % 10 + y % 10 + carry >= 10).astype(x.dtype)
+        carries += carry
+        x, y = x // 10, y // 10
+    return carries
+
+
+def _count_borrows_columns(x, y, digits):
+    """逐元素计算 x - y 的退位次数（按大数减小数，共digits位）"""
+    x, y = np.abs(x), np.abs(y)
+    x, y = np.maximum(x, y), np.minimum(x, y)
+    borrow = np.zeros_like(x)
+    borrows = np.zeros_like(x)
+    for _ in range(digits):
+        borrow = (x % 10 - y % 10 - borrow < 0).astype(x.dtype)
+        borrows += borrow
+        x, y = x // 10, y // 10
+    return borrows
+
+
+def _count_digits(values):
+    """逐元素计算十进制位数（0算1位）"""
+    digits = np.ones_like(values)
+    limit = 10
+    while True:
+        more = values >= limit
+        if not more.any():
+            return digits
+        digits += more
+        limit *= 10
+
+
+def score_columns(columns):
+    """向量化计算一批题目的难度分，结果与逐题调用score_problem相同
+
+    参数:
+        columns: 含a、b、c、answer、op1、op2、bracket、remainder字段的结构化数组
+                 （problem_file.RECORD_DTYPE）或同名键的数组字典，运算符为OPERATOR_CODES编码，
+                 两个数的题目op2为0
+
+    返回:
+        int64数组
+    """
+    a, b, c = (np.asarray(columns[name], dtype=np.int64) for name in ('a', 'b', 'c'))
+    answer = np.asarray(columns['answer'], dtype=np.int64)
+    op1, op2 = (np.asarray(columns[name], dtype=np.int64) for name in ('op1', 'op2'))
+    bracket = np.asarray(columns['bracket'], dtype=np.int64)
+    remainder = np.asarray(columns['remainder'], dtype=np.int64)
+
+    three = op2 != 0
+    high = (op1 == OPERATOR_CODES['x']) | (op1 == OPERATOR_CODES['÷'])
+    precedence = three & ((op2 == OPERATOR_CODES['x']) | (op2 == OPERATOR_CODES['÷'])) & ~high
+
+    # 第一步：需要先算第二个运算符时为 b op2 c，否则为 a op1 b
+    x1 = np.where(precedence, b, a)
+    s1 = np.where(precedence, op2, op1)
+    y1 = np.where(precedence, c, b)
+    r1 = _apply_columns(x1, s1, y1)
+    # 第二步（只有三个数的题目）：a op1 (b op2 c) 或 (a op1 b) op2 c
+    x2 = np.where(precedence, a, r1)
+    s2 = np.where(precedence, op1, op2)
+    y2 = np.where(precedence, r1, c)
+
+    largest = np.maximum.reduce([np.abs(a), np.abs(b), np.where(three, np.abs(c), 0), np.abs(answer)])
+    digits = _count_digits(largest)
+    score = Constants.DIFFICULTY_DIGIT_WEIGHT * (digits - 1)
+
+    # 进位退位按参与运算的最大数的位数展开，再多一位以计入最高位的进位
+    width = int(max(_count_digits(np.abs(np.concatenate([x1, y1, x2, y2, [0]]))).max(), 1)) + 1
+    operation_weights = np.zeros(len(OPERATOR_CODES), dtype=np.int64)
+    for op, code in OPERATOR_CODES.items():
+        if op is not None:
+            operation_weights[code] = Constants.DIFFICULTY_OPERATION_WEIGHTS[op]
+
+    for x, op, y, active in ((x1, s1, y1, np.ones_like(three)), (x2, s2, y2, three)):
+        step = operation_weights[op]
+        step += np.where(op == OPERATOR_CODES['+'], Constants.DIFFICULTY_CARRY_WEIGHT * _count_carries_columns(x, y, width), 0)
+        step += np.where(op == OPERATOR_CODES['-'], Constants.DIFFICULTY_CARRY_WEIGHT * _count_borrows_columns(x, y, width), 0)
+        score += np.where(active, step, 0)
+
+    score += np.where(remainder != 0, Constants.DIFFICULTY_REMAINDER_WEIGHT, 0)
+    score += np.asarray(Constants.DIFFICULTY_BRACKET_WEIGHTS, dtype=np.int64)[bracket]
+    score += np.where(precedence, Constants.DIFFICULTY_PRECEDENCE_WEIGHT, 0)
+    return score
+
+
+def score_problems(problems):
+    """向量化计算一组题目记录（Problem列表）的难度分
+
+    返回:
+        与problems顺序一致的int64数组
+    """
+    if not problems:
+        return np.zeros(0, dtype=np.int64)
+    a, op1, b, op2, c, bracket, answer, remainder = zip(*problems)
+    return score_columns({
+        'a': a, 'b': b, 'c': [value or 0 for value in c], 'answer': answer,
+        'op1': [OPERATOR_CODES[op] for op in op1], 'op2': [OPERATOR_CODES[op] for op in op2],
+        'bracket': bracket, 'remainder': remainder,
+    })
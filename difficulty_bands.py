@@ -0,0 +1,284 @@
+"""按难度比例出题
+
+调用方给出各难度档的比例（如简单30%、中等50%、困难20%），
+每一档的题目直接从该档的候选中抽取，而不是先随机生成再丢弃不符合的题目，
+因此像1-999范围内"三次进位的加法"这类少见的难度档，每道题的代价也与其他档相同。
+
+候选按运算类型预先建立难度索引：
+- 两个数的运算按设置的范围穷举所有合法的数对，按不含括号的难度分排序，
+  括号位置只在难度分上加一个固定权重，查找某档时对每种括号位置各做一次二分；
+- 三个数的运算组合无法穷举，用固定种子的MathEngine按批生成不重复的题目作为候选池，
+  直到每个难度档都有Constants.DIFFICULTY_POOL_MIN_BAND_SIZE道候选（或该档不再增加、
+  总数达到Constants.DIFFICULTY_POOL_MAX_SIZE），按难度分排序。
+索引按运算类型和范围缓存，同一设置再次出题时不必重建。
+"""
+
+import functools
+import numpy as np
+from constants import Constants
+from difficulty import score_columns
+from math_engine import (BRACKET_ANSWER, BRACKET_NONE, OPERATOR_CODES, MathEngine, Problem,
+                         get_operation_keys, get_problem_hash)
+from progress import STAGE_GENERATE
+
+
+def _repeat_ranges(values, low, high):
+    """对每个values[i]展开闭区间[low[i], high[i]]，返回(重复的values, 区间内的各值)"""
+    counts = np.maximum(high - low + 1, 0)
+    repeated = np.repeat(values, counts)
+    starts = np.repeat(low, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return repeated, starts + offsets
+
+
+def _enumerate_two_number(operation, min_number, max_number, min_result, max_result):
+    """穷举两个数的运算在范围内的全部数对
+
+    返回:
+        含a、b、answer、remainder的数组字典
+    """
+    if operation in ('+', '-'):
+        a = np.arange(min_number, max_number + 1, dtype=np.int64)
+        if operation == '+':
+            # a + b 在结果范围内
+            low = np.maximum(min_number, min_result - a)
+            high = np.minimum(max_number, max_result - a)
+        else:
+            # a - b 在结果范围内
+            low = np.maximum(min_number, a - max_result)
+            high = np.minimum(max_number, a - min_result)
+        a, b = _repeat_ranges(a, low, high)
+        answer = a + b if operation == '+' else a - b
+        return {'a': a, 'b': b, 'answer': answer, 'remainder': np.zeros_like(a)}
+
+    factors = np.arange(max(2, min_number), min(max_number, Constants.MAX_MULTIPLICATION_FACTOR) + 1, dtype=np.int64)
+    if operation == 'x':
+        a, b = (grid.ravel() for grid in np.meshgrid(factors, factors, indexing='ij'))
+        answer = a * b
+        keep = (answer >= min_result) & (answer <= max_result)
+        return {'a': a[keep], 'b': b[keep], 'answer': answer[keep], 'remainder': np.zeros(keep.sum(), dtype=np.int64)}
+
+    # 除法：除数和商都不超过9，余数小于除数，被除数在数字范围内
+    quotients = np.arange(max(1, min_result), min(max_result, Constants.MAX_MULTIPLICATION_FACTOR) + 1, dtype=np.int64)
+    divisor, quotient = (grid.ravel() for grid in np.meshgrid(factors, quotients, indexing='ij'))
+    pair, remainder = _repeat_ranges(np.arange(len(divisor)), np.zeros_like(divisor), divisor - 1)
+    divisor, quotient = divisor[pair], quotient[pair]
+    dividend = quotient * divisor + remainder
+    keep = (dividend >= min_number) & (dividend <= max_number)
+    return {'a': dividend[keep], 'b': divisor[keep], 'answer': quotient[keep], 'remainder': remainder[keep]}
+
+
+class OperationIndex:
+    """一种运算类型的候选题目，按难度分排序"""
+
+    def __init__(self, operation, columns, brackets):
+        """建立索引
+
+        参数:
+            operation: 运算类型（get_operation_key的取值）
+            columns: 候选的a、b、c、answer、remainder数组
+            brackets: 可选的括号位置；三个数的题目只有BRACKET_NONE
+        """
+        self.operation = operation
+        self.brackets = brackets
+        size = len(columns['a'])
+        codes = {
+            'op1': np.full(size, OPERATOR_CODES[operation[0]]),
+            'op2': np.full(size, OPERATOR_CODES[operation[1]] if len(operation) > 1 else 0),
+            'bracket': np.full(size, BRACKET_NONE),
+        }
+        # 不含括号权重的难度分，括号位置的权重在查找时加上
+        scores = score_columns(dict(columns, **codes)) if size else np.zeros(0, dtype=np.int64)
+        order = np.argsort(scores, kind='stable')
+        self.scores = scores[order]
+        self.columns = {name: np.asarray(values)[order] for name, values in columns.items()}
+
+    def get_ranges(self, band):
+        """难度分在band闭区间内的候选：每种括号位置对应排序后数组中的一段
+
+        返回:
+            [(括号位置, 起始下标, 结束下标)]
+        """
+        low, high = band
+        ranges = []
+        for bracket in self.brackets:
+            weight = Constants.DIFFICULTY_BRACKET_WEIGHTS[bracket]
+            start = np.searchsorted(self.scores, low - weight, side='left')
+            end = np.searchsorted(self.scores, high - weight, side='right')
+            if end > start:
+                ranges.append((bracket, int(start), int(end)))
+        return ranges
+
+    def count(self, band):
+        """难度分在band内的候选数（不同括号位置分别计数）"""
+        return sum(end - start for _, start, end in self.get_ranges(band))
+
+    def sample(self, band, size, rng):
+        """在band内均匀抽取size道题
+
+        参数:
+            band: (最小难度分, 最大难度分)
+            size: 题目数
+            rng: numpy.random.Generator
+
+        返回:
+            Problem列表
+        """
+        ranges = self.get_ranges(band)
+        sizes = np.array([end - start for _, start, end in ranges])
+        # 在所有(括号位置, 数对)组合中均匀抽取
+        draws = rng.integers(sizes.sum(), size=size)
+        bounds = np.cumsum(sizes)
+        which = np.searchsorted(bounds, draws, side='right')
+        positions = np.array([start for _, start, _ in ranges])[which] + draws - (bounds - sizes)[which]
+        brackets = np.array([bracket for bracket, _, _ in ranges])[which]
+
+        columns = self.columns
+        has_c = len(self.operation) > 1
+        op1 = self.operation[0]
+        op2 = self.operation[1] if has_c else None
+        return [
+            Problem(a, op1, b, op2, c if has_c else None, bracket, answer, remainder)
+            for a, b, c, bracket, answer, remainder in zip(
+                columns['a'][positions].tolist(), columns['b'][positions].tolist(),
+                columns['c'][positions].tolist(), brackets.tolist(),
+                columns['answer'][positions].tolist(), columns['remainder'][positions].tolist()
+            )
+        ]
+
+
+@functools.lru_cache(maxsize=Constants.DIFFICULTY_INDEX_CACHE_SIZE)
+def get_operation_index(operation, ranges):
+    """取出（必要时建立）一种运算类型在给定范围内的难度索引
+
+    参数:
+        operation: 运算类型，如 '+'、'x-'
+        ranges: (最小数字, 最大数字, 最小结果, 最大结果, 是否允许等号右边括号)
+    """
+    min_number, max_number, min_result, max_result, allow_right_bracket = ranges
+    if len(operation) == 1:
+        columns = _enumerate_two_number(operation, min_number, max_number, min_result, max_result)
+        columns['c'] = np.zeros_like(columns['a'])
+        brackets = (0, 1, 2, BRACKET_ANSWER) if allow_right_bracket else (0, 1, 2)
+        return OperationIndex(operation, columns, brackets)
+
+    # 三个数：用固定种子生成候选池，与调用方的随机状态无关；只保留数值和结果都在范围内的题目，
+    # 相同的题目只保留一道。按批扩充，直到每个难度档的候选都够多，或不足的档在一批中没有增加
+    # （范围内这一档的题目已基本出尽），或生成总数达到上限
+    engine = MathEngine(*ranges, seed=Constants.DIFFICULTY_POOL_SEED)
+    pool = {}
+    index = None
+    for _ in range(Constants.DIFFICULTY_POOL_MAX_SIZE // Constants.DIFFICULTY_POOL_SIZE):
+        for _ in range(Constants.DIFFICULTY_POOL_SIZE):
+            problem = engine.generate_operation_problem(operation)
+            if (problem.op2 is not None and min_result <= problem.answer <= max_result
+                    and all(min_number <= value <= max_number for value in (problem.a, problem.b, problem.c))):
+                pool.setdefault((problem.a, problem.b, problem.c), problem)
+
+        previous, index = index, _make_three_number_index(operation, pool.values())
+        short = [band for band in Constants.DIFFICULTY_BANDS.values()
+                 if index.count(band) < Constants.DIFFICULTY_POOL_MIN_BAND_SIZE]
+        if not short or (previous is not None and all(index.count(band) == previous.count(band) for band in short)):
+            break
+    return index
+
+
+def _make_three_number_index(operation, problems):
+    """用三个数的候选题目建立难度索引"""
+    problems = list(problems)
+    columns = {name: np.array([getattr(problem, name) or 0 for problem in problems], dtype=np.int64)
+               for name in ('a', 'b', 'c', 'answer', 'remainder')}
+    return OperationIndex(operation, columns, (BRACKET_NONE,))
+
+
+def allocate_counts(count, mix):
+    """按比例把count道题分配到各难度档（最大余数法，总数恰好为count）
+
+    参数:
+        count: 题目总数
+        mix: {难度档名称: 比例}
+
+    返回:
+        {难度档名称: 题目数}，按Constants.DIFFICULTY_BANDS的顺序
+    """
+    names = [name for name in Constants.DIFFICULTY_BANDS if mix.get(name, 0) > 0]
+    total = sum(mix[name] for name in names)
+    exact = {name: count * mix[name] / total for name in names}
+    counts = {name: int(value) for name, value in exact.items()}
+    by_remainder = sorted(names, key=lambda name: exact[name] - counts[name], reverse=True)
+    for name in by_remainder[:count - sum(counts.values())]:
+        counts[name] += 1
+    return counts
+
+
+def _get_fallback_bands(name):
+    """难度档没有候选时依次尝试的难度档：本档，然后按距离由近到远"""
+    names = list(Constants.DIFFICULTY_BANDS)
+    position = names.index(name)
+    return sorted(names, key=lambda other: (abs(names.index(other) - position), names.index(other)))
+
+
+def generate_targeted_problems(random_source, count, operation_settings, ranges, mix, history=None, progress=None):
+    """按难度比例生成count道题
+
+    每道题先确定难度档，再在该档有候选的运算类型中选择一种，最后在索引中均匀抽取，
+    全部题目的顺序最后随机打乱。某一档在所有运算类型中都没有候选时改用最近的有候选的档。
+    运算类型按min(该档候选数, 该档题数)加权：候选充足的运算类型机会均等（与不按难度出题时一致），
+    候选很少的运算类型（如1-999范围内简单的"--"只有十几道）按候选数减少抽取，不会反复抽到同几道题。
+
+    参数:
+        random_source: random.Random，题目由它派生的随机数决定（按种子复现）
+        count: 题目数量
+        operation_settings: 运算设置
+        ranges: (最小数字, 最大数字, 最小结果, 最大结果, 是否允许等号右边括号)
+        mix: {难度档名称: 比例}
+        history: 学生的BloomFilter，跳过其中已出过的题目并把新题加入其中
+        progress: ProgressMonitor，汇报进度并响应取消
+
+    返回:
+        Problem列表
+
+    异常:
+        ValueError: 设置的范围内没有任何合法题目
+    """
+    rng = np.random.default_rng(random_source.getrandbits(64))
+    indexes = [get_operation_index(key, ranges) for key in get_operation_keys(operation_settings)]
+    if not any(len(index.scores) for index in indexes):
+        raise ValueError("设置的范围内没有可出的题目")
+
+    problems = []
+    for name, band_count in allocate_counts(count, mix).items():
+        if progress is not None:
+            progress.report(STAGE_GENERATE, len(problems), count)
+        for band_name in _get_fallback_bands(name):
+            band = Constants.DIFFICULTY_BANDS[band_name]
+            available = [index for index in indexes if index.count(band)]
+            if available:
+                break
+
+        weights = np.minimum([index.count(band) for index in available], band_count).astype(np.float64)
+        choices = rng.choice(len(available), size=band_count, p=weights / weights.sum())
+        for position, index in enumerate(available):
+            size = int((choices == position).sum())
+            if size:
+                problems.extend(_sample_unseen(index, band, size, rng, history))
+
+    if progress is not None:
+        progress.report(STAGE_GENERATE, count, count)
+    order = rng.permutation(len(problems))
+    return [problems[position] for position in order]
+
+
+def _sample_unseen(index, band, size, rng, history):
+    """在索引中抽取size道题，有历史时重抽已出过的题（最多Constants.HISTORY_MAX_ATTEMPTS次）"""
+    problems = index.sample(band, size, rng)
+    if history is None:
+        return problems
+
+    for position, problem in enumerate(problems):
+        for _ in range(Constants.HISTORY_MAX_ATTEMPTS):
+            if history.add(get_problem_hash(problem)):
+                break
+            problem = index.sample(band, 1, rng)[0]
+        problems[position] = problem
+    return problems
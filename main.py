@@ -3,13 +3,22 @@
 整合UI生成、算式生成、PDF生成等模块的入口文件
 """
 
+import contextlib
+import functools
+import queue
+import threading
 import tkinter as tk
-from tkinter import messagebox
-import random
 from constants import Constants
+from profiling import PROFILE_WRITE, profile_stage, profiler_from_environment
+from progress import GenerationCancelled, ProgressMonitor, STAGE_GENERATE, STAGE_LAYOUT
 from ui_generator import UIGenerator
-from math_engine import MathEngine
-from pdf_generator import PDFGenerator
+from worksheet_builder import WorksheetBuilder
+
+# 各阶段在进度条上所占的区间及状态文字
+STAGE_PROGRESS = {
+    STAGE_GENERATE: (0, 30, "正在生成题目"),
+    STAGE_LAYOUT: (30, 100, "正在排版"),
+}
 
 class MathProblemGenerator:
     """数学题生成器主类"""
@@ -17,238 +26,153 @@ class MathProblemGenerator:
     def __init__(self):
         """初始化数学题生成器"""
         self.root = tk.Tk()
-        self.ui = UIGenerator(self.root, self.generate_problems)
-        self.math_engine = MathEngine()
-        self.pdf_generator = PDFGenerator()
+        self.builder = WorksheetBuilder()
+        # 预览在界面线程中进行，使用单独的构建器，不与后台生成共用数学引擎
+        self.preview_builder = WorksheetBuilder()
+        self.ui = UIGenerator(self.root, self.generate_problems, self.cancel_generation, self.make_preview)
+        # 当前生成任务的进度监视器，为None表示空闲
+        self.monitor = None
+        # 工作线程发给界面线程的事件
+        self.events = queue.Queue()
+        # 窗口显示后在后台导入reportlab并注册字体，第一次生成时不必等待
+        self.root.after_idle(self._start_warm_up)
     
     def run(self):
         """运行应用程序"""
         self.root.mainloop()
     
+    def _start_warm_up(self):
+        """启动后台预热线程"""
+        threading.Thread(target=self._warm_up, daemon=True).start()
+    
+    def _warm_up(self):
+        """后台线程：为预览和生成分别准备PDF生成器"""
+        self.preview_builder.warm_up()
+        self.builder.warm_up()
+    
+    def make_preview(self, settings):
+        """预览回调：返回第一页布局、提示文字，或None表示PDF生成器尚未就绪"""
+        if not self.preview_builder.is_warm:
+            return None
+        
+        is_valid, error_msg = self.preview_builder.validate_settings(settings)
+        if not is_valid:
+            return f"设置错误: {error_msg}"
+        try:
+            return self.preview_builder.make_preview(settings)
+        except Exception as e:
+            return f"无法预览: {str(e)}"
+    
     def generate_problems(self):
-        """生成数学题目"""
+        """生成数学题目（在后台线程中进行，界面保持响应）"""
+        if self.monitor is not None:
+            self.ui.show_warning("正在生成", "上一份练习卷仍在生成中，请稍候或先取消")
+            return
+        
         try:
             # 获取用户设置
             settings = self.ui.get_user_settings()
             
             # 验证设置
-            is_valid, error_msg = self._validate_settings(settings)
+            is_valid, error_msg = self.builder.validate_settings(settings)
             if not is_valid:
                 self.ui.show_error("设置错误", error_msg)
                 return
             
-            # 获取运算设置
-            operation_settings = self._get_operation_settings(settings)
-            if not any(operation_settings.values()):
-                self.ui.show_error("设置错误", "请至少选择一种运算类型")
-                return
-            
-            # 更新数学引擎的范围设置
-            self.math_engine.update_ranges(
-                int(settings['min_number']),
-                int(settings['max_number']),
-                int(settings['min_result']),
-                int(settings['max_result']),
-                settings['allow_right_bracket']
-            )
-            
-            # 生成题目
-            problems = self._generate_all_problems(
-                int(settings['rows_per_page']),
-                int(settings['cols_per_page']),
-                int(settings['total_pages']),
-                operation_settings
-            )
-            
             # 获取保存文件名
-            save_filename = self.pdf_generator.get_save_filename(
-                settings['save_path'],
-                operation_settings['has_addition'],
-                operation_settings['has_subtraction'],
-                operation_settings['has_multiplication'],
-                operation_settings['has_division'],
-                operation_settings['has_mixed']
-            )
-            
-            # 创建并保存PDF
-            self._create_and_save_pdf(
-                problems,
-                save_filename,
-                int(settings['rows_per_page']),
-                int(settings['cols_per_page']),
-                int(settings['total_pages']),
-                int(settings['font_size'])
-            )
-            
-            self.ui.show_success("生成成功", f"数学题已生成并保存到: {save_filename}")
+            save_filename = self.builder.get_save_filename(settings)
             
         except Exception as e:
             self.ui.show_error("生成失败", f"生成数学题时发生错误: {str(e)}")
-    
-    def _validate_settings(self, settings):
-        """验证用户设置
+            return
         
-        参数:
-            settings: 用户设置字典
-            
-        返回:
-            (is_valid, error_message)
-        """
-        try:
-            # 验证数字范围
-            min_number = int(settings['min_number'])
-            max_number = int(settings['max_number'])
-            
-            if not (Constants.MIN_RANGE_VALUE <= min_number <= Constants.MAX_RANGE_VALUE):
-                return False, f"最小数字必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
-            
-            if not (Constants.MIN_RANGE_VALUE <= max_number <= Constants.MAX_RANGE_VALUE):
-                return False, f"最大数字必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
-            
-            # 验证结果范围
-            min_result = int(settings['min_result'])
-            max_result = int(settings['max_result'])
-            
-            if not (Constants.MIN_RANGE_VALUE <= min_result <= Constants.MAX_RANGE_VALUE):
-                return False, f"最小结果必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
-            
-            if not (Constants.MIN_RANGE_VALUE <= max_result <= Constants.MAX_RANGE_VALUE):
-                return False, f"最大结果必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
-            
-            # PDF设置验证已移除，新的create_pdf函数会自动处理
-            
-            return True, ""
-            
-        except ValueError:
-            return False, "请输入有效的数字"
-        except Exception as e:
-            return False, f"设置验证失败: {str(e)}"
+        monitor = ProgressMonitor()
+        monitor.callback = functools.partial(self._on_progress, monitor)
+        self.monitor = monitor
+        self.ui.set_running(True)
+        worker = threading.Thread(
+            target=self._run_generation,
+            args=(settings, save_filename, monitor),
+            daemon=True
+        )
+        worker.start()
+        self.root.after(Constants.UI_POLL_INTERVAL_MS, self._poll_worker)
     
-    def _get_operation_settings(self, settings):
-        """获取运算设置
-        
-        参数:
-            settings: 用户设置字典
-            
-        返回:
-            运算设置字典
-        """
-        # 处理数字数量选择
-        num_count = 2 if settings['num_count'] == '2个数字' else 3
-        
-        return {
-            'has_addition': settings['has_addition'],
-            'has_subtraction': settings['has_subtraction'],
-            'has_multiplication': settings['has_multiplication'],
-            'has_division': settings['has_division'],
-            'has_mixed': settings['has_mixed'],
-            'num_count': num_count
-        }
+    def cancel_generation(self):
+        """取消正在进行的生成"""
+        if self.monitor is not None:
+            self.monitor.cancel()
+            self.ui.update_progress(self.ui.progress_value.get(), "正在取消...")
     
-    def _generate_all_problems(self, rows_per_page, cols_per_page, total_pages, operation_settings):
-        """生成所有题目
-        
-        参数:
-            rows_per_page: 每页行数
-            cols_per_page: 每页列数
-            total_pages: 总页数
-            operation_settings: 运算设置
-            
-        返回:
-            题目列表
+    def _on_progress(self, monitor, stage, done, total):
+        """进度回调（在工作线程中调用，只把事件交给界面线程）
+
+        剩余时间取自本次生成的monitor；self.monitor由界面线程在生成结束或开始新一次生成时改写，
+        不在工作线程中读取。
         """
-        total_problems = rows_per_page * cols_per_page * total_pages
-        problems = []
-        
-        # 获取可用的运算类型
-        available_operations = self._get_available_operations(operation_settings)
-        
-        for _ in range(total_problems):
-            problem = self._generate_single_problem(operation_settings, available_operations)
-            problems.append(problem)
-        
-        return problems
-    
-    def _get_available_operations(self, operation_settings):
-        """获取可用的运算类型列表"""
-        operations = []
-        operation_map = {
-            'has_addition': 'addition',
-            'has_subtraction': 'subtraction', 
-            'has_multiplication': 'multiplication',
-            'has_division': 'division'
-        }
-        
-        for setting_key, operation_name in operation_map.items():
-            if operation_settings.get(setting_key, False):
-                operations.append(operation_name)
-        
-        return operations
+        # 进度条只按题目生成和排版两个阶段推进
+        if stage in STAGE_PROGRESS:
+            self.events.put(('progress', stage, done, total, monitor.eta(stage, done, total)))
     
-    def _generate_single_problem(self, operation_settings, available_operations):
-        """生成单个题目"""
-        # 混合运算优先
-        if operation_settings.get('has_mixed', False):
-            return self.math_engine.generate_expression(
-                num_count=operation_settings['num_count'],
-                has_multiply=operation_settings.get('has_multiplication', False),
-                has_divide=operation_settings.get('has_division', False)
-            )
-        
-        # 单一运算类型
-        if not available_operations:
-            return Constants.DEFAULT_PROBLEM
-            
-        operation_type = random.choice(available_operations)
+    def _run_generation(self, settings, save_filename, monitor):
+        """工作线程：生成题目、渲染PDF并保存
         
-        # 三个数字的情况统一使用generate_expression
-        if operation_settings['num_count'] == 3:
-            return self._generate_three_number_problem(operation_type)
-        
-        # 两个数字的情况
-        return self._generate_two_number_problem(operation_type)
-    
-    def _generate_three_number_problem(self, operation_type):
-        """生成三个数字的题目"""
-        has_multiply = operation_type == 'multiplication'
-        has_divide = operation_type == 'division'
-        return self.math_engine.generate_expression(
-            num_count=3,
-            has_multiply=has_multiply,
-            has_divide=has_divide
-        )
+        设置了Constants.PROFILE_ENV_VAR环境变量时记录各阶段耗时并写出报告。
+        """
+        profiler, report_path = profiler_from_environment()
+        try:
+            with profiler or contextlib.nullcontext():
+                # 分析时在当前进程中渲染，排版耗时才能计入报告
+                pdf_data = self.builder.build_pdf(settings, workers=1 if profiler else None, progress=monitor)
+                # 渲染刚结束时取消的，不再写入文件
+                monitor.check()
+                with profile_stage(PROFILE_WRITE):
+                    with open(save_filename, 'wb') as f:
+                        f.write(pdf_data)
+            if profiler is not None:
+                profiler.metadata['settings'] = settings
+                profiler.write_report(report_path)
+        except GenerationCancelled:
+            self.events.put(('cancelled',))
+        except Exception as e:
+            self.events.put(('error', str(e)))
+        else:
+            self.events.put(('done', save_filename))
     
-    def _generate_two_number_problem(self, operation_type):
-        """生成两个数字的题目"""
-        operation_methods = {
-            'addition': self.math_engine._generate_addition_expression,
-            'subtraction': self.math_engine._generate_subtraction_expression,
-            'multiplication': self.math_engine._generate_multiplication_expression,
-            'division': self.math_engine._generate_division_expression
-        }
+    def _poll_worker(self):
+        """界面线程定时取出工作线程的事件并更新界面"""
+        finished = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            
+            if event[0] == 'progress':
+                _, stage, done, total, eta = event
+                start, end, text = STAGE_PROGRESS[stage]
+                percent = start + (end - start) * done / total if total else end
+                text = f"{text} {done}/{total}"
+                if eta is not None:
+                    text += f"  剩余约{eta:.0f}秒"
+                self.ui.update_progress(percent, text)
+            else:
+                finished = event
         
-        method = operation_methods.get(operation_type)
-        return method() if method else Constants.DEFAULT_PROBLEM
-    
-    def _create_and_save_pdf(self, problems, save_filename, rows_per_page, cols_per_page, total_pages, font_size):
-        """创建并保存PDF
+        if finished is None:
+            self.root.after(Constants.UI_POLL_INTERVAL_MS, self._poll_worker)
+            return
         
-        参数:
-            problems: 题目列表
-            save_filename: 保存文件名
-            rows_per_page: 每页行数
-            cols_per_page: 每页列数
-            total_pages: 总页数
-            font_size: 字体大小
-        """
-        # 使用新的create_pdf函数签名
-        self.pdf_generator.create_pdf(
-            save_filename,
-            problems,
-            cols=cols_per_page,
-            font_size=font_size,
-            per_col=rows_per_page
-        )
+        self.monitor = None
+        self.ui.set_running(False)
+        if finished[0] == 'done':
+            self.ui.update_progress(100, "生成完成")
+            self.ui.show_success("生成成功", f"数学题已生成并保存到: {finished[1]}")
+        elif finished[0] == 'cancelled':
+            self.ui.update_progress(0, "已取消")
+        else:
+            self.ui.update_progress(0, "生成失败")
+            self.ui.show_error("生成失败", f"生成数学题时发生错误: {finished[1]}")
 
 def main():
     """主函数"""
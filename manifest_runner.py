@@ -0,0 +1,238 @@
+"""任务清单批量运行
+
+从JSON或TOML清单读取多个练习卷任务（各自的范围、运算、版式、种子和输出文件），
+在进程池中运行。每个工作进程只注册一次字体，并按设置缓存预热好的流水线，
+设置相同的任务（只有种子和输出文件不同）共用同一个流水线。
+每个任务得到一条包含耗时和输出大小的结果记录。
+
+清单格式（JSON，TOML的结构相同）：
+{
+    "output_dir": "练习卷",
+    "defaults": {"total_pages": 2, "font_size": 16},
+    "jobs": [
+        {"name": "一年级加减", "settings": {"max_number": 20}, "seed": 1},
+        {"name": "乘法", "settings": {"has_multiplication": true}, "count": 30, "output": "乘法.pdf"}
+    ]
+}
+
+使用方法：
+python manifest_runner.py 任务.json --workers 4 --results 结果.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from constants import Constants
+from batch_export import BatchPipeline, make_seeds
+from worksheet_builder import WorksheetBuilder, get_default_settings
+from worksheet_cache import WorksheetCache
+
+try:
+    import tomllib
+except ImportError:  # Python 3.11以前没有tomllib，只支持JSON清单
+    tomllib = None
+
+# 工作进程内共用的构建器和按设置缓存的流水线
+_worker_builder = None
+_worker_pipelines = None
+
+
+def load_manifest(path):
+    """读取任务清单（按扩展名判断JSON或TOML）
+
+    参数:
+        path: 清单文件路径
+
+    返回:
+        清单字典
+    """
+    if path.lower().endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("当前Python版本不支持TOML清单，请使用JSON")
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def expand_jobs(manifest, base_dir='.'):
+    """把清单展开为任务列表
+
+    参数:
+        manifest: 清单字典
+        base_dir: 相对路径的基准目录（通常为清单所在目录）
+
+    返回:
+        任务字典列表，每项包含name、settings、seeds和output
+    """
+    defaults = get_default_settings()
+    defaults.update(manifest.get('defaults', {}))
+    output_dir = os.path.join(base_dir, manifest.get('output_dir', '.'))
+
+    jobs = []
+    for index, entry in enumerate(manifest.get('jobs', [])):
+        settings = dict(defaults)
+        settings.update(entry.get('settings', {}))
+        # 清单中可以直接写数字个数2或3
+        if isinstance(settings['num_count'], int):
+            settings['num_count'] = Constants.NUM_COUNT_OPTIONS[settings['num_count'] - 2]
+
+        name = entry.get('name') or f'任务{index + 1:03d}'
+        seeds = entry.get('seeds') or make_seeds(int(entry.get('count', 1)), entry.get('seed'))
+        jobs.append({
+            'name': name,
+            'settings': settings,
+            'seeds': seeds,
+            'output': os.path.join(output_dir, entry.get('output') or f'{name}.pdf'),
+        })
+    return jobs
+
+
+def get_pipeline_key(settings):
+    """计算流水线缓存键：除保存路径外设置完全相同的任务共用流水线"""
+    return WorksheetCache.make_key(settings, None)
+
+
+def _init_worker():
+    """工作进程初始化：字体只注册一次"""
+    global _worker_builder, _worker_pipelines
+    _worker_builder = WorksheetBuilder()
+    _worker_builder.warm_up()
+    _worker_pipelines = OrderedDict()
+
+
+def _get_pipeline(settings):
+    """取出与设置对应的预热流水线，不存在时创建，超出上限时淘汰最久未用的"""
+    key = get_pipeline_key(settings)
+    pipeline = _worker_pipelines.get(key)
+    if pipeline is None:
+        pipeline = BatchPipeline(settings, _worker_builder)
+        _worker_pipelines[key] = pipeline
+        if len(_worker_pipelines) > Constants.MANIFEST_PIPELINE_CACHE_SIZE:
+            _worker_pipelines.popitem(last=False)
+    else:
+        _worker_pipelines.move_to_end(key)
+    return pipeline
+
+
+def _run_job(job):
+    """在工作进程中运行一个任务并写出PDF
+
+    返回:
+        结果记录字典
+    """
+    record = {
+        'name': job['name'],
+        'output': job['output'],
+        'seeds': job['seeds'],
+        'status': 'ok',
+        'error': '',
+        'seconds': 0.0,
+        'bytes': 0,
+    }
+    started = time.perf_counter()
+    try:
+        pipeline = _get_pipeline(job['settings'])
+        worksheets = [pipeline.render(seed) for seed in job['seeds']]
+
+        output_dir = os.path.dirname(job['output'])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if len(worksheets) == 1:
+            with open(job['output'], 'wb') as f:
+                f.write(worksheets[0])
+        else:
+            from pdf_generator import merge_pdf_parts
+            merge_pdf_parts(worksheets, job['output'])
+        record['bytes'] = os.path.getsize(job['output'])
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run_jobs(jobs, workers=None, on_result=None):
+    """在进程池中运行任务
+
+    设置相同的任务相邻提交，使它们尽量落到已预热相应流水线的工作进程上。
+
+    参数:
+        jobs: expand_jobs返回的任务列表
+        workers: 工作进程数，1表示在当前进程中运行，默认为CPU核数
+        on_result: 每完成一个任务时调用 on_result(record)
+
+    返回:
+        与jobs顺序一致的结果记录列表
+    """
+    records = [None] * len(jobs)
+
+    # 设置无效的任务不提交
+    builder = WorksheetBuilder()
+    pending = []
+    for index, job in enumerate(jobs):
+        is_valid, error_msg = builder.validate_settings(job['settings'])
+        if is_valid:
+            pending.append(index)
+            continue
+        records[index] = {'name': job['name'], 'output': job['output'], 'seeds': job['seeds'],
+                          'status': 'error', 'error': error_msg, 'seconds': 0.0, 'bytes': 0}
+        if on_result:
+            on_result(records[index])
+
+    pending.sort(key=lambda index: get_pipeline_key(jobs[index]['settings']))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    if workers <= 1:
+        _init_worker()
+        for index in pending:
+            records[index] = _run_job(jobs[index])
+            if on_result:
+                on_result(records[index])
+        return records
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(_run_job, jobs[index]): index for index in pending}
+        for future in as_completed(futures):
+            records[futures[future]] = future.result()
+            if on_result:
+                on_result(records[futures[future]])
+    return records
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="按任务清单批量生成练习卷")
+    parser.add_argument('manifest', help="任务清单文件（.json或.toml）")
+    parser.add_argument('--workers', type=int, help="工作进程数，默认为CPU核数")
+    parser.add_argument('--results', help="把结果记录写入该JSON文件")
+    args = parser.parse_args(argv)
+
+    manifest = load_manifest(args.manifest)
+    jobs = expand_jobs(manifest, os.path.dirname(os.path.abspath(args.manifest)))
+
+    def print_record(record):
+        if record['status'] == 'ok':
+            print(f"完成 {record['name']}: {record['seconds']:.2f}秒, {record['bytes']}字节 -> {record['output']}")
+        else:
+            print(f"失败 {record['name']}: {record['error']}")
+
+    started = time.perf_counter()
+    records = run_jobs(jobs, args.workers, print_record)
+    failed = sum(record['status'] != 'ok' for record in records)
+    print(f'共{len(records)}个任务，失败{failed}个，用时{time.perf_counter() - started:.2f}秒')
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
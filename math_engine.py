@@ -3,13 +3,119 @@
 包含所有数学表达式生成的核心逻辑
 """
 
+import hashlib
 import random
+from collections import namedtuple
 from constants import Constants
 
+# 结构化的题目记录：a op1 b [op2 c]，两个数的题目op2和c为None
+# answer为等号左边表达式的值（除法为商），remainder为余数（只有两个数的除法可能非零）
+Problem = namedtuple('Problem', ['a', 'op1', 'b', 'op2', 'c', 'bracket', 'answer', 'remainder'])
+
+# 括号位置：第一个数、第二个数、不加括号、等号右边
+BRACKET_FIRST = 0
+BRACKET_SECOND = 1
+BRACKET_NONE = 2
+BRACKET_ANSWER = 3
+
+# 运算符的数值编码（二进制题库和向量化计算使用），0表示没有第二个运算符
+OPERATOR_CODES = {None: 0, '+': 1, '-': 2, 'x': 3, '÷': 4}
+
+# 没有可用运算类型时使用的默认题目（格式化后为Constants.DEFAULT_PROBLEM）
+DEFAULT_PROBLEM = Problem(1, '+', 1, None, None, BRACKET_NONE, 2, 0)
+
+
+def format_problem(problem):
+    """把题目记录格式化为题目字符串"""
+    a, op1, b, op2, c, bracket, answer, remainder = problem
+    if op2 is not None:
+        return f'{a} {op1} {b} {op2} {c} ='
+
+    result = f'{answer}...{remainder}' if op1 == '÷' else answer
+    if bracket == BRACKET_FIRST:
+        return f'(     ) {op1} {b} = {result}'
+    elif bracket == BRACKET_SECOND:
+        return f'{a} {op1} (     ) = {result}'
+    elif bracket == BRACKET_NONE:
+        return f'{a} {op1} {b} ='
+    else:  # BRACKET_ANSWER
+        return f'{a} {op1} {b} = (     )'
+
+
+def format_answer(problem):
+    """题目的答案（填入括号或等号右边的内容），用于答案页"""
+    a, op1, b, op2, c, bracket, answer, remainder = problem
+    if op2 is None and bracket == BRACKET_FIRST:
+        return str(a)
+    if op2 is None and bracket == BRACKET_SECOND:
+        return str(b)
+    return f'{answer}...{remainder}' if op1 == '÷' and op2 is None else str(answer)
+
+
+def get_problem_hash(problem):
+    """题目的规范哈希（有符号64位整数，可直接存入SQLite）
+
+    只由题目本身的数值、运算符和括号位置决定，与生成时的设置和种子无关。
+    """
+    key = f'{problem.a} {problem.op1} {problem.b} {problem.op2} {problem.c} {problem.bracket}'
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def get_operation_key(problem):
+    """题目的运算类型，如 '+'、'x-'（两个数为一个运算符，三个数为两个）"""
+    return problem.op1 + (problem.op2 or '')
+
+
+# 三个数的题目中各运算类型可能出现的运算符组合（与MathEngine._generate_three_number_problem一致）
+THREE_NUMBER_KEYS = {
+    'addition': ('++', '+-', '-+', '--'),
+    'subtraction': ('++', '+-', '-+', '--'),
+    'multiplication': ('x+', 'x-', '+x', '-x'),
+    'division': ('÷+', '÷-', '+÷', '-÷'),
+}
+TWO_NUMBER_KEYS = {'addition': '+', 'subtraction': '-', 'multiplication': 'x', 'division': '÷'}
+
+
+def get_operation_keys(operation_settings):
+    """按运算设置列出可能出现的运算类型（get_operation_key的取值）
+
+    参数:
+        operation_settings: WorksheetBuilder.get_operation_settings的返回值
+
+    返回:
+        运算类型列表（去重，保持顺序）
+    """
+    has_multiplication = operation_settings.get('has_multiplication', False)
+    has_division = operation_settings.get('has_division', False)
+
+    if operation_settings.get('has_mixed', False):
+        # 混合运算与MathEngine.generate_problem一致：加减法总会出现
+        types = ['addition']
+        if has_multiplication:
+            types.append('multiplication')
+        if has_division:
+            types.append('division')
+        if operation_settings['num_count'] == 3 and (has_multiplication or has_division):
+            types.remove('addition')
+    else:
+        types = [name for name in TWO_NUMBER_KEYS if operation_settings.get(f'has_{name}', False)]
+
+    keys = []
+    for name in types:
+        if operation_settings['num_count'] == 3:
+            keys.extend(THREE_NUMBER_KEYS[name])
+        elif operation_settings.get('has_mixed', False) and name == 'addition':
+            keys.extend(('+', '-'))
+        else:
+            keys.append(TWO_NUMBER_KEYS[name])
+    return list(dict.fromkeys(keys))
+
+
 class MathEngine:
     """数学表达式生成引擎"""
     
-    def __init__(self, min_number=None, max_number=None, min_result=None, max_result=None, allow_right_bracket=False):
+    def __init__(self, min_number=None, max_number=None, min_result=None, max_result=None, allow_right_bracket=False, seed=None):
         """初始化数学引擎
         
         参数:
@@ -18,7 +124,10 @@ class MathEngine:
             min_result: 最小结果值
             max_result: 最大结果值
             allow_right_bracket: 是否允许括号出现在等号右边
+            seed: 随机种子，相同种子和设置生成相同的题目
         """
+        # 每个引擎使用独立的随机数生成器，便于按种子复现
+        self.random = random.Random(seed)
         self.min_number = min_number or Constants.DEFAULT_MIN_NUMBER
         self.max_number = max_number or Constants.DEFAULT_MAX_NUMBER
         self.min_result = min_result or Constants.DEFAULT_MIN_RESULT
@@ -46,15 +155,19 @@ class MathEngine:
         if self.min_result > self.max_result:
             self.min_result, self.max_result = self.max_result, self.min_result
     
+    def seed(self, seed=None):
+        """重新设置随机种子，None表示使用系统随机源"""
+        self.random.seed(seed)
+    
     def _generate_safe_random(self, min_val, max_val, fallback_min=1, fallback_max=10):
         """安全地生成随机数，如果范围无效则使用备用范围"""
         try:
             if min_val <= max_val:
-                return random.randint(min_val, max_val)
+                return self.random.randint(min_val, max_val)
             else:
-                return random.randint(fallback_min, fallback_max)
+                return self.random.randint(fallback_min, fallback_max)
         except ValueError:
-            return random.randint(fallback_min, fallback_max)
+            return self.random.randint(fallback_min, fallback_max)
     
     def _is_valid_expression_result(self, result):
         """验证表达式结果是否在有效范围内"""
@@ -66,14 +179,14 @@ class MathEngine:
     
     def _generate_multiplication_pair(self):
         """生成乘法因子对，确保结果不超过99"""
-        a = random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
-        b = random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
+        a = self.random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
+        b = self.random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
         return a, b
     
     def _generate_division_pair(self):
         """生成除法数对，确保能整除"""
-        divisor = random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
-        quotient = random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
+        divisor = self.random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
+        quotient = self.random.randint(Constants.MIN_MULTIPLICATION_FACTOR, Constants.MAX_MULTIPLICATION_FACTOR)
         dividend = divisor * quotient
         return dividend, divisor, quotient
     
@@ -87,35 +200,32 @@ class MathEngine:
                     factors.append((i, j))
         return factors
     
-    def _generate_bracket_expression(self, a, op, b, result, bracket_pos=None, allow_right_bracket=False):
-        """生成带括号的表达式"""
-        if bracket_pos is None:
-            # 根据allow_right_bracket参数决定可选的括号位置
-            if allow_right_bracket:
-                bracket_pos = random.choice([0, 1, 2, 3])  # 0,1,2为左边括号，3为右边括号
-            else:
-                bracket_pos = random.choice([0, 1, 2])  # 只允许左边括号
-        
-        if bracket_pos == 0:
-            return f'(     ) {op} {b} = {result}'
-        elif bracket_pos == 1:
-            return f'{a} {op} (     ) = {result}'
-        elif bracket_pos == 2:
-            return f'{a} {op} {b} ='
-        else:  # bracket_pos == 3，右边括号
-            return f'{a} {op} {b} = (     )'
+    def _choose_bracket(self):
+        """随机选择括号位置"""
+        # 根据allow_right_bracket参数决定可选的括号位置
+        if self.allow_right_bracket:
+            return self.random.choice([0, 1, 2, 3])  # 0,1,2为左边括号，3为右边括号
+        return self.random.choice([0, 1, 2])  # 只允许左边括号
+    
+    def _make_two_number_problem(self, a, op, b, answer, remainder=0):
+        """生成两个数的题目记录，并随机选择括号位置"""
+        return Problem(a, op, b, None, None, self._choose_bracket(), answer, remainder)
     
-    def _safe_generate_expression(self, generator_func, max_attempts=Constants.MAX_GENERATION_ATTEMPTS):
-        """安全地生成表达式，带重试机制"""
+    def _safe_generate_problem(self, generator_func, max_attempts=Constants.MAX_GENERATION_ATTEMPTS):
+        """安全地生成题目，带重试机制
+
+        异常:
+            ValueError: 连续max_attempts次都未能生成（当前的数字和结果范围内出不了这种题）
+        """
+        error = None
         for attempt in range(max_attempts):
             try:
                 result = generator_func()
                 if result:
                     return result
-            except Exception:
-                continue
-        # 如果所有尝试都失败，返回默认表达式
-        return Constants.DEFAULT_PROBLEM
+            except Exception as e:
+                error = e
+        raise ValueError("当前的数字和结果范围内无法生成题目，请调整范围") from error
     
     def generate_expression(self, num_count=2, has_multiply=False, has_divide=False):
         """生成单个数学表达式
@@ -125,16 +235,47 @@ class MathEngine:
             has_multiply: 是否包含乘法
             has_divide: 是否包含除法
         """
+        return format_problem(self.generate_problem(num_count, has_multiply, has_divide))
+
+    def generate_problem(self, num_count=2, has_multiply=False, has_divide=False):
+        """生成单个题目记录，参数同generate_expression
+
+        返回:
+            Problem
+        """
         if num_count == 2:
-            return self._generate_two_number_expression(has_multiply, has_divide)
+            return self._safe_generate_problem(lambda: self._generate_two_number_problem(has_multiply, has_divide))
         else:
-            return self._generate_three_number_expression(has_multiply, has_divide)
+            return self._safe_generate_problem(lambda: self._generate_three_number_problem(has_multiply, has_divide))
 
-    def _generate_two_number_expression(self, has_multiply, has_divide):
-        """生成两个数的表达式"""
-        # 获取当前范围设置
-        min_num, max_num, min_result, max_result = self._get_user_ranges()
-        
+    def generate_operation_problem(self, operation):
+        """生成指定运算的题目记录
+
+        参数:
+            operation: 两个数的运算'+'、'-'、'x'、'÷'，或三个数的运算符组合如'x+'、'-÷'
+
+        返回:
+            Problem
+        """
+        if len(operation) == 2:
+            op1, op2 = operation
+            if 'x' in operation or '÷' in operation:
+                return self._safe_generate_problem(lambda: self._generate_mixed_operation_problem(op1, op2))
+            return self._safe_generate_problem(lambda: self._generate_addition_subtraction_problem(op1, op2))
+        return self._safe_generate_problem(self._operation_methods[operation])
+
+    @property
+    def _operation_methods(self):
+        """运算符到生成方法的映射"""
+        return {
+            '÷': self._generate_division_problem,
+            'x': self._generate_multiplication_problem,
+            '+': self._generate_addition_problem,
+            '-': self._generate_subtraction_problem
+        }
+
+    def _generate_two_number_problem(self, has_multiply, has_divide):
+        """生成两个数的题目"""
         # 随机选择运算类型
         operation_choices = []
         if has_divide:
@@ -143,22 +284,15 @@ class MathEngine:
             operation_choices.append('x')
         operation_choices.extend(['+', '-'])  # 总是包含加减法
         
-        operation = random.choice(operation_choices)
+        operation = self.random.choice(operation_choices)
         
         # 使用统一的生成方法
-        operation_methods = {
-            '÷': self._generate_division_expression,
-            'x': self._generate_multiplication_expression,
-            '+': self._generate_addition_expression,
-            '-': self._generate_subtraction_expression
-        }
-        
-        return operation_methods[operation]()
+        return self._operation_methods[operation]()
 
-    def _generate_division_expression(self):
-        """生成除法表达式(带余数)"""
+    def _generate_division_problem(self):
+        """生成除法题目(带余数)"""
         # 除数在数字范围内，且不超过9
-        divisor = random.randint(max(2, self.min_number), min(self.max_number, 9))
+        divisor = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
         # 商在结果范围内，且不超过9
         max_quotient = min(self.max_result, 9, self.max_number // divisor if divisor > 0 else 9)
         min_quotient = max(1, self.min_result)
@@ -166,43 +300,43 @@ class MathEngine:
         # 确保范围有效
         if min_quotient > max_quotient:
             # 如果范围无效，使用安全的默认值
-            quotient = random.randint(1, min(9, self.max_result))
+            quotient = self.random.randint(1, min(9, self.max_result))
         else:
-            quotient = random.randint(min_quotient, max_quotient)
+            quotient = self.random.randint(min_quotient, max_quotient)
         # 余数小于除数
-        remainder = random.randint(0, divisor - 1)
+        remainder = self.random.randint(0, divisor - 1)
         dividend = quotient * divisor + remainder
         
         # 确保被除数在数字范围内
         if dividend > self.max_number:
             # 重新计算，确保所有数字都在合理范围内
             max_quotient = min(9, self.max_number // divisor)
-            quotient = random.randint(1, max_quotient)
-            remainder = random.randint(0, min(divisor - 1, self.max_number - quotient * divisor))
+            quotient = self.random.randint(1, max_quotient)
+            remainder = self.random.randint(0, min(divisor - 1, self.max_number - quotient * divisor))
             dividend = quotient * divisor + remainder
 
-        return self._generate_bracket_expression(dividend, '÷', divisor, f'{quotient}...{remainder}', allow_right_bracket=self.allow_right_bracket)
+        return self._make_two_number_problem(dividend, '÷', divisor, quotient, remainder)
 
-    def _generate_multiplication_expression(self):
-        """生成乘法表达式"""
+    def _generate_multiplication_problem(self):
+        """生成乘法题目"""
         # 生成两个乘数，确保结果在范围内
-        a = random.randint(max(2, self.min_number), min(self.max_number, 9))  # 限制乘数范围
+        a = self.random.randint(max(2, self.min_number), min(self.max_number, 9))  # 限制乘数范围
         max_b = min(self.max_number, self.max_result // a) if a > 0 else self.max_number
-        b = random.randint(max(2, self.min_number), min(max_b, 9))
+        b = self.random.randint(max(2, self.min_number), min(max_b, 9))
         result = a * b
         
         # 确保结果在范围内
         if result < self.min_result or result > self.max_result:
             # 重新生成较小的数，确保两个乘数都不超过9
-            a = random.randint(2, min(5, self.max_number, 9))
+            a = self.random.randint(2, min(5, self.max_number, 9))
             max_b_for_result = min(self.max_result // a, self.max_number, 9) if a > 0 else 9
-            b = random.randint(2, max_b_for_result)
+            b = self.random.randint(2, max_b_for_result)
             result = a * b
             
-        return self._generate_bracket_expression(a, 'x', b, result, allow_right_bracket=self.allow_right_bracket)
+        return self._make_two_number_problem(a, 'x', b, result)
 
-    def _generate_addition_expression(self):
-        """生成加法表达式"""
+    def _generate_addition_problem(self):
+        """生成加法题目"""
         # 生成两个加数，确保和在结果范围内
         a = self._generate_safe_random(self.min_number, self.max_number)
         max_b = min(self.max_number, self.max_result - a)
@@ -213,10 +347,10 @@ class MathEngine:
         b = self._generate_safe_random(self.min_number, max_b)
         result = a + b
         
-        return self._generate_bracket_expression(a, '+', b, result, allow_right_bracket=self.allow_right_bracket)
+        return self._make_two_number_problem(a, '+', b, result)
 
-    def _generate_subtraction_expression(self):
-        """生成减法表达式(确保结果为正)"""
+    def _generate_subtraction_problem(self):
+        """生成减法题目(确保结果为正)"""
         # 生成被减数和减数，确保差在结果范围内且为正
         result = self._generate_safe_random(self.min_result, self.max_result)
         b = self._generate_safe_random(self.min_number, self.max_number)
@@ -235,10 +369,10 @@ class MathEngine:
                 b = self._generate_safe_random(self.min_number, self.max_number - result)
                 a = result + b
                 
-        return self._generate_bracket_expression(a, '-', b, result, allow_right_bracket=self.allow_right_bracket)
+        return self._make_two_number_problem(a, '-', b, result)
 
-    def _generate_three_number_expression(self, has_multiply, has_divide):
-        """生成三个数的表达式"""
+    def _generate_three_number_problem(self, has_multiply, has_divide):
+        """生成三个数的题目"""
         # 确定运算符组合
         operations = []
         
@@ -255,25 +389,25 @@ class MathEngine:
             # 如果没有选择乘法和除法，只生成纯加减法运算
             operations.extend([('+', '+'), ('+', '-'), ('-', '+'), ('-', '-')])
         
-        op1, op2 = random.choice(operations)
+        op1, op2 = self.random.choice(operations)
         
         # 生成数值
         if 'x' in [op1, op2] or '÷' in [op1, op2]:
-            return self._generate_mixed_operation_expression(op1, op2)
+            return self._generate_mixed_operation_problem(op1, op2)
         else:
-            return self._generate_addition_subtraction_expression(op1, op2)
+            return self._generate_addition_subtraction_problem(op1, op2)
 
-    def _generate_mixed_operation_expression(self, op1, op2):
-        """生成包含乘除法的混合运算表达式"""
+    def _generate_mixed_operation_problem(self, op1, op2):
+        """生成包含乘除法的混合运算题目"""
         # 确定哪个运算符是乘除法，优先处理乘除法
         if op1 in ['x', '÷']:
             # 第一个是乘除法，第二个是加减法
             if op1 == 'x':
-                a = random.randint(max(2, self.min_number), min(self.max_number, 9))
-                b = random.randint(max(2, self.min_number), min(self.max_number, 9))
+                a = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
+                b = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
                 temp_result = a * b
             else:  # op1 == '÷'
-                b = random.randint(max(2, self.min_number), min(self.max_number, 9))
+                b = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
                 # 确保商不超过9
                 max_quotient = min(self.max_result, 9, self.max_number // b if b > 0 else 9)
                 min_quotient = max(1, self.min_result)
@@ -281,9 +415,9 @@ class MathEngine:
                 # 确保范围有效
                 if min_quotient > max_quotient:
                     # 如果范围无效，使用安全的默认值
-                    quotient = random.randint(1, min(9, self.max_result))
+                    quotient = self.random.randint(1, min(9, self.max_result))
                 else:
-                    quotient = random.randint(min_quotient, max_quotient)
+                    quotient = self.random.randint(min_quotient, max_quotient)
                 a = b * quotient
                 temp_result = quotient
             
@@ -291,14 +425,14 @@ class MathEngine:
             if op2 == '+':
                 max_c = min(self.max_number, self.max_result - temp_result)
                 if self.min_number <= max_c:
-                    c = random.randint(self.min_number, max_c)
+                    c = self.random.randint(self.min_number, max_c)
                 else:
                     c = self._generate_safe_random(self.min_number, self.max_number)
             else:  # op2 == '-'
                 # 确保最终结果为正数
                 max_c = min(self.max_number, temp_result - self.min_result)
                 if self.min_number <= max_c:
-                    c = random.randint(self.min_number, max_c)
+                    c = self.random.randint(self.min_number, max_c)
                 else:
                     c = self._generate_safe_random(self.min_number, self.max_number)
         
@@ -306,28 +440,28 @@ class MathEngine:
             # 第二个是乘除法，第一个是加减法
             if op2 == 'x':
                 # 先生成乘法部分
-                b = random.randint(max(2, self.min_number), min(self.max_number, 9))
-                c = random.randint(max(2, self.min_number), min(self.max_number, 9))
+                b = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
+                c = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
                 multiplication_result = b * c
                 
                 # 基于乘法结果生成加减法
                 if op1 == '+':
                     max_a = min(self.max_number, self.max_result - multiplication_result)
                     if self.min_number <= max_a:
-                        a = random.randint(self.min_number, max_a)
+                        a = self.random.randint(self.min_number, max_a)
                     else:
                         a = self._generate_safe_random(self.min_number, self.max_number)
                 else:  # op1 == '-'
                     # 确保a - (b * c) > 0
                     min_a = max(self.min_number, multiplication_result + self.min_result)
                     if min_a <= self.max_number:
-                        a = random.randint(min_a, self.max_number)
+                        a = self.random.randint(min_a, self.max_number)
                     else:
                         a = self._generate_safe_random(self.min_number, self.max_number)
             
             else:  # op2 == '÷'
                 # 先生成除法部分
-                c = random.randint(max(2, self.min_number), min(self.max_number, 9))
+                c = self.random.randint(max(2, self.min_number), min(self.max_number, 9))
                 # 确保商不超过9
                 max_quotient = min(self.max_result, 9, self.max_number // c if c > 0 else 9)
                 min_quotient = max(1, self.min_result)
@@ -335,64 +469,53 @@ class MathEngine:
                 # 确保范围有效
                 if min_quotient > max_quotient:
                     # 如果范围无效，使用安全的默认值
-                    quotient = random.randint(1, min(9, self.max_result))
+                    quotient = self.random.randint(1, min(9, self.max_result))
                 else:
-                    quotient = random.randint(min_quotient, max_quotient)
+                    quotient = self.random.randint(min_quotient, max_quotient)
                 b = c * quotient  # 被除数
                 
                 # 基于除法结果生成加减法
                 if op1 == '+':
                     max_a = min(self.max_number, self.max_result - quotient)
                     if self.min_number <= max_a:
-                        a = random.randint(self.min_number, max_a)
+                        a = self.random.randint(self.min_number, max_a)
                     else:
                         a = self._generate_safe_random(self.min_number, self.max_number)
                 else:  # op1 == '-'
                     # 确保a - (b ÷ c) > 0
                     min_a = max(self.min_number, quotient + self.min_result)
                     if min_a <= self.max_number:
-                        a = random.randint(min_a, self.max_number)
+                        a = self.random.randint(min_a, self.max_number)
                     else:
                         a = self._generate_safe_random(self.min_number, self.max_number)
         
-        # 计算最终结果
-        if op1 == 'x':
-            temp = a * b
-        elif op1 == '÷':
-            temp = a // b
-        elif op1 == '+':
-            temp = a + (b * c if op2 == 'x' else b // c)
-        else:  # op1 == '-'
-            temp = a - (b * c if op2 == 'x' else b // c)
-        
-        if op2 == 'x':
-            final_result = temp + b * c if op1 in ['+', '-'] else (a * b) + c if op1 == 'x' else (a // b) + c
-        elif op2 == '÷':
-            final_result = temp + b // c if op1 in ['+', '-'] else (a * b) + (b // c) if op1 == 'x' else (a // b) + (b // c)
-        elif op2 == '+':
-            final_result = temp + c
-        else:  # op2 == '-'
-            final_result = temp - c
+        # 计算最终结果（先乘除后加减，混合运算中的除法都能整除）
+        if op1 in ['x', '÷']:
+            temp = a * b if op1 == 'x' else a // b
+            final_result = temp + c if op2 == '+' else temp - c
+        else:
+            temp = b * c if op2 == 'x' else b // c
+            final_result = a + temp if op1 == '+' else a - temp
         
-        return f'{a} {op1} {b} {op2} {c} ='
+        return Problem(a, op1, b, op2, c, BRACKET_NONE, final_result, 0)
 
-    def _generate_addition_subtraction_expression(self, op1, op2):
-        """生成纯加减法的三个数表达式"""
+    def _generate_addition_subtraction_problem(self, op1, op2):
+        """生成纯加减法的三个数题目"""
         # 生成合理的数值组合，确保每一步和最终结果都为正数
         
         # 根据运算符组合生成不同的数值
         if op1 == '+' and op2 == '+':
             # a + b + c
-            a = random.randint(self.min_number, self.max_number)
-            b = random.randint(self.min_number, min(self.max_number, self.max_result - a - self.min_number))
-            c = random.randint(self.min_number, min(self.max_number, self.max_result - a - b))
+            a = self.random.randint(self.min_number, self.max_number)
+            b = self.random.randint(self.min_number, min(self.max_number, self.max_result - a - self.min_number))
+            c = self.random.randint(self.min_number, min(self.max_number, self.max_result - a - b))
             result = a + b + c
             
         elif op1 == '+' and op2 == '-':
             # a + b - c，确保a + b > c
-            c = random.randint(self.min_number, self.max_number)
-            temp_sum = random.randint(c + self.min_result, min(self.max_result + c, self.max_number * 2))
-            a = random.randint(self.min_number, min(self.max_number, temp_sum - self.min_number))
+            c = self.random.randint(self.min_number, self.max_number)
+            temp_sum = self.random.randint(c + self.min_result, min(self.max_result + c, self.max_number * 2))
+            a = self.random.randint(self.min_number, min(self.max_number, temp_sum - self.min_number))
             b = temp_sum - a
             if b > self.max_number:
                 b = self.max_number
@@ -401,25 +524,25 @@ class MathEngine:
             
         elif op1 == '-' and op2 == '+':
             # a - b + c，确保a > b
-            b = random.randint(self.min_number, self.max_number)
-            c = random.randint(self.min_number, self.max_number)
+            b = self.random.randint(self.min_number, self.max_number)
+            c = self.random.randint(self.min_number, self.max_number)
             min_a = b + self.min_result - c if c < self.min_result else b + 1
-            a = random.randint(max(self.min_number, min_a), self.max_number)
+            a = self.random.randint(max(self.min_number, min_a), self.max_number)
             result = a - b + c
             
         else:  # op1 == '-' and op2 == '-'
             # a - b - c，确保a > b + c
-            b = random.randint(self.min_number, self.max_number)
-            c = random.randint(self.min_number, self.max_number)
+            b = self.random.randint(self.min_number, self.max_number)
+            c = self.random.randint(self.min_number, self.max_number)
             min_a = b + c + self.min_result
             if min_a > self.max_number:
                 # 重新生成较小的b和c
-                total_subtract = random.randint(self.min_number, self.max_number - self.min_result)
-                b = random.randint(self.min_number, total_subtract)
+                total_subtract = self.random.randint(self.min_number, self.max_number - self.min_result)
+                b = self.random.randint(self.min_number, total_subtract)
                 c = total_subtract - b
-                a = total_subtract + random.randint(self.min_result, min(self.max_result, self.max_number - total_subtract))
+                a = total_subtract + self.random.randint(self.min_result, min(self.max_result, self.max_number - total_subtract))
             else:
-                a = random.randint(min_a, self.max_number)
+                a = self.random.randint(min_a, self.max_number)
             result = a - b - c
         
-        return f'{a} {op1} {b} {op2} {c} ='
\ No newline at end of file
+        return Problem(a, op1, b, op2, c, BRACKET_NONE, result, 0)
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""内存预算检查
+
+以最大规模（Constants.MAX_TOTAL_PROBLEMS道题：MAX_ROWS_PER_PAGE行、MAX_COLS_PER_PAGE列、
+MAX_FONT_SIZE字号，页数取总题数上限允许的最多页）按生产环境的流程（WorksheetBuilder.build_pdf，
+边生成边多进程渲染）生成练习卷，用tracemalloc记录主进程中Python分配的峰值，
+并读取主进程和渲染进程的峰值RSS，超出预算时以非零状态退出，避免工作进程在生产环境中内存耗尽。
+峰值RSS在POSIX上由resource模块读取；Windows上需要安装psutil（只能读取主进程），否则跳过RSS检查。
+
+每个场景在新的子进程中运行，互不影响峰值统计。报告中给出每道题的分配明细：
+题目字符串（生成和格式化）与段落对象（Preformatted/AlignedProblem）各占多少字节。
+
+使用方法：
+python memory_check.py
+python memory_check.py --report 内存报告.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from constants import Constants
+from worksheet_builder import WorksheetBuilder, get_default_settings
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
+
+# tracemalloc保存的调用栈深度，用于列出主要分配位置
+TRACE_FRAMES = 1
+
+
+def get_max_size_settings(**overrides):
+    """最大规模的设置：每页最大行列数、总题数上限内的最多页数、最大字号"""
+    settings = get_default_settings()
+    settings.update({
+        'rows_per_page': str(Constants.MAX_ROWS_PER_PAGE),
+        'cols_per_page': str(Constants.MAX_COLS_PER_PAGE),
+        'total_pages': str(min(Constants.MAX_TOTAL_PAGES, Constants.MAX_TOTAL_PROBLEMS //
+                               (Constants.MAX_ROWS_PER_PAGE * Constants.MAX_COLS_PER_PAGE))),
+        'font_size': str(Constants.MAX_FONT_SIZE),
+        'has_multiplication': True,
+        'has_division': True,
+    })
+    settings.update(overrides)
+    return settings
+
+
+# 检查的场景：名称 -> 设置
+SCENARIOS = {
+    'max_size': get_max_size_settings(),
+    'max_size_aligned': get_max_size_settings(align_equals=True),
+    'max_size_mixed': get_max_size_settings(has_mixed=True, num_count=Constants.NUM_COUNT_OPTIONS[1]),
+}
+
+
+def _get_peak_rss_bytes(children=False):
+    """进程的峰值RSS（Linux上ru_maxrss单位为KB，macOS上为字节）
+
+    参数:
+        children: 为True时返回已结束的子进程（渲染进程）中最大的峰值RSS
+
+    返回:
+        字节数，无法读取时返回None
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if children:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        return None
+    # Windows上的峰值工作集
+    return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+
+
+def measure_scenario(settings, seed=0, workers=None):
+    """按build_pdf的流程生成并渲染一份练习卷，测量各阶段的内存
+
+    参数:
+        settings: 用户设置字典
+        seed: 随机种子
+        workers: 渲染进程数，默认为CPU核数
+
+    返回:
+        测量结果字典（字节），无法读取的峰值RSS为None
+    """
+    builder = WorksheetBuilder()
+    plan = builder.make_plan(settings)
+    document = builder.pdf_generator.prepare_document(**plan['pdf_options'])
+
+    tracemalloc.start(TRACE_FRAMES)
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    # 题目字符串：生成后仍被引用的部分
+    problems = builder.generate_from_plan(plan, seed)
+    after_generate = tracemalloc.get_traced_memory()[0]
+    count = len(problems)
+
+    # 段落对象：单独构建一次，只计段落本身
+    content = document.build_content(problems)
+    after_flowables = tracemalloc.get_traced_memory()[0]
+    del content, problems
+
+    # 完整生成和渲染（生成题目、多进程排版、合并）时主进程的峰值
+    tracemalloc.reset_peak()
+    pdf_data = builder.build_pdf(settings, seed, workers=workers)
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    top_sites = [
+        {'location': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:5]
+    ]
+    return {
+        'problems': count,
+        'pdf_bytes': len(pdf_data),
+        'peak_traced_bytes': peak - baseline,
+        'peak_rss_bytes': _get_peak_rss_bytes(),
+        'peak_worker_rss_bytes': _get_peak_rss_bytes(children=True),
+        'per_problem': {
+            'problem_strings': round((after_generate - baseline) / count, 1),
+            'flowables': round((after_flowables - after_generate) / count, 1),
+            'render_peak': round((peak - baseline) / count, 1),
+        },
+        'retained_after_render_bytes': current - baseline,
+        'top_allocation_sites': top_sites,
+    }
+
+
+def run_checks(scenarios=None, traced_budget_mb=Constants.MEMORY_TRACED_BUDGET_MB,
+               rss_budget_mb=Constants.MEMORY_RSS_BUDGET_MB, workers=None):
+    """在独立的子进程中逐个运行场景并与预算比较
+
+    主进程和渲染进程的峰值RSS分别与rss_budget_mb比较，无法读取时跳过。
+
+    返回:
+        (结果字典, 问题描述列表)
+    """
+    scenarios = scenarios or SCENARIOS
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    problems = []
+    for name, settings in scenarios.items():
+        # 每个场景一个新进程，峰值RSS不受前一个场景影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(measure_scenario, settings, 0, workers).result()
+        results[name] = result
+
+        traced_mb = result['peak_traced_bytes'] / 1024 / 1024
+        per_problem = result['per_problem']
+        print(f"{name}: {result['problems']}道题, 峰值分配 {traced_mb:.1f} MB（预算 {traced_budget_mb} MB）")
+        for key, label in (('peak_rss_bytes', '主进程'), ('peak_worker_rss_bytes', '渲染进程')):
+            if result[key] is None:
+                print(f"  {label}峰值RSS: 无法读取（Windows上需要安装psutil），跳过")
+                continue
+            if not result[key]:
+                print(f"  {label}峰值RSS: 未启动（单进程渲染）")
+                continue
+            rss_mb = result[key] / 1024 / 1024
+            print(f"  {label}峰值RSS {rss_mb:.1f} MB（预算 {rss_budget_mb} MB）")
+            if rss_mb > rss_budget_mb:
+                problems.append(f'{name} {label}峰值RSS超出预算')
+        print(f"  每道题: 字符串 {per_problem['problem_strings']} B, 段落 {per_problem['flowables']} B, "
+              f"渲染峰值 {per_problem['render_peak']} B")
+
+        if traced_mb > traced_budget_mb:
+            problems.append(f'{name} 峰值分配超出预算')
+    return results, problems
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="检查最大规模练习卷的内存占用")
+    parser.add_argument('scenarios', nargs='*', help=f"要检查的场景（{', '.join(SCENARIOS)}），默认全部")
+    parser.add_argument('--traced-budget-mb', type=float, default=Constants.MEMORY_TRACED_BUDGET_MB,
+                        help="tracemalloc峰值预算（MB）")
+    parser.add_argument('--rss-budget-mb', type=float, default=Constants.MEMORY_RSS_BUDGET_MB,
+                        help="峰值RSS预算（MB）")
+    parser.add_argument('--jobs', '-j', type=int, help="渲染进程数，默认为CPU核数")
+    parser.add_argument('--report', help="把测量结果写入该JSON文件")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(unknown)}")
+
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios} or SCENARIOS
+    results, problems = run_checks(scenarios, args.traced_budget_mb, args.rss_budget_mb, args.jobs)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    for problem in problems:
+        print(f'失败: {problem}', file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,385 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import mm, inch
 from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Preformatted, BaseDocTemplate, Frame, PageTemplate
+from reportlab.platypus import SimpleDocTemplate, Preformatted, BaseDocTemplate, Frame, PageTemplate, Flowable
+import importlib.util
+import io
+import itertools
 import os
+from concurrent.futures import ProcessPoolExecutor, wait
 from constants import Constants
+from profiling import PROFILE_DOCUMENT, PROFILE_FLOWABLES, PROFILE_LAYOUT, PROFILE_MERGE, profile_stage
+from progress import STAGE_LAYOUT, STAGE_PAGES, STAGE_WRITE, ProgressWriter
+from text_metrics import GlyphWidthTable
+
+# pypdf只在合并多段PDF时使用，用到时才导入；未安装时退回单进程渲染
+HAS_PYPDF = importlib.util.find_spec('pypdf') is not None
+
+# 工作进程内复用的PDF生成器（每个进程只注册一次字体）
+_worker_generator = None
+
+
+def _render_pdf_part(args):
+    """在工作进程中渲染一段题目并返回PDF字节
+
+    参数:
+        args: (problems, options) 元组，options为传给create_pdf的关键字参数
+
+    返回:
+        该段PDF的字节内容
+    """
+    global _worker_generator
+    if _worker_generator is None:
+        _worker_generator = PDFGenerator()
+
+    problems, options = args
+    buffer = io.BytesIO()
+    _worker_generator.create_pdf(buffer, problems, **options)
+    return buffer.getvalue()
+
+
+def _progress_sink(output, progress):
+    """写出PDF的目标流：文件或真实的输出流包装为ProgressWriter，汇报写出的字节数
+
+    渲染到内存（BytesIO）时不汇报，写出进度只由最终写文件或写归档的一方汇报，
+    否则每份练习卷的内存缓冲区各自从0计数，STAGE_WRITE的进度会来回跳动。
+    """
+    if progress is None or isinstance(output, io.BytesIO):
+        return output
+    return ProgressWriter(output, progress)
+
+
+def merge_pdf_parts(part_pdfs, output, progress=None):
+    """把多个PDF的字节内容按顺序合并为一个文件
+
+    参数:
+        part_pdfs: 各段PDF的字节内容
+        output: 输出文件名，或可写的二进制流
+        progress: ProgressMonitor，响应取消，输出不是BytesIO时汇报写出的字节数
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for part_pdf in part_pdfs:
+        if progress is not None:
+            progress.check()
+        writer.append(PdfReader(io.BytesIO(part_pdf)))
+    _merge_identical_objects(writer)
+
+    if hasattr(output, 'write'):
+        writer.write(_progress_sink(output, progress))
+    else:
+        with open(output, 'wb') as f:
+            writer.write(_progress_sink(f, progress))
+
+
+def _merge_identical_objects(writer):
+    """分多轮合并相同对象
+
+    compress_identical_objects每次只合并内容完全相同的对象，字体文件合并后
+    引用它的字体描述、字体字典和页眉表单才会变得相同，因此按引用层数
+    （Constants.PDF_MERGE_PASSES）合并多轮。
+    """
+    for _ in range(Constants.PDF_MERGE_PASSES):
+        writer.compress_identical_objects()
+
+
+class PageChrome:
+    """页眉页脚装饰
+
+    标题、姓名/日期/得分栏和练习卷编号在每份文档中只绘制一次，
+    保存为表单XObject供每页引用；只有页码按页单独绘制。
+    页眉页脚含中文，字体须带中文字形（见PDFGenerator.chrome_font_name）。
+    """
+
+    FORM_NAME = 'worksheetChrome'
+    GLYPHS_FORM_NAME = 'worksheetChromeGlyphs'
+
+    def __init__(self, font_name, title=None, worksheet_id=None, first_page_number=1):
+        """初始化页眉页脚
+
+        参数:
+            font_name: 使用的字体名称（须含中文字形）
+            title: 页眉标题
+            worksheet_id: 练习卷编号
+            first_page_number: 第一页的页码
+        """
+        self.font_name = font_name
+        self.title = title or ''
+        self.worksheet_id = worksheet_id
+        self.first_page_number = first_page_number
+        self._form_canvas = None
+
+    def draw(self, canv, doc):
+        """PageTemplate的onPage回调，引用静态表单并绘制页码"""
+        # 每个画布（即每份文档）只定义一次表单
+        if self._form_canvas is not canv:
+            self._draw_static_form(canv, doc)
+            self._form_canvas = canv
+
+        canv.doForm(self.FORM_NAME)
+
+        page_width = doc.pagesize[0]
+        canv.saveState()
+        canv.setFont(self.font_name, Constants.PDF_FOOTER_FONT_SIZE)
+        canv.drawCentredString(page_width / 2, Constants.PDF_FOOTER_BASELINE,
+                               f'第 {self.first_page_number + doc.page - 1} 页')
+        canv.restoreState()
+
+    def _draw_static_form(self, canv, doc):
+        """把页眉和页脚中不随页变化的部分绘制为表单XObject"""
+        page_width, page_height = doc.pagesize
+        left = doc.leftMargin
+        right = page_width - doc.rightMargin
+
+        # 按固定顺序预先绘制表单和页码用到的字符（绘制到页面不引用的表单中），
+        # 使分段渲染时各段的嵌入字体子集完全一致，合并后可以共享同一个字体对象
+        canv.beginForm(self.GLYPHS_FORM_NAME)
+        canv.setFont(self.font_name, Constants.PDF_FOOTER_FONT_SIZE)
+        canv.drawString(0, 0, f'{self.title}姓名日期得分编号：_第页 0123456789{self.worksheet_id or ""}')
+        canv.endForm()
+
+        draw_methods = {'left': canv.drawString, 'center': canv.drawCentredString, 'right': canv.drawRightString}
+        canv.beginForm(self.FORM_NAME)
+        for x, y, text, font_size, anchor in self.get_static_items(page_width, page_height, left, right):
+            canv.setFont(self.font_name, font_size)
+            draw_methods[anchor](x, y, text)
+        canv.endForm()
+
+    def get_static_items(self, page_width, page_height, left, right):
+        """页眉页脚中不随页变化的文字及其位置
+
+        返回:
+            [(x, y, text, font_size, anchor)]，anchor为left/center/right
+        """
+        items = []
+        if self.title:
+            items.append((page_width / 2, page_height - Constants.PDF_TITLE_OFFSET, self.title,
+                          Constants.PDF_TITLE_FONT_SIZE, 'center'))
+
+        info_y = page_height - Constants.PDF_INFO_LINE_OFFSET
+        items.append((left, info_y, '姓名：__________', Constants.PDF_FOOTER_FONT_SIZE, 'left'))
+        items.append((page_width / 2, info_y, '日期：__________', Constants.PDF_FOOTER_FONT_SIZE, 'center'))
+        items.append((right, info_y, '得分：__________', Constants.PDF_FOOTER_FONT_SIZE, 'right'))
+
+        if self.worksheet_id:
+            items.append((right, Constants.PDF_FOOTER_BASELINE, f'编号：{self.worksheet_id}',
+                          Constants.PDF_FOOTER_FONT_SIZE, 'right'))
+        return items
+
+
+class AlignedProblem(Flowable):
+    """等号对齐的单行题目
+
+    等号左侧右对齐到equals_x，等号及右侧从equals_x开始绘制，
+    各位置在构建内容时已由字符宽度表算好，绘制时不再度量文字。
+    """
+
+    def __init__(self, left, right, left_x, equals_x, style):
+        super().__init__()
+        self.left = left
+        self.right = right
+        self.left_x = left_x
+        self.equals_x = equals_x
+        self.style = style
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = self.style.leading
+        return (self.width, self.height)
+
+    def draw(self):
+        # 基线位置与Preformatted一致
+        y = self.height - self.style.fontSize
+        self.canv.setFont(self.style.fontName, self.style.fontSize)
+        self.canv.drawString(self.left_x, y, self.left)
+        self.canv.drawString(self.equals_x, y, self.right)
+
+
+class MultiColumnDocTemplate(BaseDocTemplate):
+    """多列文档模板，可选绘制页眉页脚"""
+
+    def __init__(self, filename, cols=3, chrome=None, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.cols = cols
+        self.chrome = chrome
+
+    def build(self, flowables, **kwargs):
+        """构建多列布局，分栏模板只在第一次构建时创建，之后重复使用"""
+        if not self.pageTemplates:
+            self.addPageTemplates([self._make_page_template()])
+        super().build(flowables, **kwargs)
+
+    def _make_page_template(self):
+        """创建多列页面模板"""
+        frame_width = (self.width) / self.cols
+        # 绘制页脚时，分栏整体上移页脚高度
+        frame_bottom = Constants.PDF_FOOTER_HEIGHT if self.chrome else 0
+        frames = []
+        for i in range(self.cols):
+            left = self.leftMargin + i * frame_width
+            width = frame_width - Constants.PDF_FRAME_SPACING  # 留出间距
+            frame = Frame(left, frame_bottom,
+                        width, self.height - frame_bottom,
+                        leftPadding=Constants.PDF_FRAME_PADDING, bottomPadding=0, 
+                        rightPadding=Constants.PDF_FRAME_PADDING, topPadding=0)
+            frames.append(frame)
+
+        if self.chrome:
+            return PageTemplate(frames=frames, onPage=self.chrome.draw)
+        return PageTemplate(frames=frames)
+
+
+class WorksheetDocument:
+    """可重复渲染的文档布局
+
+    文档模板、分栏、样式和页眉页脚只创建一次，
+    生成多份练习卷时每份只需调用render。
+    """
+
+    def __init__(self, doc, style, rows_per_frame, align_equals=False):
+        """初始化文档布局
+
+        参数:
+            doc: MultiColumnDocTemplate实例
+            style: 题目段落样式
+            rows_per_frame: 每列实际容纳的行数
+            align_equals: 是否在每列内对齐等号
+        """
+        self.doc = doc
+        self.style = style
+        self.rows_per_frame = rows_per_frame
+        self.align_equals = align_equals
+
+    def render(self, output, problems, progress=None, worksheet_id=None):
+        """把题目渲染到文件或二进制流
+
+        参数:
+            output: 输出文件名，或可写的二进制流
+            problems: 题目列表
+            progress: ProgressMonitor，汇报排版的段落数、页数和写出的字节数（输出不是BytesIO时），并响应取消
+            worksheet_id: 本份的练习卷编号，替换创建布局时的编号（布局需带页眉页脚）
+        """
+        if worksheet_id is not None and self.doc.chrome is not None:
+            self.doc.chrome.worksheet_id = worksheet_id
+        with profile_stage(PROFILE_FLOWABLES):
+            content = self.build_content(problems)
+
+        per_page = self.rows_per_frame * self.doc.cols
+        total_pages = max(1, -(-len(problems) // per_page))
+        self.doc.setProgressCallBack(self._make_progress_callback(progress, len(content), total_pages))
+        with profile_stage(PROFILE_LAYOUT):
+            if not hasattr(output, 'write'):
+                self.doc.build(content, filename=output)
+            else:
+                self.doc.build(content, filename=_progress_sink(output, progress))
+
+        if progress is not None and not hasattr(output, 'write'):
+            size = os.path.getsize(output)
+            progress.report(STAGE_WRITE, size, size)
+
+    def build_content(self, problems):
+        """把题目转换为段落列表（Preformatted，或对齐等号时的AlignedProblem）"""
+        if self.align_equals:
+            return self._build_aligned_content(problems)
+
+        content = []
+        for i, prob in enumerate(problems):
+            p = Preformatted(f"{prob}", self.style)
+            content.append(p)
+        return content
+
+    def _make_progress_callback(self, progress, total, total_pages):
+        """把reportlab的排版进度转换为ProgressMonitor汇报，每个段落都检查取消"""
+        if progress is None:
+            return None
+
+        def on_progress(event, value):
+            if event == 'PAGE':
+                # 第value页开始排版时，前面的页已完成
+                progress.report(STAGE_PAGES, value - 1, total_pages)
+            elif event == 'FINISHED':
+                progress.report(STAGE_PAGES, total_pages, total_pages)
+            elif event == 'PROGRESS':
+                if value % Constants.PROGRESS_INTERVAL == 0 or value == total:
+                    progress.report(STAGE_LAYOUT, value, total)
+                else:
+                    progress.check()
+
+        return on_progress
+
+    def layout_first_page(self, problems):
+        """计算第一页的文字位置，供界面预览使用，不生成PDF
+
+        参数:
+            problems: 题目列表，只使用第一页能放下的部分
+
+        返回:
+            {'page_size': (宽, 高), 'frames': [(x, y, 宽, 高)],
+             'items': [(x, y, text, font_size, anchor)]}，坐标为PDF坐标（原点在左下角）
+        """
+        doc = self.doc
+        style = self.style
+        frames = doc._make_page_template().frames
+        problems = problems[:self.rows_per_frame * len(frames)]
+
+        if self.align_equals:
+            lines = [[(item.left_x, item.left), (item.equals_x, item.right)]
+                     for item in self._build_aligned_content(problems)]
+        else:
+            lines = [[(0, f"{prob}")] for prob in problems]
+
+        items = []
+        for index, parts in enumerate(lines):
+            frame = frames[index // self.rows_per_frame]
+            # 基线位置与Preformatted/AlignedProblem一致
+            top = frame._y1 + frame._height - frame._topPadding
+            y = top - (index % self.rows_per_frame) * style.leading - style.fontSize
+            for offset, text in parts:
+                items.append((frame._x1 + frame._leftPadding + offset, y, text, style.fontSize, 'left'))
+
+        if doc.chrome:
+            page_width, page_height = doc.pagesize
+            items.extend(doc.chrome.get_static_items(page_width, page_height, doc.leftMargin,
+                                                     page_width - doc.rightMargin))
+            items.append((page_width / 2, Constants.PDF_FOOTER_BASELINE,
+                          f'第 {doc.chrome.first_page_number} 页', Constants.PDF_FOOTER_FONT_SIZE, 'center'))
+
+        return {
+            'page_size': tuple(doc.pagesize),
+            'frames': [(frame._x1, frame._y1, frame._width, frame._height) for frame in frames],
+            'items': items,
+        }
+
+    def _build_aligned_content(self, problems):
+        """构建等号对齐的内容，每列取该列最宽的等号左侧作为对齐位置
+
+        参数:
+            problems: 题目列表
+
+        返回:
+            AlignedProblem列表
+        """
+        style = self.style
+        rows_per_frame = self.rows_per_frame
+        widths = GlyphWidthTable.get(style.fontName, style.fontSize)
+        content = []
+        for start in range(0, len(problems), rows_per_frame):
+            column = []
+            for prob in problems[start:start + rows_per_frame]:
+                prob = f"{prob}"
+                equals_pos = prob.find('=')
+                if equals_pos < 0:
+                    column.append((prob, ''))
+                else:
+                    column.append((prob[:equals_pos], prob[equals_pos:]))
+
+            left_widths = [widths.measure(left) for left, _ in column]
+            equals_x = max(left_widths)
+            for (left, right), left_width in zip(column, left_widths):
+                content.append(AlignedProblem(left, right, equals_x - left_width, equals_x, style))
+        return content
+
 
 class PDFGenerator:
     """PDF生成器"""
@@ -37,7 +413,20 @@ class PDFGenerator:
             if self._try_register_font(font_path, font_name):
                 self.font_name = font_name
                 break
+
+        # 页眉页脚的中文标签：找到的字体不含中文字形（Linux上的DejaVuSans或Helvetica）时改用中文CID字体
+        self.chrome_font_name = self.font_name
+        if not self._has_cjk_glyphs(self.font_name):
+            from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+            self.chrome_font_name = Constants.PDF_CHROME_CID_FONT
+            pdfmetrics.registerFont(UnicodeCIDFont(self.chrome_font_name))
     
+    @staticmethod
+    def _has_cjk_glyphs(font_name):
+        """TrueType字体是否含页眉页脚用到的中文字形"""
+        char_widths = getattr(pdfmetrics.getFont(font_name).face, 'charWidths', {})
+        return all(ord(char) in char_widths for char in '姓名日期得分编号第页')
+
     def _try_register_font(self, font_path, font_name):
         """尝试注册单个字体"""
         try:
@@ -48,47 +437,47 @@ class PDFGenerator:
             pass
         return False
     
-    def create_pdf(self, filename, problems, cols=3, font_size=16, per_col=25):
+    def create_pdf(self, filename, problems, cols=3, font_size=16, per_col=25,
+                   title=None, worksheet_id=None, first_page_number=1, align_equals=False,
+                   progress=None):
         """创建PDF文档
 
         参数：
-            filename: 输出文件名
+            filename: 输出文件名，或可写的二进制流（如BytesIO）
             problems: 题目列表
             cols: 每页列数
             font_size: 题目字号大小
             per_col: 每列题目数量
+            title: 页眉标题，与worksheet_id都为空时不绘制页眉页脚
+            worksheet_id: 页脚显示的练习卷编号
+            first_page_number: 第一页的页码
+            align_equals: 是否在每列内对齐等号
+            progress: ProgressMonitor，汇报排版和写出进度并响应取消
         """
-        # 自定义多列文档模板
-        class MultiColumnDocTemplate(BaseDocTemplate):
-            def __init__(self, filename, cols=3, **kwargs):
-                super().__init__(filename, **kwargs)
-                self.cols = cols
-
-            def build(self, flowables, **kwargs):
-                """构建多列布局"""
-                frame_width = (self.width) / self.cols
-                frames = []
-                for i in range(self.cols):
-                    left = self.leftMargin + i * frame_width
-                    width = frame_width - Constants.PDF_FRAME_SPACING  # 留出间距
-                    frame = Frame(left, 0,
-                                width, self.height,
-                                leftPadding=Constants.PDF_FRAME_PADDING, bottomPadding=0, 
-                                rightPadding=Constants.PDF_FRAME_PADDING, topPadding=0)
-                    frames.append(frame)
-
-                template = PageTemplate(frames=frames)
-                self.addPageTemplates([template])
-                super().build(flowables, **kwargs)
+        with profile_stage(PROFILE_DOCUMENT):
+            document = self.prepare_document(cols, font_size, per_col, title, worksheet_id,
+                                             first_page_number, align_equals)
+        document.render(filename, problems, progress)
+    
+    def prepare_document(self, cols=3, font_size=16, per_col=25, title=None, worksheet_id=None,
+                         first_page_number=1, align_equals=False):
+        """创建可重复使用的文档布局
+
+        参数与create_pdf相同（不含输出文件、题目和进度）
+
+        返回:
+            WorksheetDocument实例
+        """
+        chrome = self._make_chrome(title, worksheet_id, first_page_number)
 
         # 创建PDF文档
-        doc = MultiColumnDocTemplate(filename, cols=cols,
+        doc = MultiColumnDocTemplate(None, cols=cols, chrome=chrome,
                                    pagesize=letter,
                                    rightMargin=Constants.PDF_MARGIN, leftMargin=Constants.PDF_MARGIN,
                                    topMargin=Constants.PDF_TOP_MARGIN, bottomMargin=Constants.PDF_BOTTOM_MARGIN)
 
-        # 计算可用的列高度 (letter页面高度 - 上下边距)
-        available_height = letter[1] - Constants.PDF_TOP_MARGIN - Constants.PDF_BOTTOM_MARGIN
+        # 计算可用的列高度 (letter页面高度 - 上下边距 - 页脚)
+        available_height = self._get_available_height(chrome is not None)
 
         # 计算每道题目的最大高度，确保每列不超过指定数量
         max_line_height = available_height / per_col
@@ -99,15 +488,178 @@ class PDFGenerator:
         style.fontSize = font_size
         style.leading = max_line_height - font_size / inch  # 使用动态计算的行间距
 
-        # 添加内容
-        content = []
-        for i, prob in enumerate(problems):
-            p = Preformatted(f"{prob}", style)
-            content.append(p)
+        rows_per_frame = self._get_rows_per_frame(available_height, style.leading)
+        return WorksheetDocument(doc, style, rows_per_frame, align_equals)
+    
+    def get_preview_layout(self, problems, cols=3, font_size=16, per_col=25, title=None,
+                           worksheet_id=None, align_equals=False):
+        """计算第一页的预览布局（不生成PDF）
+
+        参数与create_pdf相同，problems只需包含第一页的题目
+
+        返回:
+            WorksheetDocument.layout_first_page的返回值
+        """
+        document = self.prepare_document(cols, font_size, per_col, title, worksheet_id,
+                                         align_equals=align_equals)
+        return document.layout_first_page(problems)
+    
+    def _make_chrome(self, title, worksheet_id, first_page_number=1):
+        """根据标题和编号创建页眉页脚，二者都为空时返回None"""
+        if not title and not worksheet_id:
+            return None
+        return PageChrome(self.chrome_font_name, title, worksheet_id, first_page_number)
+    
+    def _get_available_height(self, has_chrome=False):
+        """计算每列可用高度，绘制页脚时需预留页脚高度"""
+        available_height = letter[1] - Constants.PDF_TOP_MARGIN - Constants.PDF_BOTTOM_MARGIN
+        if has_chrome:
+            available_height -= Constants.PDF_FOOTER_HEIGHT
+        return available_height
+    
+    def get_problems_per_page(self, cols=3, font_size=16, per_col=25, has_chrome=False):
+        """计算每页实际容纳的题目数量
+
+        行高与create_pdf中的计算方式一致，每列能放下的行数可能略多于per_col
+
+        参数:
+            cols: 每页列数
+            font_size: 题目字号大小
+            per_col: 每列题目数量
+            has_chrome: 是否绘制页眉页脚
 
-        doc.build(content)
+        返回:
+            每页题目数量
+        """
+        available_height = self._get_available_height(has_chrome)
+        leading = available_height / per_col - font_size / inch
+        return cols * self._get_rows_per_frame(available_height, leading)
     
+    def _get_rows_per_frame(self, available_height, leading):
+        """计算每列实际能放下的行数"""
+        return max(1, int((available_height + 1e-6) // leading))
+    
+    def create_pdf_parallel(self, filename, problems, cols=3, font_size=16, per_col=25,
+                            title=None, worksheet_id=None, align_equals=False, workers=None,
+                            progress=None):
+        """按页范围多进程渲染PDF，并合并为一个文件
+
+        题目按整页切分为若干段，每段在进程池中独立渲染，
+        最后合并各段并去除重复的字体等资源对象。
+        页数较少、只有一个CPU核或未安装pypdf时直接调用create_pdf。
+
+        参数:
+            filename: 输出文件名，或可写的二进制流
+            problems: 题目列表
+            cols: 每页列数
+            font_size: 题目字号大小
+            per_col: 每列题目数量
+            title: 页眉标题
+            worksheet_id: 页脚显示的练习卷编号
+            align_equals: 是否在每列内对齐等号
+            workers: 工作进程数，默认为CPU核数；不超过CPU核数，
+                     且每个进程至少分到Constants.PDF_PARALLEL_MIN_PAGES_PER_WORKER页
+            progress: ProgressMonitor，按已完成的段汇报排版进度并响应取消
+        """
+        self.create_pdf_pipelined(filename, [problems], len(problems), cols, font_size, per_col,
+                                  title, worksheet_id, align_equals, workers, progress)
 
+    def create_pdf_pipelined(self, filename, batches, total_problems, cols=3, font_size=16, per_col=25,
+                             title=None, worksheet_id=None, align_equals=False, workers=None,
+                             progress=None):
+        """边接收题目边渲染：每凑满一段的题目就提交给进程池，不必等全部题目生成完
+
+        生成题目与已提交段的排版同时进行，总耗时接近两者中较长的一个而不是两者之和。
+        分段方式只取决于题目总数，与批次的大小无关，输出与create_pdf_parallel相同。
+        不满足多进程渲染条件时先收齐全部题目再调用create_pdf
+        （单进程中生成和排版都要占用解释器，用线程重叠不会更快）。
+
+        参数:
+            filename: 输出文件名，或可写的二进制流
+            batches: 依次产生题目列表的可迭代对象（如按页生成的题目）
+            total_problems: 题目总数
+            其余参数同create_pdf_parallel
+        """
+        options = {
+            'cols': cols,
+            'font_size': font_size,
+            'per_col': per_col,
+            'title': title,
+            'worksheet_id': worksheet_id,
+            'align_equals': align_equals
+        }
+        has_chrome = bool(title or worksheet_id)
+        per_page = self.get_problems_per_page(cols, font_size, per_col, has_chrome)
+        total_pages = -(-total_problems // per_page)
+        # 渲染是CPU密集的，进程数多于核数不会更快；每个进程的页数太少时固定开销占主导
+        cpu_count = os.cpu_count() or 1
+        workers = min(workers or cpu_count, cpu_count, total_pages // Constants.PDF_PARALLEL_MIN_PAGES_PER_WORKER)
+
+        if not HAS_PYPDF or workers <= 1 or total_pages < Constants.PDF_PARALLEL_MIN_PAGES:
+            problems = [problem for batch in batches for problem in batch]
+            self.create_pdf(filename, problems, progress=progress, **options)
+            return
+
+        # 按整页切分题目，保证各段的分页与单进程渲染一致
+        pages_per_part = -(-total_pages // workers)
+        part_size = pages_per_part * per_page
+
+        # 各段在工作进程中渲染，主进程只能记录等待的总时间
+        with profile_stage(PROFILE_LAYOUT):
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                # 收到的题目每凑满一段（或收完最后不满一段）就提交渲染
+                parts = []
+                futures = []
+                pending_problems = []
+                received = 0
+                for batch in itertools.chain(batches, [None]):
+                    if batch is not None:
+                        pending_problems.extend(batch)
+                    while len(pending_problems) >= part_size or (batch is None and pending_problems):
+                        part = pending_problems[:part_size]
+                        del pending_problems[:part_size]
+                        first_page_number = received // per_page + 1
+                        received += len(part)
+                        parts.append(len(part))
+                        futures.append(executor.submit(
+                            _render_pdf_part, (part, dict(options, first_page_number=first_page_number))
+                        ))
+
+                if progress is not None:
+                    # 定期汇报已完成的段，取消时不再等待剩余的段
+                    pending = set(futures)
+                    while pending:
+                        _, pending = wait(pending, timeout=Constants.PROGRESS_POLL_SECONDS)
+                        laid_out = sum(size for size, future in zip(parts, futures) if future.done())
+                        progress.report(STAGE_LAYOUT, laid_out, total_problems)
+                        progress.report(STAGE_PAGES, -(-laid_out // per_page), total_pages)
+                part_pdfs = [future.result() for future in futures]
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        # 合并各段PDF，相同的字体资源只保留一份
+        with profile_stage(PROFILE_MERGE):
+            merge_pdf_parts(part_pdfs, filename, progress)
+    
+    def create_pdf_bytes(self, problems, as_memoryview=False, parallel=False, **options):
+        """在内存中渲染PDF，不写入磁盘
+
+        参数:
+            problems: 题目列表
+            as_memoryview: 为True时返回底层缓冲区的memoryview，避免复制
+            parallel: 是否按页范围多进程渲染
+            **options: 传给create_pdf/create_pdf_parallel的其他参数
+
+        返回:
+            PDF内容的bytes或memoryview
+        """
+        buffer = io.BytesIO()
+        if parallel:
+            self.create_pdf_parallel(buffer, problems, **options)
+        else:
+            self.create_pdf(buffer, problems, **options)
+        return buffer.getbuffer() if as_memoryview else buffer.getvalue()
     
     def get_save_filename(self, save_path, has_addition, has_subtraction, has_multiplication, has_division, has_mixed):
         """生成保存文件名
@@ -0,0 +1,402 @@
+"""SQLite题库
+
+预先生成大量结构化题目（数值、运算符、括号位置、答案、难度和哈希）批量写入SQLite，
+按运算类型、数值范围和难度建立索引。组卷时按设置在索引上随机抽题，
+不必每次都通过MathEngine重新生成。
+
+抽题时先在覆盖全部筛选列的索引上统计每种运算类型中符合设置的题目数（按设置缓存），
+在[0, 题目数)中均匀抽取位置，位置从小到大排序后沿索引依次定位（每次从上一个定位到的索引项之后跳过若干项），
+一次抽题只顺序经过索引一遍，不把符合条件的编号读入内存；再按编号逐道主键查找。
+符合条件的每道题被抽到的概率相同，筛选条件越严格，统计和定位的代价越小。
+
+使用方法：
+python problem_bank.py build 题库.db --count 1000000 --settings 设置.json --seed 1
+（中断后以相同参数重新运行，从最后提交的一批之后继续）
+python problem_bank.py sample 题库.db --settings 设置.json --seed 7 -o 练习卷.pdf
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+from build_checkpoint import make_checkpoint, make_job_key, parse_checkpoint, set_rng_state
+from constants import Constants
+from difficulty import score_problems
+from math_engine import (BRACKET_ANSWER, BRACKET_NONE, Problem, format_problem, get_operation_key,
+                         get_operation_keys, get_problem_hash)
+from progress import STAGE_GENERATE
+from worksheet_builder import WorksheetBuilder
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS problems (
+    id INTEGER PRIMARY KEY,
+    hash INTEGER NOT NULL UNIQUE,
+    operation TEXT NOT NULL,
+    a INTEGER NOT NULL,
+    op1 TEXT NOT NULL,
+    b INTEGER NOT NULL,
+    op2 TEXT,
+    c INTEGER,
+    bracket INTEGER NOT NULL,
+    answer INTEGER NOT NULL,
+    remainder INTEGER NOT NULL,
+    min_operand INTEGER NOT NULL,
+    max_operand INTEGER NOT NULL,
+    difficulty INTEGER NOT NULL
+)
+'''
+
+# 建库任务的断点，与每批题目在同一事务中写入（见build_checkpoint）
+CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS build_checkpoints (
+    job TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+)
+'''
+
+# 二级索引在批量写入之后建立，第一次建库时不必在插入过程中维护。
+# 抽题条件的各列都在索引中，查找候选时只读索引，不必逐行回表检查
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_problems_filter '
+    'ON problems (operation, min_operand, max_operand, answer, bracket, difficulty)',
+)
+
+INSERT_SQL = '''
+INSERT OR IGNORE INTO problems
+    (hash, operation, a, op1, b, op2, c, bracket, answer, remainder, min_operand, max_operand, difficulty)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 抽题条件：数值范围、答案范围、括号位置和难度范围
+FILTER_SQL = '''
+    operation = ? AND min_operand >= ? AND max_operand <= ? AND answer BETWEEN ? AND ?
+    AND bracket <= ? AND difficulty BETWEEN ? AND ?
+'''
+
+# 符合条件的题目数：只读覆盖索引中 (运算类型, 最小数值) 起点之后的部分
+COUNT_SQL = f'SELECT COUNT(*) FROM problems INDEXED BY idx_problems_filter WHERE {FILTER_SQL}'
+
+# 索引中一种运算类型内的排列顺序（最后是隐含的主键）
+INDEX_ORDER = 'min_operand, max_operand, answer, bracket, difficulty, id'
+
+# 按索引顺序定位第OFFSET个符合条件的题目
+LOCATE_FIRST_SQL = (f'SELECT {INDEX_ORDER} FROM problems INDEXED BY idx_problems_filter WHERE {FILTER_SQL} '
+                    f'ORDER BY {INDEX_ORDER} LIMIT 1 OFFSET ?')
+
+# 从上一次定位到的索引项之后继续，跳过OFFSET个符合条件的题目。
+# 上一个索引项已满足最小数值的下界，去掉这一条件后索引才会按整个索引项查找起点
+NEXT_FILTER_SQL = '''
+    operation = ? AND max_operand <= ? AND answer BETWEEN ? AND ?
+    AND bracket <= ? AND difficulty BETWEEN ? AND ?
+'''
+LOCATE_NEXT_SQL = (f'SELECT {INDEX_ORDER} FROM problems INDEXED BY idx_problems_filter WHERE {NEXT_FILTER_SQL} '
+                   f'AND ({INDEX_ORDER}) > (?, ?, ?, ?, ?, ?) ORDER BY {INDEX_ORDER} LIMIT 1 OFFSET ?')
+
+PROBLEM_SQL = 'SELECT a, op1, b, op2, c, bracket, answer, remainder FROM problems WHERE id = ?'
+
+
+def make_rows(problems):
+    """把一批题目记录转换为插入题库的行（难度分整批向量化计算）"""
+    scores = score_problems(problems).tolist()
+    rows = []
+    for problem, score in zip(problems, scores):
+        operands = (problem.a, problem.b) if problem.c is None else (problem.a, problem.b, problem.c)
+        rows.append((
+            get_problem_hash(problem), get_operation_key(problem),
+            problem.a, problem.op1, problem.b, problem.op2, problem.c,
+            problem.bracket, problem.answer, problem.remainder,
+            min(operands), max(operands), score
+        ))
+    return rows
+
+
+class ProblemBank:
+    """SQLite题库"""
+
+    def __init__(self, path, builder=None):
+        """打开（或创建）题库
+
+        参数:
+            path: 数据库文件路径
+            builder: 生成题目和渲染用的WorksheetBuilder，默认新建
+        """
+        self.path = path
+        self.builder = builder or WorksheetBuilder()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute(SCHEMA)
+        self.connection.execute(CHECKPOINT_SCHEMA)
+        # (运算类型, 抽题条件) -> 符合条件的题目数，题库写入后清空
+        self._counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """关闭数据库连接"""
+        self.connection.close()
+
+    def count(self):
+        """题库中的题目数"""
+        return self.connection.execute('SELECT COUNT(*) FROM problems').fetchone()[0]
+
+    def create_indexes(self):
+        """建立二级索引（已存在时不做任何事）"""
+        with self.connection:
+            for sql in INDEXES:
+                self.connection.execute(sql)
+            self.connection.execute('ANALYZE')
+
+    def insert_problems(self, problems, batch_size=Constants.PROBLEM_BANK_BATCH_SIZE):
+        """批量插入题目，每batch_size道题一个事务，重复的题目（哈希相同）忽略
+
+        参数:
+            problems: Problem的可迭代对象
+            batch_size: 每个事务插入的题目数
+
+        返回:
+            实际新增的题目数
+        """
+        inserted = 0
+        batch = []
+        for problem in problems:
+            batch.append(problem)
+            if len(batch) >= batch_size:
+                inserted += self._insert_batch(make_rows(batch))
+                batch = []
+        if batch:
+            inserted += self._insert_batch(make_rows(batch))
+        return inserted
+
+    def _insert_batch(self, rows):
+        """在一个事务中插入一批行，返回新增行数"""
+        self._counts.clear()
+        before = self.connection.total_changes
+        with self.connection:
+            self.connection.executemany(INSERT_SQL, rows)
+        return self.connection.total_changes - before
+
+    def build(self, settings, count, seed=None, batch_size=Constants.PROBLEM_BANK_BATCH_SIZE, progress=None):
+        """按设置生成count道题写入题库，最后建立索引
+
+        生成和写入按批交替进行，内存占用与count无关。每批题目与断点（随机数生成器状态、
+        已完成的批数和新增题目数）在同一个事务中提交，中断后以相同参数重新运行时
+        从最后提交的一批之后继续，不会重复或遗漏批次。建好索引后删除断点。
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+            count: 生成的题目数（重复的题目只保存一次）
+            seed: 随机种子
+            batch_size: 每批生成和写入的题目数
+            progress: ProgressMonitor，按已生成的题目数汇报进度并响应取消
+
+        返回:
+            本任务（含中断前的部分）新增的题目数
+        """
+        plan = self.builder.make_plan(settings)
+        engine = self.builder.math_engine
+        engine.update_ranges(*plan['ranges'])
+        engine.seed(seed)
+
+        job = make_job_key(settings, count, seed, batch_size)
+        row = self.connection.execute('SELECT state FROM build_checkpoints WHERE job = ?', (job,)).fetchone()
+        checkpoint = parse_checkpoint(row[0], job) if row is not None else None
+        batches = inserted = 0
+        if checkpoint is not None:
+            set_rng_state(engine.random, checkpoint['rng_state'])
+            batches = checkpoint['batches']
+            inserted = checkpoint['written']
+
+        for start in range(batches * batch_size, count, batch_size):
+            if progress is not None:
+                progress.report(STAGE_GENERATE, start, count)
+            problems = self.builder.generate_problem_records(min(batch_size, count - start),
+                                                             plan['operation_settings'])
+            rows = make_rows(problems)
+            batches += 1
+            self._counts.clear()
+            with self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(INSERT_SQL, rows)
+                inserted += self.connection.total_changes - before
+                state = make_checkpoint(job, engine.random, batches, start + len(problems), inserted)
+                self.connection.execute('INSERT OR REPLACE INTO build_checkpoints (job, state) VALUES (?, ?)',
+                                        (job, json.dumps(state)))
+        if progress is not None:
+            progress.report(STAGE_GENERATE, count, count)
+
+        self.create_indexes()
+        with self.connection:
+            self.connection.execute('DELETE FROM build_checkpoints WHERE job = ?', (job,))
+        return inserted
+
+    def _get_filter(self, settings, difficulty=None):
+        """把设置转换为抽题条件参数（不含运算类型）"""
+        max_bracket = BRACKET_ANSWER if settings['allow_right_bracket'] else BRACKET_NONE
+        min_difficulty, max_difficulty = difficulty or (0, Constants.MAX_RANGE_VALUE)
+        return (
+            int(settings['min_number']), int(settings['max_number']),
+            int(settings['min_result']), int(settings['max_result']),
+            max_bracket, min_difficulty, max_difficulty
+        )
+
+    def count_candidates(self, key, conditions):
+        """一种运算类型中符合抽题条件的题目数（按条件缓存）
+
+        参数:
+            key: 运算类型
+            conditions: _get_filter返回的条件参数
+        """
+        cache_key = (key, conditions)
+        count = self._counts.get(cache_key)
+        if count is None:
+            count = self.connection.execute(COUNT_SQL, (key,) + conditions).fetchone()[0]
+            if len(self._counts) >= Constants.PROBLEM_BANK_CANDIDATE_CACHE_SIZE:
+                self._counts.pop(next(iter(self._counts)))
+            self._counts[cache_key] = count
+        return count
+
+    def locate_candidates(self, key, conditions, positions):
+        """按索引顺序定位一种运算类型中符合条件的第positions[i]道题
+
+        位置从小到大依次定位，每次从上一个定位到的索引项之后跳过若干项，
+        所有位置合起来只顺序经过索引一遍。
+
+        参数:
+            key: 运算类型
+            conditions: _get_filter返回的条件参数
+            positions: 位置的可迭代对象，每个都小于count_candidates的结果
+
+        返回:
+            {位置: 题目编号}
+        """
+        params = (key,) + conditions
+        cursor = self.connection.cursor()
+        located = {}
+        previous_entry = previous_position = None
+        for position in sorted(set(positions)):
+            if previous_entry is None:
+                entry = cursor.execute(LOCATE_FIRST_SQL, params + (position,)).fetchone()
+            else:
+                entry = cursor.execute(LOCATE_NEXT_SQL, (key,) + conditions[1:] + previous_entry
+                                       + (position - previous_position - 1,)).fetchone()
+            previous_entry, previous_position = entry, position
+            located[position] = entry[-1]
+        return located
+
+    def sample(self, settings, count, seed=None, difficulty=None):
+        """按设置随机抽取count道题
+
+        每道题先在有候选的运算类型中均匀选择一种，再在该类型符合条件的题目中均匀抽取，
+        题库较小时同一道题可能被抽到多次。
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+            count: 题目数量
+            seed: 随机种子，相同题库、设置和种子抽到相同的题目
+            difficulty: (最小难度, 最大难度)，None表示不限
+
+        返回:
+            Problem列表
+
+        异常:
+            ValueError: 题库中没有符合设置的题目
+        """
+        operation_settings = self.builder.get_operation_settings(settings)
+        conditions = self._get_filter(settings, difficulty)
+        groups = [(key, size) for key, size in
+                  ((key, self.count_candidates(key, conditions)) for key in get_operation_keys(operation_settings))
+                  if size]
+        if not groups:
+            raise ValueError("题库中没有符合设置的题目")
+
+        # 先抽出每道题的(运算类型, 位置)，再按运算类型批量定位编号
+        rng = random.Random(seed)
+        draws = []
+        for _ in range(count):
+            group = rng.randrange(len(groups))
+            draws.append((group, rng.randrange(groups[group][1])))
+        located = [self.locate_candidates(key, conditions, (position for group, position in draws if group == index))
+                   for index, (key, _) in enumerate(groups)]
+
+        cursor = self.connection.cursor()
+        return [Problem(*cursor.execute(PROBLEM_SQL, (located[group][position],)).fetchone())
+                for group, position in draws]
+
+    def sample_worksheet(self, settings, seed=None, difficulty=None):
+        """按设置的行数、列数和页数抽取一份练习卷的题目
+
+        返回:
+            题目字符串列表
+        """
+        plan = self.builder.make_plan(settings)
+        count = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+        return [format_problem(problem) for problem in self.sample(settings, count, seed, difficulty)]
+
+    def build_pdf(self, settings, seed=None, difficulty=None, workers=None):
+        """从题库抽题并渲染PDF
+
+        返回:
+            PDF内容的bytes
+        """
+        plan = self.builder.make_plan(settings)
+        problems = self.sample_worksheet(settings, seed, difficulty)
+        return self.builder.pdf_generator.create_pdf_bytes(problems, parallel=True, workers=workers,
+                                                           **plan['pdf_options'])
+
+
+def main(argv=None):
+    """命令行入口"""
+    from batch_export import load_settings
+
+    parser = argparse.ArgumentParser(description="建立SQLite题库或从题库抽题组卷")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="生成题目写入题库")
+    build_parser.add_argument('database', help="题库文件")
+    build_parser.add_argument('--count', type=int, required=True, help="生成的题目数")
+    build_parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同")
+    build_parser.add_argument('--seed', type=int, help="随机种子")
+    build_parser.add_argument('--batch-size', type=int, default=Constants.PROBLEM_BANK_BATCH_SIZE,
+                              help="每个事务插入的题目数")
+
+    sample_parser = subparsers.add_parser('sample', help="从题库抽题生成练习卷")
+    sample_parser.add_argument('database', help="题库文件")
+    sample_parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同")
+    sample_parser.add_argument('--seed', type=int, help="随机种子")
+    sample_parser.add_argument('--min-difficulty', type=int, help="最小难度")
+    sample_parser.add_argument('--max-difficulty', type=int, help="最大难度")
+    sample_parser.add_argument('-o', '--output', required=True, help="输出PDF文件")
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.settings)
+    with ProblemBank(args.database) as bank:
+        is_valid, error_msg = bank.builder.validate_settings(settings)
+        if not is_valid:
+            parser.error(error_msg)
+
+        if args.command == 'build':
+            inserted = bank.build(settings, args.count, args.seed, args.batch_size)
+            print(f'新增{inserted}道题，题库共{bank.count()}道题')
+            return
+
+        difficulty = None
+        if args.min_difficulty is not None or args.max_difficulty is not None:
+            difficulty = (args.min_difficulty or 0,
+                          Constants.MAX_RANGE_VALUE if args.max_difficulty is None else args.max_difficulty)
+        try:
+            pdf_data = bank.build_pdf(settings, args.seed, difficulty)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        with open(args.output, 'wb') as f:
+            f.write(pdf_data)
+        print(f'已生成 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
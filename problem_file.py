@@ -0,0 +1,352 @@
+"""定长二进制题库文件
+
+每道题保存为13字节的定长记录（数值为uint16/int16，运算符、括号、余数和难度为uint8），
+文件开头是16字节的文件头。读取时用mmap映射整个文件，再用NumPy frombuffer
+得到不复制数据的结构化数组，随机访问和切片都不需要解析。
+多个渲染进程打开同一个文件时共用操作系统的页缓存，各自不必加载或解析题库；
+ProblemFile可以直接传给进程池，工作进程中会重新映射文件而不是复制数据。
+
+文件头（小端）：
+    magic      4字节  b'MGPB'
+    version    uint16
+    recordsize uint16 每条记录的字节数
+    count      uint64 记录数
+
+使用方法：
+python problem_file.py build 题库.mgpb --count 1000000 --settings 设置.json --seed 1
+（中断后以相同参数重新运行，从最后一个断点继续）
+python problem_file.py sample 题库.mgpb --settings 设置.json --seed 7 -o 练习卷.pdf
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import numpy as np
+from build_checkpoint import CheckpointFile, make_checkpoint, make_job_key, set_rng_state
+from constants import Constants
+from difficulty import score_columns
+from math_engine import BRACKET_ANSWER, BRACKET_NONE, OPERATOR_CODES, Problem, format_problem, get_operation_keys
+from worksheet_builder import WorksheetBuilder
+
+HEADER = struct.Struct('<4sHHQ')
+
+RECORD_DTYPE = np.dtype([
+    ('a', '<u2'),
+    ('b', '<u2'),
+    ('c', '<u2'),
+    ('answer', '<i2'),
+    ('op1', 'u1'),
+    ('op2', 'u1'),
+    ('bracket', 'u1'),
+    ('remainder', 'u1'),
+    ('difficulty', 'u1'),
+])
+
+OPERATORS = {code: op for op, code in OPERATOR_CODES.items()}
+
+
+def _encode_operation_key(key):
+    """把运算类型（如 'x+'）编码为 op1 * 8 + op2"""
+    op2 = OPERATOR_CODES[key[1]] if len(key) > 1 else 0
+    return OPERATOR_CODES[key[0]] * 8 + op2
+
+
+def records_from_problems(problems):
+    """把题目记录列表转换为结构化数组
+
+    异常:
+        ValueError: 数值超出记录字段的范围
+    """
+    records = np.zeros(len(problems), dtype=RECORD_DTYPE)
+    if not problems:
+        return records
+
+    a, op1, b, op2, c, bracket, answer, remainder = zip(*problems)
+    operands = np.array([a, b, [value or 0 for value in c]], dtype=np.int64)
+    answers = np.array(answer, dtype=np.int64)
+    if operands.min() < 0 or operands.max() > 0xFFFF or answers.min() < -0x8000 or answers.max() >= 0x8000:
+        raise ValueError("题目数值超出记录范围")
+
+    records['a'], records['b'], records['c'] = operands
+    records['answer'] = answers
+    records['op1'] = [OPERATOR_CODES[op] for op in op1]
+    records['op2'] = [OPERATOR_CODES[op] for op in op2]
+    records['bracket'] = bracket
+    records['remainder'] = remainder
+    records['difficulty'] = np.minimum(score_columns(records), 0xFF)
+    return records
+
+
+def to_problem(record):
+    """把一条结构化记录转换为题目记录"""
+    op2 = OPERATORS[int(record['op2'])]
+    return Problem(
+        int(record['a']), OPERATORS[int(record['op1'])], int(record['b']),
+        op2, int(record['c']) if op2 is not None else None,
+        int(record['bracket']), int(record['answer']), int(record['remainder'])
+    )
+
+
+class ProblemFileWriter:
+    """逐批写入定长二进制题库文件"""
+
+    def __init__(self, path, resume_count=None):
+        """创建文件，或在已有文件的前resume_count条记录之后继续写
+
+        参数:
+            path: 题库文件路径
+            resume_count: 断点续做时已完成的记录数，之后的内容（中断前未完成的部分）被丢弃
+
+        异常:
+            ValueError: 续写的文件不是题库文件或比断点记录的短
+        """
+        self.path = path
+        if resume_count is None:
+            self.count = 0
+            self._file = open(path, 'wb')
+            self._file.write(HEADER.pack(Constants.PROBLEM_FILE_MAGIC, Constants.PROBLEM_FILE_VERSION,
+                                         RECORD_DTYPE.itemsize, 0))
+            return
+
+        self.count = resume_count
+        self._file = open(path, 'r+b')
+        magic, version, record_size, _ = HEADER.unpack(self._file.read(HEADER.size).ljust(HEADER.size, b'\0'))
+        offset = HEADER.size + resume_count * RECORD_DTYPE.itemsize
+        if (magic != Constants.PROBLEM_FILE_MAGIC or version != Constants.PROBLEM_FILE_VERSION
+                or record_size != RECORD_DTYPE.itemsize or self._file.seek(0, 2) < offset):
+            self._file.close()
+            raise ValueError(f"无法从断点继续写入: {path}")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, problems):
+        """追加一批题目"""
+        self.write_records(records_from_problems(problems))
+
+    def write_records(self, records):
+        """追加已编码的记录（RECORD_DTYPE结构化数组，如另一个题库文件的切片）"""
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def sync(self):
+        """把已写入的记录刷到磁盘（保存断点之前调用）
+
+        返回:
+            已完成部分的字节数
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        """回填记录数并关闭文件"""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(HEADER.pack(Constants.PROBLEM_FILE_MAGIC, Constants.PROBLEM_FILE_VERSION,
+                                     RECORD_DTYPE.itemsize, self.count))
+        self._file.close()
+
+
+def write_problem_file(path, settings, count, seed=None, builder=None,
+                       batch_size=Constants.PROBLEM_BANK_BATCH_SIZE,
+                       checkpoint_interval=Constants.CHECKPOINT_INTERVAL_BATCHES):
+    """按设置生成count道题写入二进制题库文件，生成和写入按批交替进行
+
+    每完成checkpoint_interval批，把记录刷到磁盘后保存断点（题库文件.checkpoint）。
+    以相同的设置、题目数、种子和批大小重新运行时从断点继续：
+    断点之后写了一半的记录被截掉，随机数生成器恢复到断点时的状态再继续生成。
+    全部完成后删除断点。
+
+    返回:
+        文件中的题目数
+    """
+    builder = builder or WorksheetBuilder()
+    plan = builder.make_plan(settings)
+    engine = builder.math_engine
+    engine.update_ranges(*plan['ranges'])
+    engine.seed(seed)
+
+    job = make_job_key(settings, count, seed, batch_size)
+    checkpoints = CheckpointFile(path)
+    checkpoint = checkpoints.load(job) if os.path.exists(path) else None
+    batches = 0
+    if checkpoint is not None:
+        set_rng_state(engine.random, checkpoint['rng_state'])
+        batches = checkpoint['batches']
+
+    with ProblemFileWriter(path, checkpoint['written'] if checkpoint is not None else None) as writer:
+        for start in range(batches * batch_size, count, batch_size):
+            writer.write(builder.generate_problem_records(min(batch_size, count - start),
+                                                          plan['operation_settings']))
+            batches += 1
+            if batches % checkpoint_interval == 0 and start + batch_size < count:
+                offset = writer.sync()
+                checkpoints.save(make_checkpoint(job, engine.random, batches, writer.count, writer.count, offset))
+    checkpoints.remove()
+    return writer.count
+
+
+class ProblemFile:
+    """只读映射的二进制题库文件"""
+
+    def __init__(self, path):
+        """映射文件并检查文件头
+
+        异常:
+            ValueError: 不是题库文件或版本不支持
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != Constants.PROBLEM_FILE_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"不是题库文件: {path}")
+        if version != Constants.PROBLEM_FILE_VERSION or record_size != RECORD_DTYPE.itemsize:
+            self._mmap.close()
+            raise ValueError(f"不支持的题库文件版本: {version}")
+
+        self.records = np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+
+    def __reduce__(self):
+        # 传给其他进程时只传路径，由对方重新映射
+        return ProblemFile, (self.path,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        """整数下标返回Problem，切片返回结构化数组的视图"""
+        if isinstance(index, slice):
+            return self.records[index]
+        return to_problem(self.records[index])
+
+    def close(self):
+        """释放映射
+
+        调用方仍持有切片得到的数组视图时映射不能立即关闭，等视图释放后由垃圾回收关闭。
+        """
+        self.records = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def get_problems(self, indices):
+        """按下标取出多道题"""
+        return [to_problem(record) for record in self.records[np.asarray(indices)]]
+
+    def select(self, settings, operation_keys, difficulty=None):
+        """符合设置的记录下标，按运算类型分组
+
+        参数:
+            settings: 用户设置字典
+            operation_keys: 运算类型列表（如 ['+', 'x-']）
+            difficulty: (最小难度, 最大难度)，None表示不限
+
+        返回:
+            {运算类型: 下标数组}
+        """
+        records = self.records
+        max_bracket = BRACKET_ANSWER if settings['allow_right_bracket'] else BRACKET_NONE
+        has_c = records['op2'] != 0
+        min_operand = np.minimum(records['a'], np.where(has_c, np.minimum(records['b'], records['c']), records['b']))
+        max_operand = np.maximum(records['a'], np.where(has_c, np.maximum(records['b'], records['c']), records['b']))
+
+        mask = (
+            (min_operand >= int(settings['min_number'])) & (max_operand <= int(settings['max_number']))
+            & (records['answer'] >= int(settings['min_result'])) & (records['answer'] <= int(settings['max_result']))
+            & (records['bracket'] <= max_bracket)
+        )
+        if difficulty is not None:
+            mask &= (records['difficulty'] >= difficulty[0]) & (records['difficulty'] <= difficulty[1])
+
+        operation = records['op1'].astype(np.uint16) * 8 + records['op2']
+        return {key: np.flatnonzero(mask & (operation == _encode_operation_key(key))) for key in operation_keys}
+
+    def sample(self, settings, count, seed=None, difficulty=None, builder=None):
+        """按设置随机抽取count道题（每道题先均匀选择运算类型，与ProblemBank.sample一致）
+
+        异常:
+            ValueError: 题库中没有符合设置的题目
+        """
+        builder = builder or WorksheetBuilder()
+        operation_settings = builder.get_operation_settings(settings)
+        selected = self.select(settings, get_operation_keys(operation_settings), difficulty)
+        candidates = [indices for indices in selected.values() if len(indices)]
+        if not candidates:
+            raise ValueError("题库中没有符合设置的题目")
+
+        rng = np.random.default_rng(seed)
+        choices = rng.integers(len(candidates), size=count)
+        indices = np.empty(count, dtype=np.int64)
+        for choice, group in enumerate(candidates):
+            positions = np.flatnonzero(choices == choice)
+            indices[positions] = group[rng.integers(len(group), size=len(positions))]
+        return self.get_problems(indices)
+
+
+def main(argv=None):
+    """命令行入口"""
+    from batch_export import load_settings
+
+    parser = argparse.ArgumentParser(description="生成定长二进制题库文件或从中抽题组卷")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="生成题目写入题库文件")
+    build_parser.add_argument('path', help="题库文件")
+    build_parser.add_argument('--count', type=int, required=True, help="生成的题目数")
+    build_parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同")
+    build_parser.add_argument('--seed', type=int, help="随机种子")
+
+    sample_parser = subparsers.add_parser('sample', help="从题库文件抽题生成练习卷")
+    sample_parser.add_argument('path', help="题库文件")
+    sample_parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同")
+    sample_parser.add_argument('--seed', type=int, help="随机种子")
+    sample_parser.add_argument('-o', '--output', required=True, help="输出PDF文件")
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.settings)
+    builder = WorksheetBuilder()
+    is_valid, error_msg = builder.validate_settings(settings)
+    if not is_valid:
+        parser.error(error_msg)
+
+    if args.command == 'build':
+        written = write_problem_file(args.path, settings, args.count, args.seed, builder)
+        print(f'已写入{written}道题到 {args.path}')
+        return
+
+    plan = builder.make_plan(settings)
+    count = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+    with ProblemFile(args.path) as problem_file:
+        try:
+            problems = problem_file.sample(settings, count, args.seed, builder=builder)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    pdf_data = builder.pdf_generator.create_pdf_bytes([format_problem(problem) for problem in problems],
+                                                      parallel=True, **plan['pdf_options'])
+    with open(args.output, 'wb') as f:
+        f.write(pdf_data)
+    print(f'已生成 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""已出题目的历史记录
+
+每个学生（或班级）保存一个Bloom过滤器，记录已经发给该学生的题目的规范哈希。
+生成练习卷时跳过过滤器中（很可能）已经出现过的题目，使学生不会反复做到同一道题。
+过滤器的大小只由容量和误判率决定，与已出的题目数无关；
+误判只会让少数没出过的题目被当作出过而跳过，不会让出过的题目漏判。
+
+文件格式（小端）：
+    magic       4字节  b'MGBF'
+    version     uint16
+    hash_count  uint16 每个元素设置的位数
+    bit_count   uint64 位数组长度
+    count       uint64 已加入的元素数
+    bits        位数组
+"""
+
+import math
+import os
+import re
+import struct
+import tempfile
+from constants import Constants
+
+HEADER = struct.Struct('<4sHHQQ')
+
+# 学生名中不能出现在文件名里的字符
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\s]')
+
+
+class BloomFilter:
+    """按64位题目哈希工作的Bloom过滤器"""
+
+    def __init__(self, bit_count, hash_count, bits=None, count=0):
+        """初始化过滤器
+
+        参数:
+            bit_count: 位数组长度
+            hash_count: 每个元素设置的位数
+            bits: 已有的位数组（bytearray），None表示全零
+            count: 已加入的元素数
+        """
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity=Constants.HISTORY_CAPACITY,
+                     false_positive_rate=Constants.HISTORY_FALSE_POSITIVE_RATE):
+        """按预计元素数和误判率创建过滤器
+
+        参数:
+            capacity: 预计加入的元素数，超出后误判率逐渐升高
+            false_positive_rate: 达到容量时的误判率
+        """
+        bit_count = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        hash_count = max(1, round(bit_count / capacity * math.log(2)))
+        return cls(bit_count, hash_count)
+
+    def _positions(self, value):
+        """元素对应的各个位（双重哈希：从64位哈希的高低两半派生hash_count个位置）"""
+        value &= 0xFFFFFFFFFFFFFFFF
+        low = value & 0xFFFFFFFF
+        high = (value >> 32) | 1
+        return [(low + i * high) % self.bit_count for i in range(self.hash_count)]
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def add(self, value):
+        """加入一个元素
+
+        返回:
+            True表示之前不在过滤器中（新元素），False表示很可能已经加入过
+        """
+        bits = self.bits
+        added = False
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    @property
+    def false_positive_rate(self):
+        """按已加入的元素数估计的当前误判率"""
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    def to_bytes(self):
+        """序列化为文件内容"""
+        header = HEADER.pack(Constants.HISTORY_FILE_MAGIC, Constants.HISTORY_FILE_VERSION,
+                             self.hash_count, self.bit_count, self.count)
+        return header + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """从文件内容恢复
+
+        异常:
+            ValueError: 不是历史记录文件或版本不支持
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("历史记录文件不完整")
+        magic, version, hash_count, bit_count, count = HEADER.unpack_from(data, 0)
+        if magic != Constants.HISTORY_FILE_MAGIC or version != Constants.HISTORY_FILE_VERSION:
+            raise ValueError("不是历史记录文件或版本不支持")
+        bits = bytearray(data[HEADER.size:])
+        if len(bits) != (bit_count + 7) // 8:
+            raise ValueError("历史记录文件不完整")
+        return cls(bit_count, hash_count, bits, count)
+
+
+class ProblemHistory:
+    """按学生保存Bloom过滤器的目录"""
+
+    def __init__(self, directory, capacity=Constants.HISTORY_CAPACITY,
+                 false_positive_rate=Constants.HISTORY_FALSE_POSITIVE_RATE):
+        """初始化
+
+        参数:
+            directory: 保存过滤器文件的目录
+            capacity: 新建过滤器的容量（每个学生预计收到的题目数）
+            false_positive_rate: 新建过滤器达到容量时的误判率
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, student):
+        """学生的过滤器文件路径"""
+        return os.path.join(self.directory, f"{UNSAFE_FILENAME_CHARS.sub('_', student)}.bloom")
+
+    def load(self, student):
+        """读取学生的过滤器，不存在时新建一个空的"""
+        try:
+            with open(self.get_path(student), 'rb') as f:
+                return BloomFilter.from_bytes(f.read())
+        except FileNotFoundError:
+            return BloomFilter.for_capacity(self.capacity, self.false_positive_rate)
+
+    def save(self, student, bloom):
+        """保存学生的过滤器（写临时文件后原子替换）"""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(bloom.to_bytes())
+            os.replace(temp_path, self.get_path(student))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,200 @@
+"""分阶段性能分析
+
+生成流程中的各阶段（验证设置、生成题目、创建文档模板、构建段落、排版、合并、写文件）
+用profile_stage包裹。没有启用StageProfiler时profile_stage不做任何事；
+启用后记录每个阶段的耗时，可选同时运行cProfile，最后写出JSON报告，
+其中包含各阶段耗时占比和最耗时的前N个函数。
+
+使用方法：
+python cli.py --profile 报告.json --cprofile
+MATHGEN_PROFILE=报告.json MATHGEN_PROFILE_CPROFILE=1 python main.py
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from constants import Constants
+
+# 阶段名称
+PROFILE_VALIDATE = 'validate'    # 验证设置
+PROFILE_GENERATE = 'generate'    # MathEngine生成题目
+PROFILE_DOCUMENT = 'document'    # 创建文档模板和样式
+PROFILE_FLOWABLES = 'flowables'  # 构建Preformatted/AlignedProblem段落
+PROFILE_LAYOUT = 'layout'        # reportlab doc.build（排版并输出PDF）
+PROFILE_MERGE = 'merge'          # 合并多进程渲染的各段
+PROFILE_WRITE = 'write'          # 写文件
+
+# 每个线程当前启用的分析器，没有时profile_stage不计时
+# （按线程区分，界面预览等其他线程的阶段不会混入正在分析的生成过程）
+_local = threading.local()
+
+
+def get_active_profiler():
+    """当前线程启用的分析器，没有时返回None"""
+    return getattr(_local, 'profiler', None)
+
+
+@contextmanager
+def profile_stage(name):
+    """记录一个阶段的耗时（未启用分析时不做任何事）
+
+    参数:
+        name: 阶段名称，同名阶段的耗时累加
+    """
+    profiler = get_active_profiler()
+    if profiler is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - started)
+
+
+class StageProfiler:
+    """分阶段计时器，可选同时运行cProfile
+
+    作为上下文管理器使用，在with块内执行的profile_stage都会被记录。
+    分析只覆盖进入with块的线程；生成流程自己启动的线程（如边生成边渲染的生成线程）
+    用profile_thread加入分析，其cProfile统计在报告中合并。
+    多进程渲染的工作进程不在分析范围内，需要定位排版热点时应使用单进程渲染。
+    """
+
+    def __init__(self, use_cprofile=False):
+        """初始化
+
+        参数:
+            use_cprofile: 是否同时运行cProfile以得到函数级热点
+        """
+        self.use_cprofile = use_cprofile
+        self.stages = {}
+        self.metadata = {}
+        self.total_seconds = 0.0
+        self._profile = None
+        self._thread_profiles = []
+        self._lock = threading.Lock()
+        self._started = None
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = get_active_profiler()
+        _local.profiler = self
+        if self.use_cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.total_seconds += time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        _local.profiler = self._previous
+        return False
+
+    @contextmanager
+    def profile_thread(self):
+        """在其他线程中加入本次分析：with块内的profile_stage计入本分析器，
+        启用cProfile时为该线程单独运行一个cProfile，结束后合并到热点统计中
+        """
+        previous = get_active_profiler()
+        _local.profiler = self
+        profile = None
+        if self.use_cprofile:
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12起cProfile基于sys.monitoring，同时只能启用一个，
+                # 且主线程的cProfile已覆盖所有线程
+                profile = None
+        try:
+            yield self
+        finally:
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    self._thread_profiles.append(profile)
+            _local.profiler = previous
+
+    def add(self, name, seconds):
+        """累加一个阶段的耗时"""
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+
+    def get_hotspots(self, top_n=Constants.PROFILE_TOP_N):
+        """按自身耗时排序的前top_n个函数（未启用cProfile时为空列表）"""
+        if self._profile is None:
+            return []
+
+        import pstats
+        stats = pstats.Stats(self._profile, *self._thread_profiles).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+        hotspots = []
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in rows:
+            hotspots.append({
+                'function': function,
+                'location': f'{os.path.basename(filename)}:{line}',
+                'calls': calls,
+                'self_seconds': round(tottime, 6),
+                'cumulative_seconds': round(cumtime, 6),
+            })
+        return hotspots
+
+    def get_report(self, top_n=Constants.PROFILE_TOP_N):
+        """生成报告字典"""
+        total = self.total_seconds
+        stages = {}
+        for name, stage in sorted(self.stages.items(), key=lambda item: item[1]['seconds'], reverse=True):
+            stages[name] = {
+                'seconds': round(stage['seconds'], 6),
+                'calls': stage['calls'],
+                'percent': round(stage['seconds'] / total * 100, 1) if total else 0.0,
+            }
+
+        return {
+            'total_seconds': round(total, 6),
+            'untracked_seconds': round(max(0.0, total - sum(s['seconds'] for s in self.stages.values())), 6),
+            'stages': stages,
+            'hotspots': self.get_hotspots(top_n),
+            'environment': {
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+            },
+            'metadata': self.metadata,
+        }
+
+    def write_report(self, path, top_n=Constants.PROFILE_TOP_N):
+        """把报告写为JSON文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_report(top_n), f, ensure_ascii=False, indent=2)
+
+    def format_summary(self):
+        """各阶段耗时的文字摘要"""
+        lines = [f'总耗时 {self.total_seconds:.3f}秒']
+        for name, stage in self.get_report(0)['stages'].items():
+            lines.append(f"  {name:<10} {stage['seconds']:.3f}秒 {stage['percent']:5.1f}%")
+        return '\n'.join(lines)
+
+
+def profiler_from_environment():
+    """根据环境变量创建分析器（供图形界面使用）
+
+    返回:
+        (StageProfiler, 报告路径)，未设置环境变量时为(None, None)
+    """
+    report_path = os.environ.get(Constants.PROFILE_ENV_VAR)
+    if not report_path:
+        return None, None
+    use_cprofile = os.environ.get(Constants.PROFILE_CPROFILE_ENV_VAR, '') not in ('', '0')
+    return StageProfiler(use_cprofile), report_path
@@ -0,0 +1,112 @@
+"""进度与取消
+
+生成题目、排版、写出PDF和批量生成的过程定期调用ProgressMonitor.report汇报进度，
+调用方（界面、命令行、服务）可随时调用cancel或设置超时，
+下一次汇报或检查时抛出GenerationCancelled，因此中止的延迟不超过一个汇报间隔
+"""
+
+import threading
+import time
+
+# 进度阶段（done/total的单位）
+STAGE_GENERATE = 'generate'      # 已生成的题目数
+STAGE_LAYOUT = 'layout'          # 已排版的段落数
+STAGE_PAGES = 'pages'            # 已排版的页数
+STAGE_WRITE = 'write'            # 已写出的字节数
+STAGE_WORKSHEETS = 'worksheets'  # 批量生成中已完成的练习卷份数
+
+
+class GenerationCancelled(Exception):
+    """生成过程被调用方取消或超时"""
+
+
+class ProgressMonitor:
+    """进度汇报与取消请求"""
+
+    def __init__(self, callback=None, timeout=None):
+        """初始化进度监视器
+
+        参数:
+            callback: 进度回调 callback(stage, done, total)，在工作线程中调用
+                      （批量打包时渲染和写出分别在不同线程），total为None表示总量未知
+            timeout: 超时时间（秒），超时后视为已取消，None表示不限时
+        """
+        self.callback = callback
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._cancel_event = threading.Event()
+        self._stage_started = {}
+
+    def cancel(self):
+        """请求取消（可在任意线程调用）"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        """是否已请求取消或已超时"""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self._cancel_event.set()
+        return self._cancel_event.is_set()
+
+    def check(self):
+        """已请求取消或已超时时抛出GenerationCancelled"""
+        if self.cancelled:
+            raise GenerationCancelled("生成超时" if self.deadline is not None and
+                                      time.monotonic() > self.deadline else "生成已取消")
+
+    def report(self, stage, done, total):
+        """汇报进度，同时检查是否已请求取消
+
+        参数:
+            stage: 阶段（STAGE_*）
+            done: 已完成数量
+            total: 总数量，None表示未知
+        """
+        self.check()
+        # 每个阶段从done为0（或第一次汇报）时开始计时，用于估算剩余时间
+        if done == 0 or stage not in self._stage_started:
+            self._stage_started[stage] = time.monotonic()
+        if self.callback:
+            self.callback(stage, done, total)
+
+    def eta(self, stage, done, total):
+        """按该阶段目前的速度估算剩余秒数
+
+        返回:
+            剩余秒数，无法估算时返回None
+        """
+        started = self._stage_started.get(stage)
+        if started is None or not done or not total:
+            return None
+        elapsed = time.monotonic() - started
+        return elapsed * (total - done) / done
+
+
+class ProgressWriter:
+    """包装可写的二进制流，写入时汇报已写出的字节数"""
+
+    def __init__(self, stream, progress):
+        """初始化
+
+        参数:
+            stream: 可写的二进制流
+            progress: ProgressMonitor
+        """
+        self.stream = stream
+        self.progress = progress
+        self.written = 0
+
+    def write(self, data):
+        """写入数据并汇报"""
+        count = self.stream.write(data)
+        self.written += len(data)
+        self.progress.report(STAGE_WRITE, self.written, None)
+        return count
+
+    def tell(self):
+        """当前写入位置"""
+        return self.stream.tell()
+
+    def flush(self):
+        """刷新底层流"""
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
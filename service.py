@@ -0,0 +1,254 @@
+"""练习卷HTTP服务
+
+基于asyncio的本地HTTP服务：POST JSON设置（键与界面设置相同，可附带seed），
+返回生成的PDF。生成和渲染在进程池中进行，前面是等待队列，
+正在生成和排队的请求达到工作进程数加队列长度时返回429，超时返回504
+
+使用方法：
+python service.py --port 8765 --workers 4
+curl -X POST -d '{"has_multiplication": true, "seed": 42}' http://127.0.0.1:8765/worksheet -o 练习.pdf
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from constants import Constants
+from progress import GenerationCancelled, ProgressMonitor
+from worksheet_builder import WorksheetBuilder, get_default_settings
+
+# 工作进程内复用的构建器
+_worker_builder = None
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    504: 'Gateway Timeout',
+}
+
+
+def _init_worker():
+    """工作进程初始化：字体注册等只做一次"""
+    global _worker_builder
+    _worker_builder = WorksheetBuilder()
+
+
+def _build_worksheet(settings, seed, timeout):
+    """在工作进程中生成并渲染一份练习卷，超过timeout秒时中止并释放进程"""
+    # 服务本身已按进程并行，单份练习卷不再开子进程
+    return _worker_builder.build_pdf(settings, seed, workers=1, progress=ProgressMonitor(timeout=timeout))
+
+
+class WorksheetService:
+    """练习卷HTTP服务"""
+
+    def __init__(self, host='127.0.0.1', port=Constants.SERVICE_DEFAULT_PORT, workers=None,
+                 queue_size=Constants.SERVICE_QUEUE_SIZE, timeout=Constants.SERVICE_TIMEOUT):
+        """初始化服务
+
+        参数:
+            host: 监听地址
+            port: 监听端口，0表示由系统分配
+            workers: 工作进程数，默认为CPU核数
+            queue_size: 等待队列长度，所有工作进程都在生成且已有queue_size个请求排队时，新请求返回429
+            timeout: 单个请求的超时时间（秒）
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.builder = WorksheetBuilder()
+        self._executor = None
+        self._queue = None
+        # 已接受但尚未完成的请求数（排队中和生成中）
+        self._pending = 0
+        self._dispatchers = []
+        self._server = None
+
+    async def start(self):
+        """启动进程池、分发任务和监听端口"""
+        # 工作进程按需创建，fork会继承已接受连接的套接字导致连接无法关闭，
+        # 因此使用forkserver/spawn启动
+        start_methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker)
+        # 容量由generate按_pending检查：突发请求到达时分发任务还来不及取走任务，
+        # 只按队列长度限制会在工作进程空闲时就拒绝请求
+        self._queue = asyncio.Queue()
+        # 每个工作进程对应一个分发任务，进程池中不会积压额外的任务
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self):
+        """启动并一直运行服务"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _dispatch(self):
+        """从队列取出任务交给进程池执行"""
+        loop = asyncio.get_running_loop()
+        while True:
+            settings, seed, future, deadline = await self._queue.get()
+            try:
+                # 请求已超时放弃时跳过，不再占用进程
+                remaining = deadline - loop.time()
+                if future.done() or remaining <= 0:
+                    continue
+                try:
+                    # 工作进程按剩余时间自行中止，超时的请求不会一直占用进程
+                    result = await loop.run_in_executor(self._executor, _build_worksheet,
+                                                        settings, seed, remaining)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self._pending -= 1
+                self._queue.task_done()
+
+    async def generate(self, settings, seed=None):
+        """提交一份练习卷并等待结果
+
+        参数:
+            settings: 设置字典
+            seed: 随机种子
+
+        返回:
+            (status, content_type, body)
+        """
+        is_valid, error_msg = self.builder.validate_settings(settings)
+        if not is_valid:
+            return 400, 'application/json', self._json_body({'error': error_msg})
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._pending >= self.workers + self.queue_size:
+            return 429, 'application/json', self._json_body({'error': "服务繁忙，请稍后重试"})
+        self._pending += 1
+        self._queue.put_nowait((settings, seed, future, loop.time() + self.timeout))
+
+        try:
+            pdf_data = await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, GenerationCancelled):
+            # 工作进程按剩余时间自行中止时抛出GenerationCancelled，可能早于wait_for超时
+            return 504, 'application/json', self._json_body({'error': "生成超时"})
+        except Exception as e:
+            return 500, 'application/json', self._json_body({'error': f"生成数学题时发生错误: {str(e)}"})
+        return 200, 'application/pdf', pdf_data
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个HTTP连接（每个连接只处理一个请求）"""
+        try:
+            status, content_type, body = await self._handle_request(reader)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, content_type, body = 400, 'application/json', self._json_body({'error': "请求格式错误"})
+
+        headers = [
+            f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}',
+            f'Content-Type: {content_type}',
+            f'Content-Length: {len(body)}',
+            'Connection: close',
+        ]
+        if status == 429:
+            headers.append('Retry-After: 1')
+        try:
+            writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader):
+        """解析请求并返回(status, content_type, body)"""
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        method, path, _ = request_line.split(' ', 2)
+
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                content_length = int(value.strip())
+
+        if path == '/health':
+            return 200, 'application/json', self._json_body({
+                'status': 'ok',
+                'workers': self.workers,
+                'queued': self._queue.qsize(),
+                'queue_size': self.queue_size,
+            })
+        if path != '/worksheet':
+            return 404, 'application/json', self._json_body({'error': "未找到"})
+        if method != 'POST':
+            return 405, 'application/json', self._json_body({'error': "请使用POST"})
+        if content_length > Constants.SERVICE_MAX_BODY_BYTES:
+            return 413, 'application/json', self._json_body({'error': "请求内容过大"})
+
+        body = await reader.readexactly(content_length) if content_length else b'{}'
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return 400, 'application/json', self._json_body({'error': "请求内容不是有效的JSON"})
+        if not isinstance(request, dict):
+            return 400, 'application/json', self._json_body({'error': "请求内容必须是JSON对象"})
+
+        seed = request.pop('seed', None)
+        settings = get_default_settings()
+        settings.update(request)
+        return await self.generate(settings, seed)
+
+    def _json_body(self, data):
+        """把字典编码为JSON响应体"""
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地练习卷生成HTTP服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=Constants.SERVICE_DEFAULT_PORT, help="监听端口")
+    parser.add_argument('--workers', type=int, help="工作进程数，默认为CPU核数")
+    parser.add_argument('--queue-size', type=int, default=Constants.SERVICE_QUEUE_SIZE, help="等待队列长度")
+    parser.add_argument('--timeout', type=float, default=Constants.SERVICE_TIMEOUT, help="单个请求超时(秒)")
+    args = parser.parse_args(argv)
+
+    service = WorksheetService(args.host, args.port, args.workers, args.queue_size, args.timeout)
+    print(f'练习卷服务运行于 http://{args.host}:{args.port}/worksheet')
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""多机分片生成题库
+
+一个题库由设置、题目总数和主种子确定。题目按固定大小的块编号，每块的种子由主种子和块号派生，
+各块可以独立生成；分片规格（主种子, 分片序号, 分片数）把连续的若干块分给一台机器。
+各台机器不需要任何协调或共享状态，生成的分片互不重叠，合起来恰好是整个题库；
+块的内容与分片数无关，分成4片还是16片，合并后的题库完全相同。
+
+每个分片写成定长二进制题库文件（见problem_file），旁边附带清单（分片.mgpb.shard.json），
+记录分片规格、负责的题目范围和记录部分的SHA-256。合并时先检查所有分片属于同一个题库、
+序号不缺不重、范围首尾相接、记录数和校验和都与清单一致，全部通过后才按序号拼接输出。
+分片生成同样按断点续做（见build_checkpoint），中断后以相同参数重新运行即可继续。
+
+使用方法：
+python sharding.py generate 分片0.mgpb --count 10000000 --master-seed 42 --shard 0/8 --settings 设置.json
+python sharding.py merge 题库.mgpb 分片*.mgpb
+python sharding.py merge 题库.db 分片*.mgpb
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from build_checkpoint import CheckpointFile, make_checkpoint, make_job_key
+from constants import Constants
+from problem_bank import ProblemBank
+from problem_file import HEADER, RECORD_DTYPE, ProblemFile, ProblemFileWriter, to_problem
+from worksheet_builder import WorksheetBuilder
+
+
+def derive_block_seed(master_seed, block):
+    """由主种子和块号派生该块的种子（64位）"""
+    digest = hashlib.blake2b(f'{master_seed}:{block}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def get_shard_blocks(count, shard_index, shard_count, block_size=Constants.SHARD_BLOCK_SIZE):
+    """分片负责的块范围：全部块按序号均分，前后分片的块数最多相差1
+
+    返回:
+        range(起始块号, 结束块号)
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"分片序号必须在0-{shard_count - 1}之间")
+    total_blocks = -(-count // block_size)
+    return range(shard_index * total_blocks // shard_count, (shard_index + 1) * total_blocks // shard_count)
+
+
+def get_shard_range(count, shard_index, shard_count, block_size=Constants.SHARD_BLOCK_SIZE):
+    """分片负责的题目范围 [起始, 结束)"""
+    blocks = get_shard_blocks(count, shard_index, shard_count, block_size)
+    return min(blocks.start * block_size, count), min(blocks.stop * block_size, count)
+
+
+def file_checksum(path):
+    """题库文件记录部分（不含文件头）的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(HEADER.size)
+        for chunk in iter(lambda: f.read(Constants.SHARD_READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_manifest_path(path):
+    """分片文件对应的清单文件路径"""
+    return path + Constants.SHARD_MANIFEST_SUFFIX
+
+
+def generate_shard(path, settings, count, master_seed, shard_index, shard_count, builder=None,
+                   block_size=Constants.SHARD_BLOCK_SIZE, checkpoint_interval=Constants.CHECKPOINT_INTERVAL_BATCHES):
+    """生成一个分片写入题库文件，并写出清单
+
+    参数:
+        path: 分片文件路径
+        settings: 用户设置字典（需已通过验证）
+        count: 整个题库的题目数
+        master_seed: 主种子，所有分片必须相同
+        shard_index: 分片序号，从0开始
+        shard_count: 分片数
+        builder: 生成题目用的WorksheetBuilder，默认新建
+        block_size: 每块的题目数，所有分片必须相同
+        checkpoint_interval: 每完成多少块保存一次断点
+
+    返回:
+        清单字典
+    """
+    builder = builder or WorksheetBuilder()
+    plan = builder.make_plan(settings)
+    engine = builder.math_engine
+    engine.update_ranges(*plan['ranges'])
+
+    blocks = get_shard_blocks(count, shard_index, shard_count, block_size)
+    start, end = get_shard_range(count, shard_index, shard_count, block_size)
+    # 任务标识不含分片序号和分片数，合并时用它确认各分片属于同一个题库
+    job = make_job_key(settings, count, master_seed, block_size)
+    shard_job = make_job_key(settings, count, f'{master_seed}/{shard_index}/{shard_count}', block_size)
+
+    # 清单最后写出，未写完的分片没有清单，合并时会被发现
+    try:
+        os.remove(get_manifest_path(path))
+    except FileNotFoundError:
+        pass
+
+    checkpoints = CheckpointFile(path)
+    checkpoint = checkpoints.load(shard_job) if os.path.exists(path) else None
+    done = checkpoint['batches'] if checkpoint is not None else 0
+
+    with ProblemFileWriter(path, checkpoint['written'] if checkpoint is not None else None) as writer:
+        for block in blocks[done:]:
+            # 每块单独播种，块的内容只取决于主种子和块号
+            engine.seed(derive_block_seed(master_seed, block))
+            block_start = block * block_size
+            writer.write(builder.generate_problem_records(min(block_size, count - block_start),
+                                                          plan['operation_settings']))
+            done += 1
+            if done % checkpoint_interval == 0 and done < len(blocks):
+                offset = writer.sync()
+                checkpoints.save(make_checkpoint(shard_job, engine.random, done, writer.count, writer.count, offset))
+
+    manifest = {
+        'version': Constants.SHARD_MANIFEST_VERSION,
+        'job': job,
+        'master_seed': master_seed,
+        'shard_index': shard_index,
+        'shard_count': shard_count,
+        'total_count': count,
+        'block_size': block_size,
+        'start': start,
+        'end': end,
+        'records': writer.count,
+        'sha256': file_checksum(path),
+    }
+    with open(get_manifest_path(path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    checkpoints.remove()
+    return manifest
+
+
+def load_manifest(path):
+    """读取分片文件的清单
+
+    异常:
+        ValueError: 清单不存在或版本不支持
+    """
+    try:
+        with open(get_manifest_path(path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"分片缺少清单（可能尚未生成完）: {path}")
+    if manifest.get('version') != Constants.SHARD_MANIFEST_VERSION:
+        raise ValueError(f"不支持的分片清单版本: {path}")
+    return manifest
+
+
+def verify_shards(shard_paths):
+    """检查分片能否合并为完整的题库
+
+    返回:
+        按分片序号排列的 [(分片文件路径, 清单)]
+
+    异常:
+        ValueError: 分片属于不同的题库、序号缺失或重复、范围不连续、记录数或校验和不符
+    """
+    shards = [(path, load_manifest(path)) for path in shard_paths]
+    if not shards:
+        raise ValueError("没有指定分片")
+
+    first = shards[0][1]
+    for path, manifest in shards:
+        if any(manifest[key] != first[key] for key in ('job', 'shard_count', 'total_count', 'block_size')):
+            raise ValueError(f"分片不属于同一个题库: {path}")
+
+    indexes = [manifest['shard_index'] for _, manifest in shards]
+    duplicated = sorted({index for index in indexes if indexes.count(index) > 1})
+    missing = sorted(set(range(first['shard_count'])) - set(indexes))
+    if duplicated:
+        raise ValueError(f"分片重复: {', '.join(map(str, duplicated))}")
+    if missing:
+        raise ValueError(f"缺少分片: {', '.join(map(str, missing))}")
+
+    shards.sort(key=lambda shard: shard[1]['shard_index'])
+    for path, manifest in shards:
+        expected = get_shard_range(manifest['total_count'], manifest['shard_index'], manifest['shard_count'],
+                                   manifest['block_size'])
+        if (manifest['start'], manifest['end']) != expected or manifest['records'] != expected[1] - expected[0]:
+            raise ValueError(f"分片的题目范围不正确: {path}")
+        with ProblemFile(path) as shard_file:
+            records = len(shard_file)
+        if records != manifest['records']:
+            raise ValueError(f"分片记录数与清单不符（文件不完整）: {path}")
+        if file_checksum(path) != manifest['sha256']:
+            raise ValueError(f"分片校验和不符（文件已损坏或被修改）: {path}")
+    return shards
+
+
+def merge_shards(output, shard_paths, builder=None):
+    """校验并按分片序号合并分片
+
+    参数:
+        output: 输出的题库文件；以.db结尾时写入SQLite题库并建立索引
+        shard_paths: 分片文件路径列表（顺序任意）
+        builder: 写入SQLite题库时使用的WorksheetBuilder
+
+    返回:
+        写入输出文件的题目数；写入SQLite题库时重复的题目被忽略，不计入
+
+    异常:
+        ValueError: 分片未通过verify_shards的检查
+    """
+    shards = verify_shards(shard_paths)
+    chunk_records = Constants.SHARD_READ_CHUNK_SIZE // RECORD_DTYPE.itemsize
+
+    if output.endswith('.db'):
+        inserted = 0
+        with ProblemBank(output, builder) as bank:
+            for path, _ in shards:
+                with ProblemFile(path) as shard_file:
+                    inserted += bank.insert_problems(to_problem(record) for record in shard_file.records)
+            bank.create_indexes()
+        return inserted
+
+    with ProblemFileWriter(output) as writer:
+        for path, _ in shards:
+            with ProblemFile(path) as shard_file:
+                for start in range(0, len(shard_file), chunk_records):
+                    writer.write_records(shard_file[start:start + chunk_records])
+    return writer.count
+
+
+def parse_shard(text):
+    """解析 "序号/分片数" 形式的分片规格，如 "3/8"（序号从0开始）"""
+    index, separator, count = text.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片规格应为 序号/分片数: {text}")
+    if not separator or count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片规格应为 序号/分片数，序号从0开始: {text}")
+    return index, count
+
+
+def main(argv=None):
+    """命令行入口"""
+    from batch_export import load_settings
+
+    parser = argparse.ArgumentParser(description="多机分片生成题库，并校验合并各分片")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="生成一个分片")
+    generate_parser.add_argument('path', help="分片文件")
+    generate_parser.add_argument('--count', type=int, required=True, help="整个题库的题目数")
+    generate_parser.add_argument('--master-seed', type=int, required=True, help="主种子，所有分片相同")
+    generate_parser.add_argument('--shard', type=parse_shard, required=True, metavar='序号/分片数',
+                                 help="本机生成的分片，如 0/8")
+    generate_parser.add_argument('--settings', help="设置文件(JSON)，键与界面设置相同，所有分片相同")
+
+    merge_parser = subparsers.add_parser('merge', help="校验并合并分片")
+    merge_parser.add_argument('output', help="输出的题库文件(.mgpb)或SQLite题库(.db)")
+    merge_parser.add_argument('shards', nargs='+', help="全部分片文件")
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        try:
+            merged = merge_shards(args.output, args.shards)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f'已校验{len(args.shards)}个分片，合并{merged}道题到 {args.output}')
+        return
+
+    settings = load_settings(args.settings)
+    builder = WorksheetBuilder()
+    is_valid, error_msg = builder.validate_settings(settings)
+    if not is_valid:
+        parser.error(error_msg)
+    shard_index, shard_count = args.shard
+    manifest = generate_shard(args.path, settings, args.count, args.master_seed, shard_index, shard_count, builder)
+    print(f"分片{shard_index}/{shard_count}：第{manifest['start']}-{manifest['end']}道题，"
+          f"已写入 {args.path}（SHA-256 {manifest['sha256']}）")
+
+
+if __name__ == '__main__':
+    main()
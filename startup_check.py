@@ -0,0 +1,103 @@
+"""启动耗时检查
+
+在子进程中用 python -X importtime 导入各入口模块，检查：
+1. 入口模块的累计导入耗时不超过预算
+2. 启动时没有导入reportlab/pypdf（它们推迟到第一次生成PDF时才导入）
+
+超出预算或提前导入时以非零状态退出，可在发布前或持续集成中运行。
+
+使用方法：
+python startup_check.py
+python startup_check.py --budget-ms 100 main cli
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from constants import Constants
+
+# 默认检查的入口模块
+DEFAULT_MODULES = ('main', 'cli', 'service')
+
+
+def measure_import(module, repeat=3):
+    """在全新的子进程中导入模块并解析 -X importtime 的输出
+
+    多次测量取最小值，减少磁盘缓存和系统负载的影响。
+
+    参数:
+        module: 模块名
+        repeat: 测量次数
+
+    返回:
+        (累计导入耗时毫秒, 导入的全部模块名集合)
+    """
+    best_ms = None
+    imported = set()
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        )
+
+        cumulative_us = None
+        for line in result.stderr.splitlines():
+            # 格式: "import time: self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not cumulative.strip().isdigit():
+                continue
+            imported.add(name.strip())
+            if name.strip() == module and not name[1:].startswith(' '):
+                cumulative_us = int(cumulative)
+
+        if cumulative_us is not None:
+            elapsed_ms = cumulative_us / 1000
+            best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+
+    return best_ms, imported
+
+
+def check_startup(modules=DEFAULT_MODULES, budget_ms=Constants.STARTUP_IMPORT_BUDGET_MS):
+    """检查各入口模块的导入耗时和提前导入的模块
+
+    返回:
+        问题描述列表，为空表示全部通过
+    """
+    problems = []
+    for module in modules:
+        elapsed_ms, imported = measure_import(module)
+        deferred = sorted(name for name in imported
+                          if name.split('.')[0] in Constants.STARTUP_DEFERRED_MODULES)
+
+        if elapsed_ms is None:
+            problems.append(f'{module} 未能测量导入耗时')
+            continue
+
+        print(f'{module}: {elapsed_ms:.1f} ms（预算 {budget_ms} ms）')
+        if elapsed_ms > budget_ms:
+            problems.append(f'{module} 导入耗时超出预算')
+        if deferred:
+            problems.append(f'{module} 启动时导入了 {", ".join(deferred[:5])}')
+    return problems
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="检查入口模块的导入耗时")
+    parser.add_argument('modules', nargs='*', default=list(DEFAULT_MODULES), help="要检查的模块")
+    parser.add_argument('--budget-ms', type=float, default=Constants.STARTUP_IMPORT_BUDGET_MS,
+                        help="每个模块的导入耗时预算（毫秒）")
+    args = parser.parse_args(argv)
+
+    problems = check_startup(args.modules, args.budget_ms)
+    for problem in problems:
+        print(f'失败: {problem}', file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""字形宽度度量
+
+按(字体, 字号)缓存单个字符的宽度，供等号对齐排版使用，
+避免对每道题目调用reportlab的度量函数
+"""
+
+from reportlab.pdfbase import pdfmetrics
+
+# 题目中会出现的字符：数字、运算符、括号、全角空格、余数省略号等
+PROBLEM_CHARS = '0123456789+-x÷=(). 　'
+
+
+class GlyphWidthTable:
+    """单个(字体, 字号)的字符宽度表
+
+    同一进程内相同字体和字号共享一张表，跨文档复用。
+    """
+
+    _tables = {}
+
+    @classmethod
+    def get(cls, font_name, font_size):
+        """获取(可能已缓存的)字符宽度表
+
+        参数:
+            font_name: 字体名称
+            font_size: 字号
+
+        返回:
+            GlyphWidthTable实例
+        """
+        key = (font_name, font_size)
+        table = cls._tables.get(key)
+        if table is None:
+            table = cls(font_name, font_size)
+            cls._tables[key] = table
+        return table
+
+    def __init__(self, font_name, font_size):
+        """初始化宽度表，预先计算题目常用字符的宽度
+
+        参数:
+            font_name: 字体名称
+            font_size: 字号
+        """
+        self.font_name = font_name
+        self.font_size = font_size
+        self.widths = {
+            ch: pdfmetrics.stringWidth(ch, font_name, font_size) for ch in PROBLEM_CHARS
+        }
+
+    def measure(self, text):
+        """计算字符串宽度，未登记的字符首次遇到时再查询并缓存"""
+        widths = self.widths
+        total = 0
+        for ch in text:
+            width = widths.get(ch)
+            if width is None:
+                width = widths[ch] = pdfmetrics.stringWidth(ch, self.font_name, self.font_size)
+            total += width
+        return total
@@ -10,18 +10,25 @@ from constants import Constants
 class UIGenerator:
     """用户界面生成器"""
     
-    def __init__(self, root, generate_callback=None):
+    def __init__(self, root, generate_callback=None, cancel_callback=None, preview_callback=None):
         """初始化UI生成器
         
         参数:
             root: tkinter根窗口
             generate_callback: 生成按钮的回调函数
+            cancel_callback: 取消按钮的回调函数
+            preview_callback: 预览回调 preview_callback(settings)，返回第一页布局字典、
+                              无法预览时的提示文字，或None表示暂未就绪（稍后重试）
         """
         self.root = root
         self.generate_callback = generate_callback
+        self.cancel_callback = cancel_callback
+        self.preview_callback = preview_callback
+        self._preview_job = None
         self.setup_window()
         self.create_variables()
         self.create_widgets()
+        self.watch_settings()
         
     def setup_window(self):
         """设置窗口属性"""
@@ -65,11 +72,21 @@ class UIGenerator:
         # 字体大小
         self.font_size = tk.StringVar(value=str(Constants.DEFAULT_FONT_SIZE))
         
+        # 页眉标题（为空时不绘制页眉页脚）
+        self.page_title = tk.StringVar(value=Constants.DEFAULT_TITLE)
+        
+        # 每列内对齐等号
+        self.align_equals = tk.BooleanVar(value=False)
+        
         # 括号位置设置
         self.allow_right_bracket = tk.BooleanVar(value=False)
         
         # 保存路径
         self.save_path = tk.StringVar(value=Constants.DEFAULT_SAVE_PATH)
+        
+        # 生成进度
+        self.progress_value = tk.DoubleVar(value=0)
+        self.status_text = tk.StringVar(value="")
     
     def create_widgets(self):
         """创建界面组件"""
@@ -111,6 +128,9 @@ class UIGenerator:
         
         # 生成按钮
         self.create_generate_button(main_frame)
+        
+        # 第一页预览
+        self.create_preview_frame(main_frame)
     
     def create_problem_type_frame(self, parent):
         """创建题目类型选择框架"""
@@ -166,6 +186,7 @@ class UIGenerator:
         self._create_labeled_entry(page_frame, "每页行数:", self.rows_per_page, 0, 0)
         self._create_labeled_entry(page_frame, "每页列数:", self.cols_per_page, 0, 2)
         self._create_labeled_entry(page_frame, "总页数:", self.total_pages, 0, 4)
+        ttk.Checkbutton(page_frame, text="每列对齐等号", variable=self.align_equals).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
     
     def create_font_settings_frame(self, parent):
         """创建字体设置框架"""
@@ -173,6 +194,7 @@ class UIGenerator:
         font_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
         self._create_labeled_entry(font_frame, "字体大小:", self.font_size, 0, 0)
+        self._create_labeled_entry(font_frame, "页眉标题:", self.page_title, 0, 2, width=20)
     
     def create_bracket_settings_frame(self, parent):
         """创建括号设置框架"""
@@ -190,8 +212,107 @@ class UIGenerator:
         ttk.Button(path_frame, text="浏览", command=self.browse_save_path).grid(row=0, column=1)
     
     def create_generate_button(self, parent):
-        """创建生成按钮"""
-        ttk.Button(parent, text="生成数学题", command=self.generate_callback).grid(row=8, column=0, columnspan=2, pady=20)
+        """创建生成按钮、取消按钮和进度条"""
+        button_frame = ttk.Frame(parent)
+        button_frame.grid(row=8, column=0, columnspan=2, pady=(10, 5))
+        
+        self.generate_button = ttk.Button(button_frame, text="生成数学题", command=self.generate_callback)
+        self.generate_button.grid(row=0, column=0, padx=(0, 10))
+        self.cancel_button = ttk.Button(button_frame, text="取消", command=self.cancel_callback, state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=1)
+        
+        ttk.Progressbar(parent, variable=self.progress_value, maximum=100).grid(row=9, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        ttk.Label(parent, textvariable=self.status_text).grid(row=10, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+    
+    def set_running(self, running):
+        """切换生成中/空闲状态：生成中禁用生成按钮、启用取消按钮"""
+        self.generate_button.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if running else tk.DISABLED)
+        if running:
+            self.progress_value.set(0)
+    
+    def update_progress(self, percent, text):
+        """更新进度条和状态文字
+        
+        参数:
+            percent: 进度百分比(0-100)
+            text: 状态文字
+        """
+        self.progress_value.set(percent)
+        self.status_text.set(text)
+    
+    def create_preview_frame(self, parent):
+        """创建第一页预览框架"""
+        preview_frame = ttk.LabelFrame(parent, text="第一页预览", padding="5")
+        preview_frame.grid(row=0, column=2, rowspan=11, sticky=(tk.N, tk.S), padx=(10, 0))
+        
+        # 纸张为letter尺寸(8.5x11英寸)
+        self.preview_canvas = tk.Canvas(preview_frame, width=Constants.PREVIEW_WIDTH,
+                                        height=round(Constants.PREVIEW_WIDTH * 11 / 8.5),
+                                        background='#d9d9d9', highlightthickness=0)
+        self.preview_canvas.grid(row=0, column=0)
+    
+    def watch_settings(self):
+        """设置变化时刷新预览（防抖：停止输入后才刷新）"""
+        for variable in (self.has_addition, self.has_subtraction, self.has_multiplication,
+                         self.has_division, self.has_mixed, self.num_count,
+                         self.min_number, self.max_number, self.min_result, self.max_result,
+                         self.rows_per_page, self.cols_per_page, self.total_pages,
+                         self.font_size, self.page_title, self.align_equals, self.allow_right_bracket):
+            variable.trace_add('write', self.schedule_preview)
+        self.schedule_preview()
+    
+    def schedule_preview(self, *args):
+        """在设置停止变化PREVIEW_DEBOUNCE_MS毫秒后刷新预览"""
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(Constants.PREVIEW_DEBOUNCE_MS, self.refresh_preview)
+    
+    def refresh_preview(self):
+        """立即刷新预览"""
+        self._preview_job = None
+        if self.preview_callback is None:
+            return
+        
+        layout = self.preview_callback(self.get_user_settings())
+        if layout is None:
+            self.draw_preview_message("预览加载中...")
+            self.schedule_preview()
+        elif isinstance(layout, str):
+            self.draw_preview_message(layout)
+        else:
+            self.draw_preview(layout)
+    
+    def draw_preview_message(self, message):
+        """在预览区域显示提示文字"""
+        canvas = self.preview_canvas
+        canvas.delete('all')
+        canvas.create_text(int(canvas['width']) // 2, int(canvas['height']) // 2, text=message,
+                           width=int(canvas['width']) - 20, justify=tk.CENTER)
+    
+    def draw_preview(self, layout):
+        """按PDF坐标把第一页布局缩放绘制到预览画布上
+        
+        参数:
+            layout: PDFGenerator.get_preview_layout返回的布局字典
+        """
+        canvas = self.preview_canvas
+        canvas.delete('all')
+        page_width, page_height = layout['page_size']
+        scale = int(canvas['width']) / page_width
+        
+        canvas.create_rectangle(0, 0, page_width * scale, page_height * scale, fill='white', outline='')
+        for x, y, width, height in layout['frames']:
+            canvas.create_rectangle(x * scale, (page_height - y - height) * scale,
+                                    (x + width) * scale, (page_height - y) * scale,
+                                    outline='#e0e0e0', dash=(2, 2))
+        
+        anchors = {'left': tk.SW, 'center': tk.S, 'right': tk.SE}
+        for x, y, text, font_size, anchor in layout['items']:
+            # 负数字号表示像素
+            font = (Constants.PREVIEW_FONT_FAMILY, -max(1, round(font_size * scale)))
+            canvas.create_text(x * scale, (page_height - y) * scale, text=text,
+                               anchor=anchors[anchor], font=font)
     
     def browse_save_path(self):
         """浏览保存路径"""
@@ -221,6 +342,8 @@ class UIGenerator:
             'cols_per_page': self.cols_per_page.get(),
             'total_pages': self.total_pages.get(),
             'font_size': self.font_size.get(),
+            'title': self.page_title.get(),
+            'align_equals': self.align_equals.get(),
             'allow_right_bracket': self.allow_right_bracket.get(),
             'save_path': self.save_path.get()
         }
@@ -0,0 +1,549 @@
+"""练习卷构建器
+
+不依赖图形界面的生成流程：验证设置、生成题目、渲染PDF，
+供图形界面和其他入口共用
+"""
+
+import contextlib
+import io
+import queue
+import random
+import threading
+from constants import Constants
+from math_engine import DEFAULT_PROBLEM, MathEngine, format_problem, get_operation_keys, get_problem_hash
+from profiling import PROFILE_GENERATE, get_active_profiler, profile_stage
+from progress import STAGE_GENERATE
+
+def get_default_settings():
+    """获取与界面默认值一致的设置字典"""
+    return {
+        'has_addition': True,
+        'has_subtraction': True,
+        'has_multiplication': False,
+        'has_division': False,
+        'has_mixed': False,
+        'num_count': Constants.NUM_COUNT_OPTIONS[0],
+        'min_number': str(Constants.DEFAULT_MIN_NUMBER),
+        'max_number': str(Constants.DEFAULT_MAX_NUMBER),
+        'min_result': str(Constants.DEFAULT_MIN_RESULT),
+        'max_result': str(Constants.DEFAULT_MAX_RESULT),
+        'rows_per_page': str(Constants.DEFAULT_ROWS_PER_PAGE),
+        'cols_per_page': str(Constants.DEFAULT_COLS_PER_PAGE),
+        'total_pages': str(Constants.DEFAULT_TOTAL_PAGES),
+        'font_size': str(Constants.DEFAULT_FONT_SIZE),
+        'title': Constants.DEFAULT_TITLE,
+        'align_equals': False,
+        'allow_right_bracket': False,
+        'sort_by_difficulty': False,
+        'difficulty_mix': None,
+        'show_worksheet_id': False,
+        'save_path': Constants.DEFAULT_SAVE_PATH
+    }
+
+
+class WorksheetBuilder:
+    """练习卷构建器"""
+
+    def __init__(self, math_engine=None, pdf_generator=None, cache=None):
+        """初始化练习卷构建器
+
+        参数:
+            math_engine: 数学引擎，默认新建
+            pdf_generator: PDF生成器，默认在第一次使用时新建
+            cache: WorksheetCache实例，为None时不使用缓存
+        """
+        self.math_engine = math_engine or MathEngine()
+        self._pdf_generator = pdf_generator
+        self._pdf_generator_lock = threading.Lock()
+        self.cache = cache
+
+    @property
+    def pdf_generator(self):
+        """PDF生成器
+
+        导入reportlab和注册字体需要几百毫秒，推迟到第一次使用时进行，
+        界面和命令行启动时不受影响。
+        """
+        if self._pdf_generator is None:
+            with self._pdf_generator_lock:
+                if self._pdf_generator is None:
+                    from pdf_generator import PDFGenerator
+                    self._pdf_generator = PDFGenerator()
+        return self._pdf_generator
+
+    @property
+    def is_warm(self):
+        """PDF生成器是否已创建（之后使用pdf_generator不会等待导入和字体注册）"""
+        return self._pdf_generator is not None
+
+    def warm_up(self):
+        """提前导入reportlab并注册字体（可在后台线程中调用），使第一次生成不必等待"""
+        return self.pdf_generator
+
+    def validate_settings(self, settings):
+        """验证用户设置
+
+        参数:
+            settings: 用户设置字典
+
+        返回:
+            (is_valid, error_message)
+        """
+        try:
+            # 验证数字范围
+            min_number = int(settings['min_number'])
+            max_number = int(settings['max_number'])
+
+            if not (Constants.MIN_RANGE_VALUE <= min_number <= Constants.MAX_RANGE_VALUE):
+                return False, f"最小数字必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
+
+            if not (Constants.MIN_RANGE_VALUE <= max_number <= Constants.MAX_RANGE_VALUE):
+                return False, f"最大数字必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
+
+            # 验证结果范围
+            min_result = int(settings['min_result'])
+            max_result = int(settings['max_result'])
+
+            if not (Constants.MIN_RANGE_VALUE <= min_result <= Constants.MAX_RANGE_VALUE):
+                return False, f"最小结果必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
+
+            if not (Constants.MIN_RANGE_VALUE <= max_result <= Constants.MAX_RANGE_VALUE):
+                return False, f"最大结果必须在{Constants.MIN_RANGE_VALUE}-{Constants.MAX_RANGE_VALUE}之间"
+
+            # 验证页面设置
+            page_limits = (
+                ('rows_per_page', "每页行数", Constants.MIN_ROWS_PER_PAGE, Constants.MAX_ROWS_PER_PAGE),
+                ('cols_per_page', "每页列数", Constants.MIN_COLS_PER_PAGE, Constants.MAX_COLS_PER_PAGE),
+                ('total_pages', "总页数", Constants.MIN_TOTAL_PAGES, Constants.MAX_TOTAL_PAGES),
+                ('font_size', "字体大小", Constants.MIN_FONT_SIZE, Constants.MAX_FONT_SIZE),
+            )
+            for key, label, low, high in page_limits:
+                if not (low <= int(settings[key]) <= high):
+                    return False, f"{label}必须在{low}-{high}之间"
+
+            total_problems = int(settings['rows_per_page']) * int(settings['cols_per_page']) * int(settings['total_pages'])
+            if total_problems > Constants.MAX_TOTAL_PROBLEMS:
+                return False, f"总题数({total_problems})不能超过{Constants.MAX_TOTAL_PROBLEMS}"
+
+            # 验证运算类型
+            operation_settings = self.get_operation_settings(settings)
+            if not any(value for key, value in operation_settings.items() if key.startswith('has_')):
+                return False, "请至少选择一种运算类型"
+
+            # 每种运算先试出一道题，范围内出不了题时在这里提示，而不是生成到一半失败
+            probe = MathEngine(seed=Constants.PREVIEW_SEED)
+            probe.update_ranges(min_number, max_number, min_result, max_result, settings['allow_right_bracket'])
+            for operation in get_operation_keys(operation_settings):
+                try:
+                    probe.generate_operation_problem(operation)
+                except ValueError:
+                    return False, f"当前的数字和结果范围内无法生成“{operation}”运算的题目，请调整范围"
+
+            # 验证难度比例
+            difficulty_mix = settings.get('difficulty_mix')
+            if difficulty_mix:
+                if any(name not in Constants.DIFFICULTY_BANDS for name in difficulty_mix):
+                    return False, f"难度档必须是{'、'.join(Constants.DIFFICULTY_BANDS)}之一"
+                weights = [float(weight) for weight in difficulty_mix.values()]
+                if any(weight < 0 for weight in weights) or not sum(weights) > 0:
+                    return False, "难度比例必须为非负数且不能全为0"
+                if settings.get('show_worksheet_id') and not all(weight.is_integer() for weight in weights):
+                    return False, "显示练习卷编号时难度比例必须为整数"
+
+            # PDF设置验证已移除，新的create_pdf函数会自动处理
+
+            return True, ""
+
+        except ValueError:
+            return False, "请输入有效的数字"
+        except Exception as e:
+            return False, f"设置验证失败: {str(e)}"
+
+    def get_operation_settings(self, settings):
+        """获取运算设置
+
+        参数:
+            settings: 用户设置字典
+
+        返回:
+            运算设置字典
+        """
+        # 处理数字数量选择
+        num_count = 2 if settings['num_count'] == '2个数字' else 3
+
+        return {
+            'has_addition': settings['has_addition'],
+            'has_subtraction': settings['has_subtraction'],
+            'has_multiplication': settings['has_multiplication'],
+            'has_division': settings['has_division'],
+            'has_mixed': settings['has_mixed'],
+            'num_count': num_count
+        }
+
+    def get_save_filename(self, settings):
+        """根据设置生成保存文件名"""
+        operation_settings = self.get_operation_settings(settings)
+        return self.pdf_generator.get_save_filename(
+            settings['save_path'],
+            operation_settings['has_addition'],
+            operation_settings['has_subtraction'],
+            operation_settings['has_multiplication'],
+            operation_settings['has_division'],
+            operation_settings['has_mixed']
+        )
+
+    def make_plan(self, settings):
+        """把设置解析为生成计划
+
+        计划只依赖设置，批量生成多份练习卷时只需计算一次。
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+
+        返回:
+            生成计划字典
+        """
+        operation_settings = self.get_operation_settings(settings)
+        return {
+            'ranges': (
+                int(settings['min_number']),
+                int(settings['max_number']),
+                int(settings['min_result']),
+                int(settings['max_result']),
+                settings['allow_right_bracket']
+            ),
+            'rows_per_page': int(settings['rows_per_page']),
+            'cols_per_page': int(settings['cols_per_page']),
+            'total_pages': int(settings['total_pages']),
+            'operation_settings': operation_settings,
+            'sort_by_difficulty': settings.get('sort_by_difficulty', False),
+            'difficulty_mix': settings.get('difficulty_mix'),
+            'pdf_options': {
+                'cols': int(settings['cols_per_page']),
+                'font_size': int(settings['font_size']),
+                'per_col': int(settings['rows_per_page']),
+                'title': settings.get('title'),
+                'align_equals': settings.get('align_equals', False)
+            }
+        }
+
+    def generate_worksheet(self, settings, seed=None):
+        """按设置生成一份练习卷的全部题目
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+            seed: 随机种子，None表示每次随机
+
+        返回:
+            题目列表
+        """
+        return self.generate_from_plan(self.make_plan(settings), seed)
+
+    def generate_from_plan(self, plan, seed=None, progress=None, history=None):
+        """按生成计划生成一份练习卷的全部题目
+
+        参数:
+            plan: make_plan返回的生成计划
+            seed: 随机种子，None表示每次随机
+            progress: ProgressMonitor，汇报进度并响应取消
+            history: 学生的BloomFilter，跳过其中已出过的题目并把新题加入其中
+
+        返回:
+            题目列表
+        """
+        return [format_problem(problem) for problem in self.generate_records_from_plan(plan, seed, progress, history)]
+
+    def generate_records_from_plan(self, plan, seed=None, progress=None, history=None):
+        """按生成计划生成一份练习卷的题目记录（Problem），参数同generate_from_plan
+
+        计划中有difficulty_mix时按难度比例从预建的难度索引中抽题（见difficulty_bands），
+        sort_by_difficulty为真时按难度分从易到难排列（难度相同的保持生成顺序）。
+        """
+        # 更新数学引擎的范围设置
+        self.math_engine.update_ranges(*plan['ranges'])
+        self.math_engine.seed(seed)
+
+        total_problems = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+        with profile_stage(PROFILE_GENERATE):
+            if plan.get('difficulty_mix'):
+                # 难度索引依赖NumPy，只在按难度比例出题时导入
+                from difficulty_bands import generate_targeted_problems
+                mix = {name: float(weight) for name, weight in plan['difficulty_mix'].items()}
+                problems = generate_targeted_problems(self.math_engine.random, total_problems,
+                                                      plan['operation_settings'], plan['ranges'], mix,
+                                                      history, progress)
+            else:
+                problems = self.generate_problem_records(total_problems, plan['operation_settings'], progress,
+                                                         history)
+            if plan.get('sort_by_difficulty'):
+                # 难度评分依赖NumPy，只在需要排序时导入
+                from difficulty import score_problems
+                order = score_problems(problems).argsort(kind='stable')
+                problems = [problems[index] for index in order]
+        return problems
+
+    def make_preview(self, settings, seed=Constants.PREVIEW_SEED):
+        """只生成第一页能放下的题目并计算其布局，供界面预览
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+            seed: 随机种子，默认固定，使修改版式时预览中的题目不变
+
+        返回:
+            PDFGenerator.get_preview_layout的返回值
+        """
+        plan = self.make_plan(settings)
+        pdf_options = plan['pdf_options']
+        per_page = self.pdf_generator.get_problems_per_page(
+            pdf_options['cols'], pdf_options['font_size'], pdf_options['per_col'],
+            bool(pdf_options['title'])
+        )
+        total_problems = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+
+        self.math_engine.update_ranges(*plan['ranges'])
+        self.math_engine.seed(seed)
+        # 按"1行1列1页"生成count道题，不生成整份练习卷
+        count = min(per_page, total_problems)
+        problems = self.generate_all_problems(count, 1, 1, plan['operation_settings'])
+        return self.pdf_generator.get_preview_layout(problems, **pdf_options)
+
+    def build_pdf(self, settings, seed=None, workers=None, progress=None, history=None):
+        """生成题目并渲染PDF
+
+        指定种子且配置了缓存时，相同设置和种子直接返回缓存的PDF。
+
+        参数:
+            settings: 用户设置字典（需已通过验证）
+            seed: 随机种子，None表示每次随机（不使用缓存）
+            workers: 渲染进程数，默认为CPU核数
+            progress: ProgressMonitor，汇报生成和排版进度并响应取消
+            history: 学生的BloomFilter，跳过已出过的题目（题目取决于历史，不使用缓存，也不显示练习卷编号）
+
+        返回:
+            PDF内容的bytes
+        """
+        cache_key = None
+        if self.cache is not None and seed is not None and history is None:
+            cache_key = self.cache.make_key(settings, seed)
+            pdf_data = self.cache.get(cache_key)
+            if pdf_data is not None:
+                return pdf_data
+
+        plan = self.make_plan(settings)
+        if settings.get('show_worksheet_id') and history is None:
+            # worksheet_id模块依赖本模块，在此处导入以避免循环导入
+            from worksheet_id import encode_worksheet_id
+            # 编号必须能复现题目，未指定种子时也选定一个种子
+            if seed is None:
+                seed = random.SystemRandom().randrange(2 ** 32)
+            plan['pdf_options']['worksheet_id'] = encode_worksheet_id(settings, seed)
+        if plan.get('difficulty_mix') or plan.get('sort_by_difficulty'):
+            # 按难度比例抽题和按难度排序都要先得到全部题目，不能边生成边渲染
+            problems = self.generate_from_plan(plan, seed, progress, history)
+            # 页数较多时按页范围多进程渲染
+            pdf_data = self.pdf_generator.create_pdf_bytes(problems, parallel=True, workers=workers,
+                                                           progress=progress, **plan['pdf_options'])
+        else:
+            pdf_data = self._build_pdf_pipelined(plan, seed, workers, progress, history)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, pdf_data)
+        return pdf_data
+
+    def _build_pdf_pipelined(self, plan, seed, workers, progress, history):
+        """边生成边渲染：生成线程按页生成题目放入有界队列，当前线程把收到的页交给多进程渲染
+
+        生成的题目与generate_from_plan相同（同一个引擎按同样的顺序生成，只是按页分批），
+        前面的段在工作进程中排版时后面的页还在生成，总耗时接近两者中较长的一个。
+        队列满时生成暂停，内存中最多缓存Constants.PIPELINE_QUEUE_PAGES页未提交的题目。
+
+        返回:
+            PDF内容的bytes
+        """
+        pdf_options = plan['pdf_options']
+        per_page = self.pdf_generator.get_problems_per_page(
+            pdf_options['cols'], pdf_options['font_size'], pdf_options['per_col'],
+            bool(pdf_options['title'] or pdf_options.get('worksheet_id'))
+        )
+        total_problems = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+
+        output_queue = queue.Queue(maxsize=Constants.PIPELINE_QUEUE_PAGES)
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target=self._produce_pages,
+            args=(plan, seed, per_page, output_queue, stop_event, progress, history, get_active_profiler()),
+            daemon=True
+        )
+        producer.start()
+
+        buffer = io.BytesIO()
+        try:
+            self.pdf_generator.create_pdf_pipelined(buffer, _iter_queue(output_queue), total_problems,
+                                                    workers=workers, progress=progress, **pdf_options)
+        finally:
+            # 渲染出错或取消时通知生成线程停止，并清空队列使其不会阻塞在put上
+            stop_event.set()
+            while producer.is_alive():
+                try:
+                    output_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        return buffer.getvalue()
+
+    def _produce_pages(self, plan, seed, per_page, output_queue, stop_event, progress, history, profiler=None):
+        """生成线程：按页生成题目放入有界队列，结束或出错时放入标记
+
+        profiler为调用线程启用的StageProfiler，生成线程加入同一次分析，生成阶段和热点函数计入报告。
+        """
+        try:
+            with profiler.profile_thread() if profiler is not None else contextlib.nullcontext():
+                self.math_engine.update_ranges(*plan['ranges'])
+                self.math_engine.seed(seed)
+                total_problems = plan['rows_per_page'] * plan['cols_per_page'] * plan['total_pages']
+                for start in range(0, total_problems, per_page):
+                    if stop_event.is_set():
+                        return
+                    if progress is not None:
+                        progress.report(STAGE_GENERATE, start, total_problems)
+                    with profile_stage(PROFILE_GENERATE):
+                        problems = self.generate_problem_records(min(per_page, total_problems - start),
+                                                                 plan['operation_settings'], None, history)
+                    output_queue.put([format_problem(problem) for problem in problems])
+                if progress is not None:
+                    progress.report(STAGE_GENERATE, total_problems, total_problems)
+        except BaseException as e:
+            output_queue.put(e)
+            return
+        output_queue.put(None)
+
+    def generate_all_problems(self, rows_per_page, cols_per_page, total_pages, operation_settings, progress=None,
+                              history=None):
+        """生成所有题目
+
+        参数:
+            rows_per_page: 每页行数
+            cols_per_page: 每页列数
+            total_pages: 总页数
+            operation_settings: 运算设置
+            progress: ProgressMonitor，汇报进度并响应取消
+            history: 学生的BloomFilter，跳过其中已出过的题目
+
+        返回:
+            题目列表
+        """
+        total_problems = rows_per_page * cols_per_page * total_pages
+        problems = self.generate_problem_records(total_problems, operation_settings, progress, history)
+        return [format_problem(problem) for problem in problems]
+
+    def generate_problem_records(self, count, operation_settings, progress=None, history=None):
+        """生成count道结构化的题目记录（Problem），供题库等需要数值而非字符串的场合使用
+
+        参数:
+            count: 题目数量
+            operation_settings: 运算设置
+            progress: ProgressMonitor，汇报进度并响应取消
+            history: 学生的BloomFilter，跳过其中已出过的题目并把新题加入其中
+
+        返回:
+            Problem列表
+        """
+        problems = []
+
+        # 获取可用的运算类型
+        available_operations = self._get_available_operations(operation_settings)
+
+        for index in range(count):
+            if progress is not None and index % Constants.PROGRESS_INTERVAL == 0:
+                progress.report(STAGE_GENERATE, index, count)
+            if history is None:
+                problem = self._generate_single_problem(operation_settings, available_operations)
+            else:
+                problem = self._generate_unseen_problem(operation_settings, available_operations, history)
+            problems.append(problem)
+
+        if progress is not None:
+            progress.report(STAGE_GENERATE, count, count)
+        return problems
+
+    def _get_available_operations(self, operation_settings):
+        """获取可用的运算类型列表"""
+        operations = []
+        operation_map = {
+            'has_addition': 'addition',
+            'has_subtraction': 'subtraction',
+            'has_multiplication': 'multiplication',
+            'has_division': 'division'
+        }
+
+        for setting_key, operation_name in operation_map.items():
+            if operation_settings.get(setting_key, False):
+                operations.append(operation_name)
+
+        return operations
+
+    def _generate_single_problem(self, operation_settings, available_operations):
+        """生成单个题目记录"""
+        # 混合运算优先
+        if operation_settings.get('has_mixed', False):
+            return self.math_engine.generate_problem(
+                num_count=operation_settings['num_count'],
+                has_multiply=operation_settings.get('has_multiplication', False),
+                has_divide=operation_settings.get('has_division', False)
+            )
+
+        # 单一运算类型
+        if not available_operations:
+            return DEFAULT_PROBLEM
+
+        operation_type = self.math_engine.random.choice(available_operations)
+
+        # 三个数字的情况统一使用generate_problem
+        if operation_settings['num_count'] == 3:
+            return self._generate_three_number_problem(operation_type)
+
+        # 两个数字的情况
+        return self._generate_two_number_problem(operation_type)
+
+    def _generate_unseen_problem(self, operation_settings, available_operations, history):
+        """生成历史中（很可能）没有出现过的题目并加入历史
+
+        范围较小、能出的题基本都已出过时，重试Constants.HISTORY_MAX_ATTEMPTS次后接受最后一道。
+        """
+        for _ in range(Constants.HISTORY_MAX_ATTEMPTS):
+            problem = self._generate_single_problem(operation_settings, available_operations)
+            if history.add(get_problem_hash(problem)):
+                return problem
+        return problem
+
+    def _generate_three_number_problem(self, operation_type):
+        """生成三个数字的题目"""
+        has_multiply = operation_type == 'multiplication'
+        has_divide = operation_type == 'division'
+        return self.math_engine.generate_problem(
+            num_count=3,
+            has_multiply=has_multiply,
+            has_divide=has_divide
+        )
+
+    def _generate_two_number_problem(self, operation_type):
+        """生成两个数字的题目"""
+        operation_symbols = {
+            'addition': '+',
+            'subtraction': '-',
+            'multiplication': 'x',
+            'division': '÷'
+        }
+
+        symbol = operation_symbols.get(operation_type)
+        return self.math_engine.generate_operation_problem(symbol) if symbol else DEFAULT_PROBLEM
+
+
+def _iter_queue(output_queue):
+    """依次取出生成线程放入队列的题目，遇到结束标记时停止，遇到异常时重新抛出"""
+    while True:
+        item = output_queue.get()
+        if item is None:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
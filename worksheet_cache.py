@@ -0,0 +1,142 @@
+"""练习卷缓存
+
+按设置和随机种子的哈希值在磁盘上缓存渲染好的PDF，
+按总字节数做LRU淘汰，写入采用临时文件加原子替换
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from constants import Constants
+
+# 不影响PDF内容的设置项，不参与缓存键计算
+CACHE_IGNORED_KEYS = ('save_path',)
+
+
+def normalize_settings(settings, ignored_keys=CACHE_IGNORED_KEYS):
+    """把设置字典规范化为可稳定序列化的形式
+
+    数值统一转为字符串，界面输入的"10"和命令行的10得到相同的结果；
+    嵌套的字典（如difficulty_mix）逐项规范化，由json.dumps的sort_keys排序，与键的顺序无关。
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(key): normalize(item) for key, item in value.items()}
+        return value if isinstance(value, bool) else str(value)
+
+    return {key: normalize(value) for key, value in settings.items() if key not in ignored_keys}
+
+
+class WorksheetCache:
+    """基于内容哈希的磁盘PDF缓存"""
+
+    def __init__(self, cache_dir=None, max_bytes=Constants.CACHE_MAX_BYTES):
+        """初始化缓存
+
+        参数:
+            cache_dir: 缓存目录，默认为用户目录下的Constants.CACHE_DIR_NAME
+            max_bytes: 缓存文件总字节数上限，超出时淘汰最久未使用的条目
+        """
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), Constants.CACHE_DIR_NAME)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(settings, seed):
+        """计算缓存键
+
+        参数:
+            settings: get_user_settings返回的设置字典
+            seed: 随机种子
+
+        返回:
+            十六进制SHA-256字符串
+        """
+        payload = json.dumps({'version': Constants.CACHE_VERSION, 'settings': normalize_settings(settings),
+                              'seed': str(seed)}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _get_path(self, key):
+        """缓存键对应的文件路径"""
+        return os.path.join(self.cache_dir, f'{key}.pdf')
+
+    def get(self, key):
+        """读取缓存
+
+        参数:
+            key: 缓存键
+
+        返回:
+            PDF内容的bytes，未命中时返回None
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            # 未缓存，或刚被其他进程淘汰
+            return None
+        return data
+
+    def put(self, key, data):
+        """写入缓存
+
+        先写入同目录下的临时文件，再用os.replace原子替换，
+        并发写入同一个键时读取方只会看到完整的文件。
+
+        参数:
+            key: 缓存键
+            data: PDF内容
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._get_path(key))
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """按最近使用时间淘汰条目，直到总字节数不超过上限"""
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # 可能已被其他进程删除
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        """清空缓存"""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf'):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
@@ -0,0 +1,245 @@
+"""可复现的练习卷编号
+
+把决定题目内容的设置（运算类型、数字个数、数值和结果范围、括号、行列页数、
+难度比例和排序）与随机种子编码为一个短编号，打印在练习卷每页的页脚。
+出题完全由设置和种子决定，凭编号即可重新生成同一份练习卷的题目和答案，
+不必为每份发出的练习卷保存答案。标题、字号、对齐方式等只影响版式的设置不编入编号。
+
+编码方式：各字段依次写为无符号变长整数（LEB128），末尾附加校验和，
+再用Crockford Base32编码为大写字母和数字（不含I、L、O、U），每4个字符用连字符分隔。
+解码时不区分大小写，忽略连字符，O按0、I和L按1读。
+
+使用方法：
+python worksheet_id.py 0H8G-2Y4A-...
+python worksheet_id.py 0H8G-2Y4A-... --answers-only
+"""
+
+import argparse
+import hashlib
+from constants import Constants
+from math_engine import format_answer, format_problem
+from worksheet_builder import WorksheetBuilder, get_default_settings
+
+# Crockford Base32字母表
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+DECODE_MAP = {char: value for value, char in enumerate(ALPHABET)}
+DECODE_MAP.update({'O': 0, 'I': 1, 'L': 1})
+
+# 编入标志位的布尔设置，顺序即位序，只能在末尾追加
+FLAG_KEYS = ('has_addition', 'has_subtraction', 'has_multiplication', 'has_division', 'has_mixed',
+             'three_numbers', 'allow_right_bracket', 'sort_by_difficulty', 'has_difficulty_mix')
+
+# 依次编入的数值设置
+VALUE_KEYS = ('min_number', 'max_number', 'min_result', 'max_result', 'rows_per_page', 'cols_per_page',
+              'total_pages')
+
+
+def _write_varint(output, value):
+    """把非负整数按LEB128追加到bytearray
+
+    异常:
+        ValueError: value为负数
+    """
+    if value < 0:
+        raise ValueError("练习卷编号的字段不能为负数")
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            output.append(byte | 0x80)
+        else:
+            output.append(byte)
+            return
+
+
+def _read_varint(data, position):
+    """从position读取一个LEB128整数
+
+    返回:
+        (整数, 下一个字段的位置)
+
+    异常:
+        ValueError: 数据在整数中途结束
+    """
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise ValueError("练习卷编号不完整")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def _checksum(payload):
+    return hashlib.blake2b(bytes(payload), digest_size=Constants.WORKSHEET_ID_CHECKSUM_BYTES).digest()
+
+
+def _to_base32(data):
+    """把字节串编码为Crockford Base32（前面补一个1位，保留开头的零字节）"""
+    value = int.from_bytes(b'\x01' + data, 'big')
+    chars = []
+    while value:
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def _from_base32(text):
+    """_to_base32的逆运算
+
+    异常:
+        ValueError: 含有字母表以外的字符
+    """
+    value = 0
+    for char in text:
+        if char not in DECODE_MAP:
+            raise ValueError(f"练习卷编号中有无效字符: {char}")
+        value = value * 32 + DECODE_MAP[char]
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    if not data or data[0] != 1:
+        raise ValueError("练习卷编号无效")
+    return data[1:]
+
+
+def get_difficulty_weights(settings):
+    """按Constants.DIFFICULTY_BANDS的顺序取出难度比例的整数权重，没有难度比例时返回None
+
+    异常:
+        ValueError: 比例不是非负整数（编号只能保存整数比例）
+    """
+    mix = settings.get('difficulty_mix')
+    if not mix:
+        return None
+    weights = []
+    for name in Constants.DIFFICULTY_BANDS:
+        weight = float(mix.get(name, 0))
+        if weight < 0 or not weight.is_integer():
+            raise ValueError("显示练习卷编号时难度比例必须为非负整数")
+        weights.append(int(weight))
+    return weights
+
+
+def encode_worksheet_id(settings, seed):
+    """把设置和种子编码为练习卷编号
+
+    参数:
+        settings: 用户设置字典（需已通过验证）
+        seed: 随机种子，非负整数
+
+    返回:
+        编号字符串，如 '0H8G-2Y4A-...'
+
+    异常:
+        ValueError: 种子不是非负整数，数值设置为负数，或难度比例不是整数
+    """
+    if not isinstance(seed, int) or seed < 0:
+        raise ValueError("显示练习卷编号时随机种子必须为非负整数")
+    for key in VALUE_KEYS:
+        if int(settings[key]) < 0:
+            raise ValueError(f"显示练习卷编号时{key}不能为负数")
+
+    weights = get_difficulty_weights(settings)
+    flags = {
+        'three_numbers': settings['num_count'] != Constants.NUM_COUNT_OPTIONS[0],
+        'has_difficulty_mix': weights is not None,
+    }
+    payload = bytearray()
+    _write_varint(payload, Constants.WORKSHEET_ID_VERSION)
+    _write_varint(payload, sum(1 << bit for bit, key in enumerate(FLAG_KEYS)
+                               if flags.get(key, settings.get(key, False))))
+    for key in VALUE_KEYS:
+        _write_varint(payload, int(settings[key]))
+    for weight in weights or ():
+        _write_varint(payload, weight)
+    _write_varint(payload, seed)
+
+    text = _to_base32(bytes(payload) + _checksum(payload))
+    size = Constants.WORKSHEET_ID_GROUP_SIZE
+    return '-'.join(text[start:start + size] for start in range(0, len(text), size))
+
+
+def decode_worksheet_id(worksheet_id):
+    """解析练习卷编号
+
+    返回:
+        (设置字典, 种子)，设置字典中编号未包含的项（标题、字号等）为默认值
+
+    异常:
+        ValueError: 编号无效、抄错（校验和不符）或由不兼容的版本生成
+    """
+    data = _from_base32(worksheet_id.replace('-', '').strip().upper())
+    payload, checksum = data[:-Constants.WORKSHEET_ID_CHECKSUM_BYTES], data[-Constants.WORKSHEET_ID_CHECKSUM_BYTES:]
+    if len(data) <= Constants.WORKSHEET_ID_CHECKSUM_BYTES or _checksum(payload) != checksum:
+        raise ValueError("练习卷编号校验失败，请检查是否抄错")
+
+    version, position = _read_varint(payload, 0)
+    if version != Constants.WORKSHEET_ID_VERSION:
+        raise ValueError(f"练习卷编号由不兼容的版本生成: {version}")
+
+    flag_bits, position = _read_varint(payload, position)
+    flags = {key: bool(flag_bits & (1 << bit)) for bit, key in enumerate(FLAG_KEYS)}
+    settings = get_default_settings()
+    for key in FLAG_KEYS:
+        if key in settings:
+            settings[key] = flags[key]
+    settings['num_count'] = Constants.NUM_COUNT_OPTIONS[1 if flags['three_numbers'] else 0]
+
+    for key in VALUE_KEYS:
+        value, position = _read_varint(payload, position)
+        settings[key] = str(value)
+    if flags['has_difficulty_mix']:
+        mix = {}
+        for name in Constants.DIFFICULTY_BANDS:
+            mix[name], position = _read_varint(payload, position)
+        settings['difficulty_mix'] = mix
+
+    seed, position = _read_varint(payload, position)
+    if position != len(payload):
+        raise ValueError("练习卷编号无效")
+    settings['show_worksheet_id'] = True
+    return settings, seed
+
+
+def regenerate_worksheet(worksheet_id, builder=None):
+    """凭编号重新生成练习卷的题目和答案
+
+    参数:
+        worksheet_id: 练习卷编号
+        builder: 生成题目用的WorksheetBuilder，默认新建
+
+    返回:
+        (题目字符串列表, 答案字符串列表)，顺序与练习卷上的题目一致
+
+    异常:
+        ValueError: 编号无效
+    """
+    settings, seed = decode_worksheet_id(worksheet_id)
+    builder = builder or WorksheetBuilder()
+    is_valid, error_msg = builder.validate_settings(settings)
+    if not is_valid:
+        raise ValueError(error_msg)
+    problems = builder.generate_records_from_plan(builder.make_plan(settings), seed)
+    return [format_problem(problem) for problem in problems], [format_answer(problem) for problem in problems]
+
+
+def main(argv=None):
+    """命令行入口：打印编号对应练习卷的答案"""
+    parser = argparse.ArgumentParser(description="凭练习卷编号重新生成题目和答案")
+    parser.add_argument('worksheet_id', help="练习卷页脚上的编号")
+    parser.add_argument('--answers-only', action='store_true', help="只输出答案，不输出题目")
+    args = parser.parse_args(argv)
+
+    try:
+        problems, answers = regenerate_worksheet(args.worksheet_id)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    width = len(str(len(problems)))
+    for index, (problem, answer) in enumerate(zip(problems, answers), 1):
+        print(f'{index:>{width}}. {answer}' if args.answers_only else f'{index:>{width}}. {problem}    {answer}')
+
+
+if __name__ == '__main__':
+    main()